@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import auth, videos, users, course
+from app.api.endpoints import auth, videos, users, course, admin
 
 api_router = APIRouter()
 
@@ -8,3 +8,4 @@ api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(videos.router, prefix="/videos", tags=["videos"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(course.router, prefix="/course", tags=["course-dashboard"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -1,18 +1,13 @@
-from typing import Generator
-from supabase import Client
+from supabase import AsyncClient
 
 from app.db.database import get_supabase_client
 
 
-def get_db() -> Generator[Client, None, None]:
+async def get_db() -> AsyncClient:
     """
     Dependency to get Supabase client for database access.
     
-    Yields:
-        Supabase client: Client for database operations
+    Returns:
+        Supabase client: The process-wide async client for database operations
     """
-    client = get_supabase_client()
-    try:
-        yield client
-    finally:
-        pass
+    return await get_supabase_client()
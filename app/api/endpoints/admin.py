@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, Optional
+import asyncio
+from supabase import AsyncClient
+
+from app.schemas.schemas import User, ApiResponse
+from app.api.deps import get_db
+from app.api.endpoints.auth import get_current_active_superuser
+from app.core.security import revoke_user, token_cache
+from app.services.analytics import build_analytics_report, fetch_all_rows
+from app.services.content import course_content_cache
+from app.services.idempotency import quiz_submissions
+from app.services.ingest import video_ingest
+from app.services.write_behind import user_answers_writer
+
+router = APIRouter()
+
+
+@router.get("/stats", response_model=ApiResponse)
+async def get_stats(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Get in-process cache statistics. Only for superusers.
+    """
+    return ApiResponse(success=True, data={
+        "token_cache": token_cache.stats(),
+        "content_cache": course_content_cache.stats(),
+        "quiz_idempotency": quiz_submissions.stats(),
+        "user_answers_writer": user_answers_writer.stats(),
+        "video_ingest": video_ingest.stats(),
+    })
+
+
+@router.post("/users/{user_id}/revoke-sessions", response_model=ApiResponse)
+async def revoke_user_sessions(
+    user_id: str,
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Revoke every token issued to a user so far. Only for superusers.
+    """
+    dropped = revoke_user(user_id)
+    return ApiResponse(success=True, data={"user_id": user_id, "cached_tokens_dropped": dropped})
+
+
+@router.post("/content/invalidate", response_model=ApiResponse)
+async def invalidate_content_cache(
+    db: AsyncClient = Depends(get_db),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Reload the cached course content right away. Only for superusers.
+    """
+    course_content_cache.invalidate()
+    await course_content_cache.get(db)
+    return ApiResponse(success=True, data=course_content_cache.stats())
+
+
+@router.get("/analytics", response_model=ApiResponse)
+async def get_quiz_analytics(
+    module_id: Optional[int] = None,
+    db: AsyncClient = Depends(get_db),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Get quiz analytics per module: pass rate, average score, and per question
+    the correctness rate and picked options. Only for superusers.
+    """
+    content = await course_content_cache.get(db)
+    if module_id is not None and module_id not in content.modules_by_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Module not found")
+    
+    question_ids = (
+        [q["id"] for q in content.modules_by_id[module_id]["questions"]] if module_id is not None else None
+    )
+    
+    def stats_query(table: str, columns: str, order: str, key: str, ids: Optional[list]):
+        def build():
+            query = db.table(table).select(columns)
+            if ids is not None:
+                query = query.in_(key, ids)
+            return query.order(order)
+        return build
+    
+    module_rows, question_rows, option_rows = await asyncio.gather(
+        fetch_all_rows(stats_query(
+            "module_stats", "module_id, submissions, passed, score_sum", "module_id", "module_id",
+            [module_id] if module_id is not None else None,
+        )),
+        fetch_all_rows(stats_query(
+            "question_stats", "question_id, attempts, correct", "question_id", "question_id", question_ids,
+        )),
+        fetch_all_rows(stats_query(
+            "answer_option_stats", "question_id, answer_text, picks", "question_id,answer_text", "question_id",
+            question_ids,
+        )),
+    )
+    
+    return ApiResponse(success=True, data=build_analytics_report(
+        content, module_rows, question_rows, option_rows, module_id
+    ))
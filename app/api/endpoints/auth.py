@@ -1,19 +1,69 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from typing import Any
+from typing import Any, Optional
 
 from app.core.config import settings
+from app.core.security import (
+    AmbiguousTokenError, is_superuser, is_token_revoked, revoke_token, token_cache, token_cache_key,
+    token_expires_in, user_from_claims, verify_supabase_token
+)
 from app.db.database import get_supabase_client
 from app.schemas.schemas import User, Token, TokenPayload
+from app.services.users import UserService
 
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_PREFIX}/auth/login")
 
 
+async def ensure_user_row(supabase, user_id: str, created_at: Optional[str] = None) -> None:
+    """
+    Make sure the authenticated user has a row in the users table.
+    """
+    try:
+        await UserService(supabase).ensure_exists(user_id, created_at)
+    except Exception as e:
+        print(f"Error ensuring user exists in database: {str(e)}")
+
+
+async def get_remote_user(token: str) -> Optional[User]:
+    """
+    Resolve the token through Supabase Auth (one network round trip).
+    """
+    supabase = await get_supabase_client()
+    user_response = await supabase.auth.get_user(token)
+    supabase_user = user_response.user
+
+    if not supabase_user:
+        return None
+
+    full_name = (
+        supabase_user.user_metadata.get("full_name", "")
+        if supabase_user.user_metadata else ""
+    )
+    created_at = supabase_user.created_at.isoformat() if supabase_user.created_at else None
+
+    await ensure_user_row(supabase, supabase_user.id, created_at)
+
+    return User(
+        id=supabase_user.id,
+        email=supabase_user.email or "",
+        full_name=full_name,
+        is_active=True,
+        is_superuser=is_superuser(supabase_user.app_metadata),
+        created_at=supabase_user.created_at,
+        updated_at=supabase_user.updated_at or supabase_user.created_at,
+    )
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """
     Validate and decode the Supabase JWT token to get the current user.
+
+    In "local" verification mode the signature, expiry and audience are
+    checked in-process; Supabase Auth is only asked when the token cannot
+    be judged locally or when "remote" mode is configured. Resolved users
+    are cached per token until the token expires or is revoked.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -21,45 +71,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    if is_token_revoked(token):
+        raise credentials_exception
+
+    cache_key = token_cache_key(token)
+    cached_user = token_cache.get(cache_key)
+    if cached_user is not None:
+        return cached_user
+
     try:
-        supabase = get_supabase_client()
-        user_response = supabase.auth.get_user(token)
-        supabase_user = user_response.user
+        user = None
+        if settings.AUTH_VERIFICATION_MODE == "local":
+            try:
+                claims = await verify_supabase_token(token)
+            except AmbiguousTokenError:
+                claims = None
 
-        if not supabase_user:
+            if claims is not None:
+                user = user_from_claims(claims)
+                await ensure_user_row(await get_supabase_client(), user.id)
+
+        if user is None:
+            user = await get_remote_user(token)
+        if not user:
             raise credentials_exception
-        
-        
-        user_id = supabase_user.id
-        email = supabase_user.email or ""
-        full_name = (
-            supabase_user.user_metadata.get("full_name", "")
-            if supabase_user.user_metadata else ""
-        )
-        created_at = supabase_user.created_at.isoformat() if supabase_user.created_at else None
-        updated_at = supabase_user.updated_at.isoformat() or created_at
-
-        try:
-            user_check = supabase.table("users").select("*").eq("id", user_id).execute()
-            if not user_check.data:
-                # User doesn't exist in the users table, create them
-                new_user = {
-                    "id": user_id,
-                    "created_at": created_at
-                }
-                supabase.table("users").insert(new_user).execute()
-        except Exception as e:
-            print(f"Error ensuring user exists in database: {str(e)}")
-
-        return User(
-            id=user_id,
-            email=email,
-            full_name=full_name,
-            is_active=True,
-            is_superuser=False,
-            created_at=supabase_user.created_at,
-            updated_at=supabase_user.updated_at or supabase_user.created_at,
-        )
+
+        token_cache.set(cache_key, user, ttl=token_expires_in(token))
+        return user
 
     except Exception:
         raise credentials_exception
@@ -80,5 +118,29 @@ async def get_current_active_superuser(current_user: User = Depends(get_current_
 async def read_users_me(current_user: User = Depends(get_current_user)) -> Any:
     """
     Get current user.
+
+    Users resolved from a verified token have no account timestamps; they
+    are read from the users row.
     """
-    return current_user
+    if current_user.created_at is not None:
+        return current_user
+    try:
+        row = await UserService(await get_supabase_client()).get_by_id(current_user.id)
+    except Exception as e:
+        print(f"Warning: Could not read the users row of {current_user.id}: {str(e)}")
+        return current_user
+    if not row:
+        return current_user
+    return User(**{**current_user.model_dump(), "created_at": row["created_at"], "updated_at": row["updated_at"]})
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT, response_model=None)
+async def logout(
+    token: str = Depends(oauth2_scheme),
+    current_user: User = Depends(get_current_user),
+) -> None:
+    """
+    Revoke the current access token for this API.
+    """
+    revoke_token(token)
+    return None
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, Response
 from typing import Any, List, Optional
+import asyncio
 from datetime import datetime, timezone
 import uuid
-from supabase import Client
+from supabase import AsyncClient
 
 from app.schemas.schemas import (
     User, Module, ModuleBlock, Question, Answer, Progress, UserAnswer,
@@ -11,20 +12,47 @@ from app.schemas.schemas import (
 )
 from app.api.deps import get_db
 from app.api.endpoints.auth import get_current_user
+from app.core.fields import parse_fields, project
+from app.core.responses import (
+    api_response, etag_headers, etag_matches, extend_json_object, json_array, make_etag,
+    negotiate_encoding, not_modified, raw_api_response
+)
 from app.core.utils import get_current_time
-from app.services.quiz import evaluate_quiz_answer, generate_quiz_feedback, extract_answer_data
+from app.services.write_behind import user_answers_writer
+from app.services.quiz import PASSING_SCORE, generate_quiz_feedback, extract_answer_data
+from app.services.analytics import quiz_analytics_params
+from app.services.content import CourseContent, course_content_cache
+from app.services.idempotency import IdempotencyKeyReuseError, quiz_submissions, request_fingerprint
 from app.services.certificates import generate_certificate_content, prepare_certificate_response
-from app.services.progress import (
-    calculate_highest_score, get_last_activity, create_course_progress_summary,
-    determine_module_status
-)
+from app.services.progress import course_progress_from_summary, module_progress_fields
 
 router = APIRouter()
 
+PROGRESS_COLUMNS = "module_id, score, passed, completed_at"
+CERTIFICATE_COLUMNS = "id, user_id, issued_at, certificate_url"
+
+# Fields a client may pick with ?fields= on /modules
+MODULE_FIELDS = (
+    "id", "title", "description", "order", "slug", "blocks", "questions",
+    "status", "score", "quiz_passed", "completion_date",
+)
+
+SUMMARY_COLUMNS = "completed_modules, highest_score, highest_score_module_id, last_activity, updated_at"
+
+
+def course_etag(user_id: str, content: CourseContent, summary: Optional[dict], *extra: Any) -> str:
+    """
+    ETag of a per-user course view: the content version plus the user's
+    progress version (the summary row is rewritten on every progress change).
+    """
+    progress_version = summary.get("updated_at") if summary else None
+    return make_etag(user_id, content.tag, progress_version, *extra)
+
 
 @router.get("/progress", response_model=ApiResponse)
 async def get_course_progress(
-    db: Client = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
@@ -34,21 +62,24 @@ async def get_course_progress(
         # Use the current user's ID
         user_id = current_user.id
         
-        # Get user's progress data
-        progress_response = db.table("progress").select("*").eq("user_id", user_id).execute()
+        # Get user's progress summary row and the cached course content
+        content, summary_response = await asyncio.gather(
+            course_content_cache.get(db),
+            db.table("course_progress_summary").select(SUMMARY_COLUMNS).eq("user_id", user_id).execute(),
+        )
+        summary = summary_response.data[0] if summary_response.data else None
+        
+        etag = course_etag(user_id, content, summary)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
         
         # Get total modules count
-        modules_response = db.table("modules").select("id").execute()
-        total_modules = len(modules_response.data) if modules_response.data else 0
+        total_modules = len(content.modules)
         
         # Create course progress summary
-        course_progress = create_course_progress_summary(
-            user_id, 
-            progress_response.data if progress_response.data else [],
-            total_modules
-        )
+        course_progress = course_progress_from_summary(user_id, summary, total_modules)
         
-        return ApiResponse(success=True, data=course_progress.dict())
+        return api_response(course_progress, headers=etag_headers(etag))
         
     except Exception as e:
         raise HTTPException(
@@ -59,59 +90,56 @@ async def get_course_progress(
 
 @router.get("/modules", response_model=ApiResponse)
 async def get_course_modules(
-    db: Client = Depends(get_db),
+    fields: Optional[str] = Query(None, description="Comma-separated module fields to return"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Get all course modules with user's progress.
     """
+    try:
+        requested = parse_fields(fields, MODULE_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
     try:
         user_id = current_user.id
         
-        modules_response = db.table("modules").select("*").order("order").execute()
+        # Revalidation only needs the two versions, not the progress rows
+        content, summary_response = await asyncio.gather(
+            course_content_cache.get(db),
+            db.table("course_progress_summary").select("updated_at").eq("user_id", user_id).execute(),
+        )
+        summary = summary_response.data[0] if summary_response.data else None
         
-        if not modules_response.data:
-            return ApiResponse(success=True, data=[])
+        etag = course_etag(user_id, content, summary, ",".join(requested or []))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
         
-        progress_response = db.table("progress").select("*").eq("user_id", user_id).execute()
+        modules_data = content.modules
+        
+        if not modules_data:
+            return api_response([], headers=etag_headers(etag))
+        
+        progress_response = await db.table("progress").select(PROGRESS_COLUMNS).eq("user_id", user_id).execute()
         progress_dict = {p["module_id"]: p for p in progress_response.data} if progress_response.data else {}
         
         modules_with_progress = []
         
-        for i, module_data in enumerate(modules_response.data):
+        for i, module_data in enumerate(modules_data):
             module_id = module_data["id"]
+            user_fields = module_progress_fields(i, module_id, progress_dict, modules_data)
             
-            blocks_response = db.table("module_blocks").select("*").eq("module_id", module_id).order("order").execute()
-            
-            questions_response = db.table("questions").select("*").eq("module_id", module_id).execute()
-            questions_with_answers = []
-            
-            if questions_response.data:
-                for question in questions_response.data:
-                    answers_response = db.table("answers").select("*").eq("question_id", question["id"]).execute()
-                    question["answers"] = answers_response.data if answers_response.data else []
-                    questions_with_answers.append(question)
-            
-            status, score, completion_date = determine_module_status(
-                i, 
-                module_id, 
-                progress_dict, 
-                modules_response.data
-            )
-            
-            module_dict = {
-                **module_data,
-                "status": status,
-                "score": score,
-                "quiz_passed": progress_dict.get(module_id, {}).get("passed") if module_id in progress_dict else None,
-                "completion_date": completion_date,
-                "blocks": blocks_response.data if blocks_response.data else [],
-                "questions": questions_with_answers
-            }
-            
-            modules_with_progress.append(module_dict)
+            if requested is None:
+                # Splice the user's fields into the module serialized once per content version
+                modules_with_progress.append(extend_json_object(content.module_json[module_id], user_fields))
+            else:
+                modules_with_progress.append(project({**module_data, **user_fields}, requested))
         
-        return ApiResponse(success=True, data=modules_with_progress)
+        if requested is None:
+            return raw_api_response(json_array(modules_with_progress), headers=etag_headers(etag))
+        return api_response(modules_with_progress, headers=etag_headers(etag))
         
     except Exception as e:
         raise HTTPException(
@@ -120,41 +148,210 @@ async def get_course_modules(
         )
 
 
+@router.get("/modules/outline", response_model=ApiResponse)
+async def get_course_outline(
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncClient = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Get a lightweight list of modules (no blocks or questions) with the
+    user's status and score, enough to render the dashboard.
+    """
+    try:
+        user_id = current_user.id
+        
+        content, summary_response = await asyncio.gather(
+            course_content_cache.get(db),
+            db.table("course_progress_summary").select("updated_at").eq("user_id", user_id).execute(),
+        )
+        summary = summary_response.data[0] if summary_response.data else None
+        
+        etag = course_etag(user_id, content, summary, "outline")
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        
+        progress_response = await db.table("progress").select(PROGRESS_COLUMNS).eq("user_id", user_id).execute()
+        progress_dict = {p["module_id"]: p for p in progress_response.data} if progress_response.data else {}
+        
+        outline = [
+            {
+                "id": module_data["id"],
+                "title": module_data["title"],
+                "order": module_data["order"],
+                "slug": module_data.get("slug"),
+                **module_progress_fields(i, module_data["id"], progress_dict, content.modules),
+            }
+            for i, module_data in enumerate(content.modules)
+        ]
+        
+        return api_response(outline, headers=etag_headers(etag))
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get course outline: {str(e)}"
+        )
+
+
+@router.get("/modules/{module_ref}", response_model=ApiResponse)
+async def get_course_module(
+    module_ref: str,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncClient = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Get one module with its blocks and questions, by id or slug.
+    Locked modules are not returned.
+    """
+    try:
+        user_id = current_user.id
+        content = await course_content_cache.get(db)
+        
+        module_data = (
+            content.modules_by_id.get(int(module_ref)) if module_ref.isdigit()
+            else content.modules_by_slug.get(module_ref)
+        )
+        if not module_data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Module not found"
+            )
+        
+        module_id = module_data["id"]
+        index = content.module_index[module_id]
+        # The lock rule only looks at this module and the previous one
+        related_ids = [module_id] + ([content.modules[index - 1]["id"]] if index > 0 else [])
+        
+        summary_response, progress_response = await asyncio.gather(
+            db.table("course_progress_summary").select("updated_at").eq("user_id", user_id).execute(),
+            db.table("progress").select(PROGRESS_COLUMNS).eq("user_id", user_id).in_("module_id", related_ids).execute(),
+        )
+        summary = summary_response.data[0] if summary_response.data else None
+        progress_dict = {p["module_id"]: p for p in progress_response.data} if progress_response.data else {}
+        
+        user_fields = module_progress_fields(index, module_id, progress_dict, content.modules)
+        if user_fields["status"] == "locked":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Module is locked. Pass the previous module's quiz first"
+            )
+        
+        etag = course_etag(user_id, content, summary, "module", module_id)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        
+        return raw_api_response(
+            extend_json_object(content.module_json[module_id], user_fields),
+            headers=etag_headers(etag),
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get course module: {str(e)}"
+        )
+
+
+@router.get("/content", response_model=ApiResponse)
+async def get_course_content(
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncClient = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Get the course tree shared by all users (modules with blocks, questions
+    and answers, no progress). The body is compressed once per content
+    version and served in the best encoding the client accepts.
+    """
+    try:
+        content = await course_content_cache.get(db)
+        variants = await content.encoded_tree()
+        
+        coding = negotiate_encoding(accept_encoding, variants)
+        etag = make_etag(content.tag, coding)
+        headers = {**etag_headers(etag), "Vary": "Accept-Encoding"}
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, headers)
+        
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(content=variants[coding], headers=headers, media_type="application/json")
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get course content: {str(e)}"
+        )
+
+
 @router.post("/modules/{module_id}/quiz", response_model=ApiResponse)
 async def submit_quiz(
     module_id: int,
     quiz_data: QuizSubmission,
-    db: Client = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Submit quiz answers and get results with detailed feedback.
+    
+    Retries sent with the same Idempotency-Key header get the first result
+    back without grading or saving the answers again.
     """
-    try:       
-        user_response = db.table("users").select("*").eq("id", current_user.id).execute()
-        if not user_response.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found in the database"
-            )
-        
-        module_response = db.table("modules").select("*").eq("id", module_id).execute()
-        if not module_response.data:
+    if not idempotency_key:
+        return api_response(await grade_and_save_quiz(module_id, quiz_data, db, current_user))
+    
+    try:
+        quiz_result, replayed = await quiz_submissions.run(
+            (current_user.id, module_id, idempotency_key),
+            request_fingerprint(quiz_data.dict()),
+            lambda: grade_and_save_quiz(module_id, quiz_data, db, current_user),
+        )
+    except IdempotencyKeyReuseError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
+        )
+    
+    return api_response(quiz_result, headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+
+async def grade_and_save_quiz(
+    module_id: int,
+    quiz_data: QuizSubmission,
+    db: AsyncClient,
+    current_user: User
+) -> QuizResult:
+    """
+    Grade a quiz submission and save the answers, progress and analytics.
+    """
+    try:
+        # The users row is guaranteed by get_current_user, no need to re-read it
+        content = await course_content_cache.get(db)
+        module = content.modules_by_id.get(module_id)
+        if not module:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Module not found"
             )
         
-        questions_response = db.table("questions").select("*").eq("module_id", module_id).execute()
-        if not questions_response.data:
+        answer_key = content.answer_keys[module_id]
+        if not answer_key:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No questions found for this module"
             )
         
-        total_questions = len(questions_response.data)
+        total_questions = len(answer_key)
         correct_answers = 0
         answer_results = []
+        user_answers = []
+        submitted_at = get_current_time()
         
         for answer_data in quiz_data.answers:            
             extracted_data = extract_answer_data(answer_data)
@@ -165,18 +362,12 @@ async def submit_quiz(
                 print(f"Missing question_id for answer: {answer_data}")
                 continue
                 
-            question = next((q for q in questions_response.data if q["id"] == question_id), None)
-            if not question:
+            grader = answer_key.get(question_id)
+            if not grader:
                 print(f"Question not found for ID: {question_id}")
                 continue
-                
-            correct_answers_response = db.table("answers").select("*").eq("question_id", question_id).eq("is_correct", True).execute()
             
-            evaluation = evaluate_quiz_answer(
-                question, 
-                answer_text, 
-                correct_answers_response.data if correct_answers_response.data else []
-            )
+            evaluation = grader.grade(answer_text)
             
             is_correct = evaluation["is_correct"]
             correct_answer_text = evaluation["correct_answer_text"]
@@ -185,19 +376,13 @@ async def submit_quiz(
             if is_correct:
                 correct_answers += 1
             
-            user_answer = {
+            user_answers.append({
                 "user_id": current_user.id,
                 "question_id": question_id,
                 "answer_text": answer_text,
                 "is_correct": is_correct,
-                "submitted_at": get_current_time()
-            }
-            
-            try:
-                insert_response = db.table("user_answers").insert(user_answer).execute()
-            except Exception as insert_error:
-                print(f"Warning: Could not save user answer: {str(insert_error)}")
-                # Continue processing without failing the whole quiz submission
+                "submitted_at": submitted_at
+            })
             
             answer_results.append({
                 "question_id": question_id,
@@ -208,31 +393,39 @@ async def submit_quiz(
             })
         
         score = round((correct_answers / total_questions) * 100) if total_questions > 0 else 0
-        passed = score >= 70  # 70% passing grade
+        passed = score >= PASSING_SCORE
         
         overall_feedback = generate_quiz_feedback(score)
         
-        try:
-            progress_response = db.table("progress").select("*").eq("user_id", current_user.id).eq("module_id", module_id).execute()
-            
-            if progress_response.data:
-                update_data = {
-                    "score": score,
-                    "passed": passed,
-                    "completed_at": get_current_time() if passed else None  # Only set completion time if passed
-                }
-                db.table("progress").update(update_data).eq("user_id", current_user.id).eq("module_id", module_id).execute()
-            else:
-                progress_data = {
-                    "user_id": current_user.id,
-                    "module_id": module_id,
-                    "score": score,
-                    "passed": passed,
-                    "completed_at": get_current_time() if passed else None  # Only set completion time if passed
-                }
-                db.table("progress").insert(progress_data).execute()
-        except Exception as progress_error:
-            print(f"Warning: Could not update progress: {str(progress_error)}")
+        progress_data = {
+            "user_id": current_user.id,
+            "module_id": module_id,
+            "score": score,
+            "passed": passed,
+            "completed_at": get_current_time() if passed else None,  # Only set completion time if passed
+            # Identifies the answers this score was computed from (see regrade_progress)
+            "submitted_at": submitted_at
+        }
+        
+        # The answers are not needed for the response: queue them for a batched
+        # insert in the background
+        await user_answers_writer.submit(user_answers)
+        
+        # One upsert for the progress row and one call that adds the submission
+        # to the analytics aggregates
+        progress_result, analytics_result = await asyncio.gather(
+            db.table("progress").upsert(progress_data, on_conflict="user_id,module_id").execute(),
+            db.rpc(
+                "record_quiz_analytics",
+                quiz_analytics_params(module_id, score, passed, answer_key, user_answers),
+            ).execute(),
+            return_exceptions=True,
+        )
+        if isinstance(progress_result, Exception):
+            # Continue processing without failing the whole quiz submission
+            print(f"Warning: Could not update progress: {str(progress_result)}")
+        if isinstance(analytics_result, Exception):
+            print(f"Warning: Could not record quiz analytics: {str(analytics_result)}")
         
         quiz_result = QuizResult(
             module_id=module_id,
@@ -243,7 +436,7 @@ async def submit_quiz(
             feedback=overall_feedback
         )
         
-        return ApiResponse(success=True, data=quiz_result.dict())
+        return quiz_result
         
     except HTTPException:
         raise
@@ -259,23 +452,24 @@ async def submit_quiz(
 @router.get("/certificate", response_model=ApiResponse)
 async def get_certificate(
     user_id: str,
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Get user's certificate if course is completed.
     """
     try:
-        modules_response = db.table("modules").select("id").execute()
-        total_modules = len(modules_response.data) if modules_response.data else 0
-        
-        progress_response = db.table("progress").select("*").eq("user_id", user_id).eq("passed", True).execute()
-        completed_modules = len(progress_response.data) if progress_response.data else 0
+        content, summary_response = await asyncio.gather(
+            course_content_cache.get(db),
+            db.table("course_progress_summary").select("completed_modules").eq("user_id", user_id).execute(),
+        )
+        total_modules = len(content.modules)
+        completed_modules = summary_response.data[0]["completed_modules"] if summary_response.data else 0
         
         if completed_modules < total_modules:
-            return ApiResponse(success=True, data=None, message="Course not completed yet")
+            return api_response(None, message="Course not completed yet")
         
-        cert_response = db.table("certificates").select("*").eq("user_id", user_id).execute()
+        cert_response = await db.table("certificates").select(CERTIFICATE_COLUMNS).eq("user_id", user_id).execute()
         
         if cert_response.data:
             certificate = cert_response.data[0]
@@ -286,10 +480,10 @@ async def get_certificate(
                 "issued_at": get_current_time()
             }
             
-            cert_insert_response = db.table("certificates").insert(certificate_data).execute()
+            cert_insert_response = await db.table("certificates").insert(certificate_data).execute()
             certificate = cert_insert_response.data[0] if cert_insert_response.data else certificate_data
         
-        return ApiResponse(success=True, data=certificate)
+        return api_response(certificate)
         
     except Exception as e:
         raise HTTPException(
@@ -301,14 +495,14 @@ async def get_certificate(
 @router.get("/certificate/download")
 async def download_certificate(
     user_id: str,
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Download certificate as PDF.
     """
     try:
-        cert_response = db.table("certificates").select("*").eq("user_id", user_id).execute()
+        cert_response = await db.table("certificates").select(CERTIFICATE_COLUMNS).eq("user_id", user_id).execute()
         
         if not cert_response.data:
             raise HTTPException(
@@ -316,7 +510,7 @@ async def download_certificate(
                 detail="Certificate not found"
             )
         
-        user_response = db.table("users").select("full_name, email").eq("id", user_id).execute()
+        user_response = await db.table("users").select("full_name, email").eq("id", user_id).execute()
         user_name = user_response.data[0]["full_name"] if user_response.data else "Student"
         
         certificate_content = generate_certificate_content(user_name, cert_response.data[0])
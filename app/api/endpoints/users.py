@@ -1,33 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Any, List
-from supabase import Client
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Any, List, Optional
+from supabase import AsyncClient
 
-from app.schemas.schemas import User, UserCreate, UserUpdate
-from app.services.users import UserService
+from app.schemas.schemas import User, UserCreate, UserUpdate, UserPage
+from app.core.pagination import apply_keyset, split_page
+from app.services.users import USER_COLUMNS, UserService
 from app.api.deps import get_db
 from app.api.endpoints.auth import get_current_active_superuser, get_current_user
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[User])
+@router.get("/", response_model=UserPage)
 async def read_users(
-    skip: int = 0,
-    limit: int = 100,
-    db: Client = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_active_superuser),
 ) -> Any:
     """
     Retrieve users. Only for superusers.
+    Pass the returned next_cursor to get the following page.
     """
-    response = db.table("users").select("*").range(skip, skip + limit - 1).execute()
-    return [User(**item) for item in response.data]
+    try:
+        query = apply_keyset(db.table("users").select(USER_COLUMNS), cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    response = await query.execute()
+    items, next_cursor = split_page(response.data, limit)
+    return UserPage(items=[User(**item) for item in items], next_cursor=next_cursor)
 
 
 @router.post("/", response_model=User)
 async def create_user(
     user_in: UserCreate,
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_active_superuser),
 ) -> Any:
     """
@@ -61,7 +69,7 @@ async def read_user_me(
 @router.put("/me", response_model=User)
 async def update_user_me(
     user_in: UserUpdate,
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
@@ -75,7 +83,7 @@ async def update_user_me(
 @router.get("/{user_id}", response_model=User)
 async def read_user(
     user_id: str,
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_active_superuser),
 ) -> Any:
     """
@@ -97,7 +105,7 @@ async def read_user(
 async def update_user(
     user_id: str,
     user_in: UserUpdate,
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_active_superuser),
 ) -> Any:
     """
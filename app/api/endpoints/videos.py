@@ -1,15 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status, UploadFile, File, Form, Query, Request, Response
+from typing import Any, AsyncIterator, List, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
+from supabase import AsyncClient
 
-from app.db.database import get_supabase_client
-from app.schemas.schemas import Video, VideoCreate, VideoUpdate, User
-from app.services.bunnycdn import BunnyCDNService
+from app.api.deps import get_db
+from app.core.config import settings
+from app.core.fields import parse_fields, project, select_columns
+from app.core.pagination import apply_keyset, split_page
+from app.schemas.schemas import (
+    Video, VideoCreate, VideoUpdate, VideoFields, VideoPage, VideoIngestJob, VideoUpload, VideoUploadCreate, User,
+)
+from app.services.bunnycdn import bunnycdn
+from app.services.ingest import IngestQueueFull, VIDEO_FOLDER, video_file_name, video_ingest, video_row
+from app.services.resumable_upload import UploadConflict, UploadNotFound, contiguous_offset, video_uploads
+from app.services.upload_stream import UploadStream, UploadTooLarge
 from app.api.endpoints.auth import get_current_user
 
 router = APIRouter()
-bunnycdn = BunnyCDNService()
+
+# Columns of the videos table, in response order
+VIDEO_COLUMNS = (
+    "id", "title", "description", "course_id", "url", "user_id", "size_bytes", "sha256", "created_at", "updated_at",
+)
+# Size of the reads from the spooled upload while sending it to BunnyCDN
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def _iter_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+async def _upload_and_create_video(
+    db: AsyncClient,
+    current_user: User,
+    video_id: str,
+    file_name: str,
+    stream: UploadStream,
+    content_length: Optional[int],
+    title: str,
+    description: Optional[str],
+    course_id: Optional[str],
+) -> Video:
+    """
+    Stream the file to BunnyCDN, then create the videos row with the size and
+    SHA-256 computed on the way. The uploaded file is removed if the row cannot
+    be created.
+    """
+    if content_length is not None and content_length > settings.VIDEO_MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="Video is too large")
+    
+    try:
+        upload_result = await bunnycdn.upload_video(
+            file_name, stream, VIDEO_FOLDER, content_length=content_length
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    if not upload_result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to upload video: {upload_result['message']}",
+        )
+    
+    # Create video data in Supabase
+    video_data = video_row(
+        video_id, current_user.id, upload_result["url"], stream, title, description, course_id
+    )
+    
+    # Insert into Supabase
+    response = await db.table("videos").insert(video_data).execute()
+    
+    if not response.data:
+        # If insertion fails, try to delete the uploaded video
+        await bunnycdn.delete_video(file_name, VIDEO_FOLDER)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create video record",
+        )
+    
+    return Video(**response.data[0])
 
 
 @router.post("/", response_model=Video)
@@ -18,104 +89,349 @@ async def create_video(
     description: Optional[str] = Form(None),
     course_id: Optional[str] = Form(None),
     file: UploadFile = File(...),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
-    Upload a new video.
+    Upload a new video as a multipart form.
+    The file is spooled to disk first: use POST /videos/stream for large files.
     """
     # Generate a unique ID for the video
     video_id = str(uuid.uuid4())
     
-    # Extract file extension
-    file_extension = file.filename.split(".")[-1] if "." in file.filename else "mp4"
-    file_name = f"{video_id}.{file_extension}"
+    stream = UploadStream(
+        _iter_upload(file), window=settings.VIDEO_UPLOAD_WINDOW, max_size=settings.VIDEO_MAX_UPLOAD_SIZE
+    )
+    return await _upload_and_create_video(
+        db, current_user, video_id, video_file_name(video_id, file.filename), stream, file.size,
+        title, description, course_id,
+    )
+
+
+@router.post("/stream", response_model=Video)
+async def create_video_stream(
+    request: Request,
+    title: str = Query(...),
+    description: Optional[str] = Query(None),
+    course_id: Optional[str] = Query(None),
+    filename: Optional[str] = Query(None, description="Original file name, for the extension"),
+    db: AsyncClient = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Upload a new video sent as the raw request body (not multipart).
+    The body is piped to BunnyCDN as it arrives, with bounded memory and
+    without a temporary file.
+    """
+    video_id = str(uuid.uuid4())
     
-    # Upload to BunnyCDN
-    upload_result = bunnycdn.upload_video(file_name, file.file, "education")
+    content_length = request.headers.get("content-length")
+    if content_length is not None and not content_length.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
     
-    if not upload_result["success"]:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to upload video: {upload_result['message']}",
-        )
+    stream = UploadStream(
+        request.stream(), window=settings.VIDEO_UPLOAD_WINDOW, max_size=settings.VIDEO_MAX_UPLOAD_SIZE
+    )
+    return await _upload_and_create_video(
+        db, current_user, video_id, video_file_name(video_id, filename), stream,
+        int(content_length) if content_length is not None else None,
+        title, description, course_id,
+    )
+
+
+def _ingest_queue_full(e: IngestQueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": "60"},
+    )
+
+
+@router.post("/ingest", response_model=VideoIngestJob, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_video(
+    request: Request,
+    response: Response,
+    title: str = Query(...),
+    description: Optional[str] = Query(None),
+    course_id: Optional[str] = Query(None),
+    filename: Optional[str] = Query(None, description="Original file name, for the extension"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Upload a new video sent as the raw request body (not multipart) and
+    process it in the background. The body is staged on disk; the response
+    (202) comes as soon as it is received, with a job to poll at
+    GET /videos/jobs/{job_id}. The job id becomes the video id.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length is None or not content_length.isdigit() or int(content_length) == 0:
+        raise HTTPException(status_code=status.HTTP_411_LENGTH_REQUIRED, detail="Content-Length is required")
+    if int(content_length) > settings.VIDEO_MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="Video is too large")
+    try:
+        # Early rejection before the body is staged; submit checks again
+        video_ingest.check_capacity()
+    except IngestQueueFull as e:
+        raise _ingest_queue_full(e)
     
-    # Create video data in Supabase
-    video_data = {
-        "id": video_id,
+    session = await video_uploads.create(current_user.id, int(content_length), {
         "title": title,
         "description": description,
         "course_id": course_id,
-        "url": upload_result["url"],
-        "user_id": current_user.id,
-        "created_at": datetime.utcnow().isoformat(),
+        "filename": filename,
+    })
+    try:
+        session = await video_uploads.write_chunk(session["upload_id"], current_user.id, 0, request.stream())
+        job = await video_ingest.submit(session)
+    except UploadConflict as e:
+        await video_uploads.remove(session["upload_id"])
+        raise HTTPException(status_code=400, detail=str(e))
+    except IngestQueueFull as e:
+        await video_uploads.remove(session["upload_id"])
+        raise _ingest_queue_full(e)
+    except BaseException:
+        await video_uploads.remove(session["upload_id"])
+        raise
+    
+    response.headers["Location"] = f"{request.url.path.rsplit('/', 1)[0]}/jobs/{job['job_id']}"
+    return VideoIngestJob(**job)
+
+
+@router.get("/jobs/{job_id}", response_model=VideoIngestJob)
+async def read_video_ingest_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get the progress of a background video ingest.
+    """
+    job = video_ingest.get_job(job_id)
+    if job is None or (job["user_id"] != current_user.id and not current_user.is_superuser):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return VideoIngestJob(**job)
+
+
+def _video_upload(session: dict) -> VideoUpload:
+    return VideoUpload(
+        upload_id=session["upload_id"],
+        size=session["size"],
+        offset=contiguous_offset(session["received"]),
+        received=session["received"],
+        complete=session["received"] == [[0, session["size"]]],
+        expires_at=datetime.fromtimestamp(session["expires_at"], timezone.utc),
+    )
+
+
+def _upload_headers(session: dict) -> dict:
+    return {
+        "Upload-Offset": str(contiguous_offset(session["received"])),
+        "Upload-Length": str(session["size"]),
+        "Cache-Control": "no-store",
     }
+
+
+def _get_upload(upload_id: str, current_user: User) -> dict:
+    try:
+        return video_uploads.get(upload_id, current_user.id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+
+@router.post("/uploads", response_model=VideoUpload, status_code=status.HTTP_201_CREATED)
+async def create_video_upload(
+    upload: VideoUploadCreate,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Start a resumable upload. Send the file with PATCH /videos/uploads/{upload_id}
+    (Upload-Offset header, raw body), in one or more chunks, in any order or in
+    parallel, then call POST /videos/uploads/{upload_id}/finalize.
+    """
+    if upload.size > settings.VIDEO_MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="Video is too large")
     
-    # Insert into Supabase
-    supabase = get_supabase_client()
-    response = supabase.table("videos").insert(video_data).execute()
+    session = await video_uploads.create(current_user.id, upload.size, {
+        "title": upload.title,
+        "description": upload.description,
+        "course_id": upload.course_id,
+        "filename": upload.filename,
+    })
     
-    if not response.data:
-        # If insertion fails, try to delete the uploaded video
-        bunnycdn.delete_video(file_name, "education")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create video record",
+    response.headers["Location"] = f"{request.url.path.rstrip('/')}/{session['upload_id']}"
+    response.headers.update(_upload_headers(session))
+    return _video_upload(session)
+
+
+@router.head("/uploads/{upload_id}", response_model=None)
+async def get_video_upload_offset(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+) -> Response:
+    """
+    Get the offset to resume a resumable upload from (Upload-Offset header).
+    """
+    return Response(headers=_upload_headers(_get_upload(upload_id, current_user)))
+
+
+@router.get("/uploads/{upload_id}", response_model=VideoUpload)
+async def read_video_upload(
+    upload_id: str,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get the state of a resumable upload, with the received byte ranges.
+    """
+    session = _get_upload(upload_id, current_user)
+    response.headers.update(_upload_headers(session))
+    return _video_upload(session)
+
+
+@router.patch("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, response_model=None)
+async def upload_video_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., description="Offset of the chunk in the file"),
+    current_user: User = Depends(get_current_user),
+) -> Response:
+    """
+    Write a chunk of a resumable upload at Upload-Offset. The body is written
+    to disk as it arrives; if the request is cut off, the bytes received so far
+    are kept.
+    """
+    try:
+        session = await video_uploads.write_chunk(upload_id, current_user.id, upload_offset, request.stream())
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=_upload_headers(session))
+
+
+@router.post("/uploads/{upload_id}/finalize", response_model=Video)
+async def finalize_video_upload(
+    upload_id: str,
+    db: AsyncClient = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Send a complete resumable upload to BunnyCDN and create the video.
+    The video gets the upload id as its id.
+    """
+    try:
+        session = video_uploads.begin_finalize(upload_id, current_user.id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    try:
+        stream = UploadStream(video_uploads.iter_data(upload_id), window=settings.VIDEO_UPLOAD_WINDOW)
+        video = await _upload_and_create_video(
+            db, current_user, session["upload_id"], video_file_name(session["upload_id"], session["filename"]),
+            stream, session["size"], session["title"], session["description"], session["course_id"],
         )
+    finally:
+        video_uploads.end_finalize(upload_id)
     
-    return Video(**response.data[0])
+    await video_uploads.remove(upload_id)
+    return video
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, response_model=None)
+async def delete_video_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+) -> None:
+    """
+    Abort a resumable upload and delete the received data.
+    """
+    _get_upload(upload_id, current_user)
+    if video_uploads.is_finalizing(upload_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload is being finalized")
+    
+    await video_uploads.remove(upload_id)
+    return None
 
 
-@router.get("/", response_model=List[Video])
+@router.get("/", response_model=VideoPage, response_model_exclude_unset=True)
 async def read_videos(
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     course_id: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Retrieve videos, optionally filtered by course_id.
+    Pass the returned next_cursor to get the following page.
     """
-    supabase = get_supabase_client()
-    query = supabase.table("videos").select("*").range(skip, skip + limit - 1)
+    try:
+        requested = parse_fields(fields, VIDEO_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # The pagination keys are always fetched to build the next cursor
+    query = db.table("videos").select(select_columns(requested, VIDEO_COLUMNS, ("created_at", "id")))
     
     # Apply course_id filter if provided
     if course_id:
         query = query.eq("course_id", course_id)
     
-    response = query.execute()
+    try:
+        query = apply_keyset(query, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return [Video(**item) for item in response.data]
+    response = await query.execute()
+    items, next_cursor = split_page(response.data, limit)
+    
+    return VideoPage(
+        items=[VideoFields(**project(item, requested)) for item in items],
+        next_cursor=next_cursor,
+    )
 
 
-@router.get("/{video_id}", response_model=Video)
+@router.get("/{video_id}", response_model=VideoFields, response_model_exclude_unset=True)
 async def read_video(
     video_id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Get a specific video by ID.
     """
-    supabase = get_supabase_client()
-    response = supabase.table("videos").select("*").eq("id", video_id).execute()
+    try:
+        requested = parse_fields(fields, VIDEO_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    response = await db.table("videos").select(select_columns(requested, VIDEO_COLUMNS)).eq("id", video_id).execute()
     
     if not response.data:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    return Video(**response.data[0])
+    return VideoFields(**response.data[0])
 
 
 @router.put("/{video_id}", response_model=Video)
 async def update_video(
     video_id: str,
     video_update: VideoUpdate,
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Update a video's metadata.
     """
     # First, check if the video exists and belongs to the current user
-    supabase = get_supabase_client()
-    response = supabase.table("videos").select("*").eq("id", video_id).execute()
+    response = await db.table("videos").select("id, user_id, url").eq("id", video_id).execute()
     
     if not response.data:
         raise HTTPException(status_code=404, detail="Video not found")
@@ -131,7 +447,7 @@ async def update_video(
     update_data["updated_at"] = datetime.utcnow().isoformat()
     
     # Update in Supabase
-    response = supabase.table("videos").update(update_data).eq("id", video_id).execute()
+    response = await db.table("videos").update(update_data).eq("id", video_id).execute()
     
     if not response.data:
         raise HTTPException(status_code=500, detail="Failed to update video")
@@ -142,14 +458,14 @@ async def update_video(
 @router.delete("/{video_id}", status_code=status.HTTP_204_NO_CONTENT, response_model=None)
 async def delete_video(
     video_id: str,
+    db: AsyncClient = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> None:
     """
     Delete a video.
     """
     # First, check if the video exists and belongs to the current user
-    supabase = get_supabase_client()
-    response = supabase.table("videos").select("*").eq("id", video_id).execute()
+    response = await db.table("videos").select("id, user_id, url").eq("id", video_id).execute()
     
     if not response.data:
         raise HTTPException(status_code=404, detail="Video not found")
@@ -166,10 +482,10 @@ async def delete_video(
     folder = url_parts[-2] if len(url_parts) > 2 else ""
     
     # Delete from BunnyCDN
-    delete_result = bunnycdn.delete_video(file_name, folder)
+    delete_result = await bunnycdn.delete_video(file_name, folder)
     
     # Delete from Supabase (even if BunnyCDN delete fails)
-    supabase.table("videos").delete().eq("id", video_id).execute()
+    await db.table("videos").delete().eq("id", video_id).execute()
     
     # Return no content
     return None
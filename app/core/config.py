@@ -17,11 +17,74 @@ class Settings(BaseSettings):
     # Supabase settings
     SUPABASE_URL: str
     SUPABASE_KEY: str
+    SUPABASE_POOL_MAX_CONNECTIONS: int = 100
+    SUPABASE_POOL_MAX_KEEPALIVE: int = 20
+    SUPABASE_KEEPALIVE_EXPIRY: float = 30.0
+    SUPABASE_TIMEOUT: float = 10.0
+    SUPABASE_CONNECT_TIMEOUT: float = 5.0
+
+    # Auth settings
+    # "local" verifies access tokens in-process, "remote" asks Supabase Auth
+    AUTH_VERIFICATION_MODE: str = "local"
+    SUPABASE_JWT_SECRET: str = ''
+    SUPABASE_JWT_AUDIENCE: str = "authenticated"
+    SUPABASE_JWT_ISSUER: str = ''
+    SUPABASE_JWKS_URL: str = ''
+    JWKS_CACHE_TTL: int = 600
+    JWKS_MIN_REFRESH_INTERVAL: int = 30
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL: int = 300
+    # app_metadata.role of superusers (only settable with the service role key)
+    SUPERUSER_ROLE: str = "admin"
+    # Longest access token lifetime (Supabase caps the JWT expiry at one week)
+    JWT_MAX_LIFETIME: int = 7 * 24 * 60 * 60
+    KNOWN_USERS_CACHE_SIZE: int = 100000
+    
+    # Course content cache: how often to check the content version (seconds)
+    CONTENT_CACHE_CHECK_INTERVAL: float = 30.0
+    
+    # Idempotency-Key replay window for quiz submissions (seconds) and capacity
+    IDEMPOTENCY_TTL: int = 24 * 60 * 60
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    
+    # Write-behind buffer for user_answers: batch size, max wait before a flush
+    # (seconds), queue capacity, spill directory and spill replay interval
+    WRITE_BEHIND_BATCH_SIZE: int = 500
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 1.0
+    WRITE_BEHIND_MAX_QUEUE: int = 50000
+    WRITE_BEHIND_SPILL_DIR: str = "spill"
+    WRITE_BEHIND_RETRY_INTERVAL: float = 30.0
+    WRITE_BEHIND_DRAIN_TIMEOUT: float = 10.0
     
     # BunnyCDN settings
     BUNNYCDN_API_KEY: str
     BUNNYCDN_STORAGE_ZONE: str = ''
     BUNNYCDN_PULL_ZONE: str = ''
+    BUNNYCDN_HTTP2: bool = True
+    BUNNYCDN_POOL_MAX_CONNECTIONS: int = 20
+    BUNNYCDN_POOL_MAX_KEEPALIVE: int = 10
+    BUNNYCDN_KEEPALIVE_EXPIRY: float = 30.0
+    # Per read/write of a chunk, not per transfer
+    BUNNYCDN_TIMEOUT: float = 30.0
+    BUNNYCDN_CONNECT_TIMEOUT: float = 5.0
+    
+    # Video uploads: chunks buffered between the client and BunnyCDN, max size (bytes)
+    VIDEO_UPLOAD_WINDOW: int = 8
+    VIDEO_MAX_UPLOAD_SIZE: int = 10 * 1024 ** 3
+    
+    # Resumable video uploads: staging directory and session lifetime (seconds)
+    RESUMABLE_UPLOAD_DIR: str = "uploads"
+    RESUMABLE_UPLOAD_TTL: int = 24 * 60 * 60
+    
+    # Background video ingest: worker pool size, max queued or running jobs,
+    # attempts per job, retry backoff (seconds) and how long finished jobs are kept
+    VIDEO_INGEST_WORKERS: int = 2
+    VIDEO_INGEST_MAX_PENDING: int = 50
+    VIDEO_INGEST_MAX_ATTEMPTS: int = 5
+    VIDEO_INGEST_RETRY_BASE: float = 2.0
+    VIDEO_INGEST_RETRY_MAX: float = 60.0
+    VIDEO_INGEST_JOB_TTL: int = 24 * 60 * 60
+    VIDEO_INGEST_JOB_CACHE_SIZE: int = 10000
 
     @field_validator("SUPABASE_URL", "SUPABASE_KEY", "BUNNYCDN_API_KEY", mode="before")
     @classmethod
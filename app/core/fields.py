@@ -0,0 +1,40 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+# Sparse fieldsets: clients pass ?fields=a,b,c to get only those fields back.
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated `fields` query parameter.
+
+    Returns:
+        The requested fields in order, or None when all fields are wanted
+
+    Raises:
+        ValueError: If a requested field is not in `allowed`
+    """
+    if not fields:
+        return None
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return requested or None
+
+
+def select_columns(requested: Optional[List[str]], columns: Sequence[str], always: Sequence[str] = ()) -> str:
+    """
+    Build a PostgREST select list for the requested fields plus the columns
+    the endpoint always needs (e.g. pagination keys).
+    """
+    wanted = requested if requested is not None else columns
+    return ",".join(dict.fromkeys([*wanted, *always]))
+
+
+def project(row: Dict[str, Any], requested: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    Keep only the requested fields of a row.
+    """
+    if requested is None:
+        return row
+    return {field: row.get(field) for field in requested}
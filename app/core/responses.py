@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+from typing import Any, Dict, Iterable, Optional
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+from app.schemas.schemas import ApiResponse
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Fast path for ApiResponse envelopes. Handlers return a ready Response, so
+# FastAPI skips response_model validation and serialization (the route keeps
+# response_model=ApiResponse for the OpenAPI docs only).
+
+# Serializes an ApiResponse whose data is a model in one pass, without validation
+_api_response_adapter = TypeAdapter(ApiResponse)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize plain data (dicts, lists, datetimes) to JSON bytes.
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def api_response(
+    data: Any = None,
+    message: Optional[str] = None,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Build a successful ApiResponse envelope as a JSON response.
+
+    Args:
+        data: Payload, either plain data or an already validated Pydantic model
+        message: Optional message
+        status_code: HTTP status code
+        headers: Extra response headers
+
+    Returns:
+        The serialized response
+    """
+    if isinstance(data, BaseModel):
+        envelope = ApiResponse.model_construct(success=True, data=data, message=message, error=None)
+        body = _api_response_adapter.dump_json(envelope)
+    else:
+        body = dumps({"success": True, "data": data, "message": message, "error": None})
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def raw_api_response(
+    data: bytes,
+    message: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Build an ApiResponse response around an already serialized data payload.
+    """
+    return Response(content=envelope(data, message), headers=headers, media_type="application/json")
+
+
+def envelope(data: bytes, message: Optional[str] = None) -> bytes:
+    """
+    Serialized ApiResponse body around an already serialized data payload.
+    """
+    return b'{"success":true,"data":' + data + b',"message":' + dumps(message) + b',"error":null}'
+
+
+def extend_json_object(obj: bytes, extra: Dict[str, Any]) -> bytes:
+    """
+    Append keys to a serialized JSON object without parsing it.
+    The object must be non-empty and must not already contain the keys.
+    """
+    return obj[:-1] + b"," + dumps(extra)[1:]
+
+
+def json_array(items: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+
+def compress_variants(body: bytes) -> Dict[str, bytes]:
+    """
+    Encode a body once in every supported content-coding.
+    Meant for bodies shared by many requests, so the slowest levels are used.
+    """
+    variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+    return variants
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Iterable[str]) -> str:
+    """
+    Pick the best available content-coding for an Accept-Encoding header.
+    Prefers br over gzip on equal q-values; falls back to identity.
+    """
+    weights: Dict[str, float] = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+
+    best, best_q = "identity", 0.0
+    for coding in ("br", "gzip"):
+        q = weights.get(coding, weights.get("*", 0.0))
+        if coding in available and q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag from the values the representation depends on.
+    """
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag (weak comparison, RFC 9110).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    # Clients may keep the body but must revalidate before reusing it
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Empty 304 response for a matching If-None-Match.
+    """
+    return Response(status_code=304, headers=headers or etag_headers(etag))
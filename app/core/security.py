@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import heapq
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.schemas.schemas import User
+
+SYMMETRIC_ALGORITHMS = ("HS256",)
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+
+class TokenVerificationError(Exception):
+    """The token is definitely invalid (bad signature, expired, wrong audience)."""
+
+
+class AmbiguousTokenError(Exception):
+    """The token cannot be judged locally and should be checked by Supabase Auth."""
+
+
+class JWKSCache:
+    """
+    Cache of the Supabase Auth signing keys.
+
+    Keys are refreshed after `ttl` seconds, or earlier when a token refers to
+    an unknown key id (key rotation). Refreshes triggered by unknown key ids
+    are rate limited so that garbage tokens cannot hammer the JWKS endpoint.
+    """
+
+    def __init__(self, url: str, ttl: int, min_refresh_interval: int):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get_key(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Get the JWK for a key id, refreshing the key set when needed.
+
+        Args:
+            kid: Key id from the token header
+
+        Returns:
+            The JWK or None if the key is unknown even after a refresh
+        """
+        now = time.monotonic()
+        expired = now - self._fetched_at > self.ttl
+        unknown = kid not in self._keys
+        if expired or (unknown and now - self._fetched_at > self.min_refresh_interval):
+            async with self._lock:
+                # Another coroutine may have refreshed while we were waiting
+                if time.monotonic() - self._fetched_at > min(self.ttl, self.min_refresh_interval):
+                    await self._refresh()
+        return self._keys.get(kid)
+
+    async def _refresh(self) -> None:
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.get(self.url)
+                response.raise_for_status()
+                keys = response.json().get("keys", [])
+        except Exception as e:
+            # Keep serving the previous key set, remote fallback covers the rest
+            print(f"Warning: Could not refresh JWKS: {str(e)}")
+            keys = None
+        self._fetched_at = time.monotonic()
+        if keys is not None:
+            self._keys = {key["kid"]: key for key in keys if key.get("kid")}
+
+    def clear(self) -> None:
+        self._keys = {}
+        self._fetched_at = 0.0
+
+
+jwks_cache = JWKSCache(
+    settings.SUPABASE_JWKS_URL or f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+    settings.JWKS_CACHE_TTL,
+    settings.JWKS_MIN_REFRESH_INTERVAL,
+)
+
+
+# Resolved users keyed by a hash of the bearer token
+token_cache = TTLCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+# Logged out tokens until their `exp`, with a heap of the expiries to prune them.
+# Not a bounded cache: evicting an entry would make its token valid again.
+revoked_tokens: Dict[str, float] = {}
+_revoked_token_expiries: List[Tuple[float, str]] = []
+# Per-user "revoked before" times in revocation order, kept for the longest
+# token lifetime since every token issued before them has expired by then
+revoked_users: Dict[str, int] = {}
+
+
+def token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_expires_in(token: str) -> float:
+    """
+    Seconds until the token's `exp`, read without verifying the signature.
+    Only used to bound cache lifetimes of tokens that were already verified.
+    """
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return 0.0
+    return float(exp) - time.time() if exp else 0.0
+
+
+def _prune_revocations(now: float) -> None:
+    while _revoked_token_expiries and _revoked_token_expiries[0][0] <= now:
+        exp, key = heapq.heappop(_revoked_token_expiries)
+        if revoked_tokens.get(key) == exp:
+            del revoked_tokens[key]
+    for user_id, revoked_at in list(revoked_users.items()):
+        if revoked_at > now - settings.JWT_MAX_LIFETIME:
+            break
+        del revoked_users[user_id]
+
+
+def is_token_revoked(token: str) -> bool:
+    """
+    Check the token against logged out tokens and revoked users.
+    """
+    now = time.time()
+    _prune_revocations(now)
+    if token_cache_key(token) in revoked_tokens:
+        return True
+    if not revoked_users:
+        return False
+    try:
+        claims = jwt.get_unverified_claims(token)
+    except JWTError:
+        return False
+    revoked_before = revoked_users.get(claims.get("sub"))
+    return revoked_before is not None and claims.get("iat", 0) < revoked_before
+
+
+def revoke_token(token: str) -> None:
+    """
+    Invalidate a single token until it expires, e.g. on logout.
+    """
+    now = time.time()
+    key = token_cache_key(token)
+    token_cache.delete(key)
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        exp = None
+    # Tokens without `exp` are kept for the longest token lifetime
+    exp = float(exp) if exp else now + settings.JWT_MAX_LIFETIME
+    if exp <= now:
+        # Already expired, rejected by verification anyway
+        return
+    revoked_tokens[key] = exp
+    heapq.heappush(_revoked_token_expiries, (exp, key))
+    _prune_revocations(now)
+
+
+def revoke_user(user_id: str) -> int:
+    """
+    Invalidate every token issued to a user before the current second.
+
+    `iat` has one second resolution, so the revocation time is rounded down:
+    a token issued again right after the revocation stays valid, at the cost
+    of also sparing tokens issued earlier in the same second.
+
+    Returns:
+        Number of cached tokens dropped
+    """
+    now = time.time()
+    # Reinserted so that the dict stays ordered by revocation time
+    revoked_users.pop(user_id, None)
+    revoked_users[user_id] = int(now)
+    _prune_revocations(now)
+    return token_cache.delete_where(lambda user: user.id == user_id)
+
+
+async def verify_supabase_token(token: str) -> Dict[str, Any]:
+    """
+    Verify a Supabase access token in-process.
+
+    HS256 tokens are checked against the project's JWT secret, asymmetric
+    tokens against the cached JWKS.
+
+    Args:
+        token: The bearer token
+
+    Returns:
+        The verified token claims
+
+    Raises:
+        TokenVerificationError: If the token is invalid
+        AmbiguousTokenError: If the token cannot be verified locally
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError as e:
+        raise TokenVerificationError(str(e))
+
+    algorithm = header.get("alg")
+    if algorithm in SYMMETRIC_ALGORITHMS:
+        if not settings.SUPABASE_JWT_SECRET:
+            raise AmbiguousTokenError("No JWT secret configured")
+        key: Any = settings.SUPABASE_JWT_SECRET
+    elif algorithm in ASYMMETRIC_ALGORITHMS:
+        key = await jwks_cache.get_key(header.get("kid"))
+        if key is None:
+            raise AmbiguousTokenError(f"Unknown signing key: {header.get('kid')}")
+    else:
+        raise AmbiguousTokenError(f"Unsupported algorithm: {algorithm}")
+
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.SUPABASE_JWT_AUDIENCE,
+            issuer=settings.SUPABASE_JWT_ISSUER or None,
+            options={"require_exp": True, "require_sub": True},
+        )
+    except (ExpiredSignatureError, JWTClaimsError, JWTError) as e:
+        raise TokenVerificationError(str(e))
+
+    if not claims.get("email"):
+        # Phone-only or service tokens carry no email, let Supabase Auth decide
+        raise AmbiguousTokenError("Token has no email claim")
+
+    return claims
+
+
+def is_superuser(app_metadata: Optional[Dict[str, Any]]) -> bool:
+    """
+    Superusers have app_metadata.role set to SUPERUSER_ROLE. Only the service
+    role can write app_metadata, so users cannot grant it to themselves
+    (unlike user_metadata).
+    """
+    return bool(app_metadata) and app_metadata.get("role") == settings.SUPERUSER_ROLE
+
+
+def user_from_claims(claims: Dict[str, Any]) -> User:
+    """
+    Build the User schema from verified token claims. Tokens carry no
+    account timestamps, so created_at and updated_at are left unset.
+    """
+    user_metadata = claims.get("user_metadata") or {}
+
+    return User(
+        id=claims["sub"],
+        email=claims["email"],
+        full_name=user_metadata.get("full_name", ""),
+        is_active=True,
+        is_superuser=is_superuser(claims.get("app_metadata")),
+    )
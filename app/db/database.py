@@ -1,11 +1,63 @@
-from supabase import create_client
+import asyncio
+from typing import Optional
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
 from app.core.config import settings
 
-def get_supabase_client():
+# Process-wide client, created in the app lifespan (or lazily on first use)
+_client: Optional[AsyncClient] = None
+_http_client: Optional[httpx.AsyncClient] = None
+_init_lock = asyncio.Lock()
+
+
+async def init_supabase_client() -> AsyncClient:
+    """
+    Create the shared async Supabase client and its pooled HTTP session.
+    """
+    global _client, _http_client
+
+    async with _init_lock:
+        if _client is not None:
+            return _client
+
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.SUPABASE_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.SUPABASE_TIMEOUT,
+                connect=settings.SUPABASE_CONNECT_TIMEOUT,
+            ),
+            follow_redirects=True,
+        )
+        _client = await acreate_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_KEY,
+            options=AsyncClientOptions(httpx_client=_http_client),
+        )
+        return _client
+
+
+async def close_supabase_client() -> None:
+    """
+    Close the shared client's HTTP connections.
+    """
+    global _client, _http_client
+
+    if _http_client is not None:
+        await _http_client.aclose()
+    _client = None
+    _http_client = None
+
+
+async def get_supabase_client() -> AsyncClient:
     """
-    Create and return a Supabase client instance.
+    Return the shared async Supabase client instance.
     """
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    return _client or await init_supabase_client()
 
 
 # Example of a basic database utility function
@@ -20,11 +72,11 @@ async def fetch_data(table_name: str, query=None):
     Returns:
         The query results
     """
-    client = get_supabase_client()
+    client = await get_supabase_client()
     
     base_query = client.table(table_name).select("*")
     
     if query:
-        return query(base_query).execute()
+        return await query(base_query).execute()
     
-    return base_query.execute()
+    return await base_query.execute()
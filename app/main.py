@@ -1,28 +1,17 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.api import api_router
 from app.core.config import settings, validate_settings
+from app.db.database import init_supabase_client, close_supabase_client, get_supabase_client
+from app.services.bunnycdn import bunnycdn
+from app.services.ingest import video_ingest
+from app.services.write_behind import user_answers_writer
 
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_PREFIX}/openapi.json",
-    docs_url=f"{settings.API_PREFIX}/docs",
-    redoc_url=f"{settings.API_PREFIX}/redoc",
-    debug=settings.DEBUG,
-)
 
-# Set up CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # TODO: In production, replace with specific origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.on_event("startup")
-async def validate_config():
+def validate_config():
     try:
         config = validate_settings()
         
@@ -50,6 +39,39 @@ async def validate_config():
         import sys
         sys.exit(1)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    validate_config()
+    await init_supabase_client()
+    user_answers_writer.start(get_supabase_client)
+    await video_ingest.start(get_supabase_client)
+    yield
+    await video_ingest.stop()
+    await user_answers_writer.stop(settings.WRITE_BEHIND_DRAIN_TIMEOUT)
+    await bunnycdn.close()
+    await close_supabase_client()
+
+
+app = FastAPI(
+    title=settings.PROJECT_NAME,
+    openapi_url=f"{settings.API_PREFIX}/openapi.json",
+    docs_url=f"{settings.API_PREFIX}/docs",
+    redoc_url=f"{settings.API_PREFIX}/redoc",
+    debug=settings.DEBUG,
+    lifespan=lifespan,
+)
+
+# Set up CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # TODO: In production, replace with specific origins
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed"],
+)
+
 app.include_router(api_router, prefix=settings.API_PREFIX)
 app.include_router(api_router, prefix="/v1")
 
@@ -28,7 +28,13 @@ class UserInDB(UserBase):
 
 
 class User(UserInDB):
-    pass
+    # Unknown for users resolved from a verified token alone
+    created_at: Optional[datetime] = None
+
+
+class UserPage(BaseModel):
+    items: List[User]
+    next_cursor: Optional[str] = None
 
 
 class Token(BaseModel):
@@ -60,6 +66,8 @@ class VideoInDB(VideoBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     user_id: str
+    size_bytes: Optional[int] = None
+    sha256: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -69,6 +77,58 @@ class Video(VideoInDB):
     pass
 
 
+class VideoFields(BaseModel):
+    """Video with a sparse fieldset: only the requested fields are set."""
+    id: Optional[str] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    course_id: Optional[str] = None
+    url: Optional[str] = None
+    user_id: Optional[str] = None
+    size_bytes: Optional[int] = None
+    sha256: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class VideoPage(BaseModel):
+    items: List[VideoFields]
+    next_cursor: Optional[str] = None
+
+
+class VideoUploadCreate(VideoBase):
+    """Start of a resumable video upload."""
+    size: int = Field(..., gt=0)
+    filename: Optional[str] = None
+
+
+class VideoUpload(BaseModel):
+    """State of a resumable video upload."""
+    upload_id: str
+    size: int
+    # Bytes received from the start without a gap (where a sequential client resumes)
+    offset: int
+    # Received byte ranges [start, end), for clients sending chunks in parallel
+    received: List[List[int]]
+    complete: bool
+    expires_at: datetime
+
+
+class VideoIngestJob(BaseModel):
+    """State of a background video ingest."""
+    job_id: str
+    # queued, uploading, saving, retrying, done or failed
+    status: str
+    attempts: int
+    size: int
+    uploaded_bytes: int
+    video: Optional[Video] = None
+    error: Optional[str] = None
+    next_attempt_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+
+
 # New schemas for course dashboard functionality
 
 class ModuleBlockBase(BaseModel):
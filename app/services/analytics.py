@@ -0,0 +1,137 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.content import CourseContent
+from app.services.quiz import QuestionGrader
+
+# Aggregates are kept up to date by the record_quiz_analytics() database
+# function (see supabase/migrations/20261017000006_quiz_analytics.sql).
+
+# answer_option_stats key of the picks that are not among the question's options
+OTHER_OPTION = ""
+
+
+def chosen_options(grader: QuestionGrader, answer_text: str) -> List[str]:
+    """
+    Options picked in an answer to a single or multi choice question,
+    split the same way the grader reads them. Text that is not one of the
+    question's options is reported as OTHER_OPTION, so clients cannot add
+    rows to the stats. Free-form answers have none.
+    """
+    if not isinstance(answer_text, str) or not answer_text:
+        return []
+    if grader.type == "single":
+        options = [answer_text]
+    elif grader.type == "multi":
+        options = [option for option in answer_text.split(", ") if option]
+    else:
+        return []
+    return sorted({option if option in grader.options else OTHER_OPTION for option in options})
+
+
+def quiz_analytics_params(
+    module_id: int,
+    score: int,
+    passed: bool,
+    answer_key: Dict[int, QuestionGrader],
+    user_answers: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Parameters of record_quiz_analytics() for one graded quiz submission.
+    """
+    return {
+        "p_module_id": module_id,
+        "p_score": score,
+        "p_passed": passed,
+        "p_answers": [
+            {
+                "question_id": answer["question_id"],
+                "is_correct": answer["is_correct"],
+                "options": chosen_options(answer_key[answer["question_id"]], answer["answer_text"]),
+            }
+            for answer in user_answers
+        ],
+    }
+
+
+async def fetch_all_rows(build_query: Callable[[], Any], page_size: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Read every row of a query in pages (PostgREST caps rows per request).
+
+    Args:
+        build_query: Returns a fresh, ordered query builder on each call
+        page_size: Rows per request
+    """
+    rows: List[Dict[str, Any]] = []
+    while True:
+        response = await build_query().range(len(rows), len(rows) + page_size - 1).execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+def _rate(part: float, total: float) -> Optional[float]:
+    return round(part / total, 4) if total else None
+
+
+def build_analytics_report(
+    content: CourseContent,
+    module_rows: List[Dict[str, Any]],
+    question_rows: List[Dict[str, Any]],
+    option_rows: List[Dict[str, Any]],
+    module_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Combine the aggregate rows with the course tree into a per-module report:
+    pass rate and average score, then per question the correctness rate and
+    the distribution of picked options.
+    """
+    modules_stats = {row["module_id"]: row for row in module_rows}
+    questions_stats = {row["question_id"]: row for row in question_rows}
+    options_stats: Dict[int, Dict[str, int]] = {}
+    for row in option_rows:
+        options_stats.setdefault(row["question_id"], {})[row["answer_text"]] = row["picks"]
+
+    modules = [content.modules_by_id[module_id]] if module_id is not None else content.modules
+    report = []
+    for module in modules:
+        stats = modules_stats.get(module["id"], {})
+        submissions = stats.get("submissions", 0)
+        questions = []
+        for question in module["questions"]:
+            question_stats = questions_stats.get(question["id"], {})
+            attempts = question_stats.get("attempts", 0)
+            picks = options_stats.get(question["id"], {})
+            correct_options = {a["answer_text"] for a in question["answers"] if a.get("is_correct")}
+            is_choice = question["type"] in ("single", "multi")
+            option_texts = list(dict.fromkeys(a["answer_text"] for a in question["answers"])) if is_choice else []
+            # The other bucket, plus options removed since they were picked
+            other_picks = sum(count for text, count in picks.items() if text not in option_texts)
+            questions.append({
+                "question_id": question["id"],
+                "question_text": question["question_text"],
+                "type": question["type"],
+                "attempts": attempts,
+                "correct_rate": _rate(question_stats.get("correct", 0), attempts),
+                "options": [
+                    {
+                        "answer_text": text,
+                        "is_correct": text in correct_options,
+                        "picks": picks.get(text, 0),
+                        # Share of attempts that picked the option
+                        "share": _rate(picks.get(text, 0), attempts),
+                    }
+                    for text in option_texts
+                ],
+                "other_picks": other_picks,
+                "other_share": _rate(other_picks, attempts),
+            })
+        report.append({
+            "module_id": module["id"],
+            "title": module["title"],
+            "submissions": submissions,
+            "pass_rate": _rate(stats.get("passed", 0), submissions),
+            "average_score": round(stats["score_sum"] / submissions, 2) if submissions else None,
+            "questions": questions,
+        })
+    return report
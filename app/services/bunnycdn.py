@@ -1,7 +1,16 @@
-import requests
-from typing import Optional, Dict, Any, BinaryIO
+import asyncio
+from typing import Optional, Dict, Any, AsyncIterable, Union
+
+import httpx
+
 from app.core.config import settings
 
+try:
+    import h2  # noqa: F401  (HTTP/2 support for httpx)
+except ImportError:  # pragma: no cover - optional dependency
+    h2 = None
+
+
 class BunnyCDNService:
     def __init__(self):
         self.api_key = settings.BUNNYCDN_API_KEY
@@ -12,32 +21,93 @@ class BunnyCDNService:
             "AccessKey": self.api_key,
             "Content-Type": "application/json"
         }
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_lock = asyncio.Lock()
+
+    async def get_client(self) -> httpx.AsyncClient:
+        """
+        Return the pooled HTTP client for the storage API, creating it on first use.
+        Connections are kept alive between calls and multiplexed over HTTP/2
+        when the h2 package is installed.
+        """
+        if self._client is not None:
+            return self._client
+
+        async with self._client_lock:
+            if self._client is None:
+                http2 = settings.BUNNYCDN_HTTP2 and h2 is not None
+                if settings.BUNNYCDN_HTTP2 and not http2:
+                    print("Warning: h2 is not installed, BunnyCDN requests use HTTP/1.1")
+                self._client = httpx.AsyncClient(
+                    http2=http2,
+                    limits=httpx.Limits(
+                        max_connections=settings.BUNNYCDN_POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.BUNNYCDN_POOL_MAX_KEEPALIVE,
+                        keepalive_expiry=settings.BUNNYCDN_KEEPALIVE_EXPIRY,
+                    ),
+                    # The read/write timeouts apply per chunk, not to the whole transfer
+                    timeout=httpx.Timeout(
+                        settings.BUNNYCDN_TIMEOUT,
+                        connect=settings.BUNNYCDN_CONNECT_TIMEOUT,
+                    ),
+                )
+            return self._client
 
-    def upload_video(self, file_path: str, file_object: BinaryIO, folder_path: Optional[str] = "") -> Dict[str, Any]:
+    async def close(self) -> None:
+        """
+        Close the pooled HTTP connections.
+        """
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def file_url(self, file_path: str, folder_path: Optional[str] = "") -> str:
+        return f"{self.storage_url}/{folder_path}/{file_path}"
+
+    def public_url(self, file_path: str, folder_path: Optional[str] = "") -> str:
+        return f"https://{self.pull_zone}.b-cdn.net/{folder_path}/{file_path}"
+
+    async def upload_video(
+        self,
+        file_path: str,
+        content: Union[bytes, AsyncIterable[bytes]],
+        folder_path: Optional[str] = "",
+        content_length: Optional[int] = None,
+    ) -> Dict[str, Any]:
         """
         Upload a video file to BunnyCDN storage.
-        
+
         Args:
             file_path: The path/name for the file in BunnyCDN storage
-            file_object: The file object to upload
+            content: The file content, as bytes or an async iterator of chunks
             folder_path: Optional folder path within the storage zone
-            
+            content_length: Size of the file if known, sent instead of a chunked body
+
         Returns:
             Response from the BunnyCDN API
         """
-        upload_url = f"{self.storage_url}/{folder_path}/{file_path}"
-        
+        upload_url = self.file_url(file_path, folder_path)
+
         # Set binary content type header
         headers = self.headers.copy()
         headers["Content-Type"] = "application/octet-stream"
-        
-        response = requests.put(upload_url, data=file_object, headers=headers)
-        
+        if content_length is not None:
+            headers["Content-Length"] = str(content_length)
+
+        try:
+            client = await self.get_client()
+            response = await client.put(upload_url, content=content, headers=headers)
+        except httpx.HTTPError as e:
+            return {
+                "success": False,
+                "message": f"BunnyCDN request failed: {str(e) or type(e).__name__}"
+            }
+
         if response.status_code in (200, 201):
             # Return the URL to the uploaded video
             return {
                 "success": True,
-                "url": f"https://{self.pull_zone}.b-cdn.net/{folder_path}/{file_path}",
+                "url": self.public_url(file_path, folder_path),
                 "message": "Upload successful"
             }
         else:
@@ -47,21 +117,28 @@ class BunnyCDNService:
                 "message": response.text
             }
 
-    def delete_video(self, file_path: str, folder_path: Optional[str] = "") -> Dict[str, Any]:
+    async def delete_video(self, file_path: str, folder_path: Optional[str] = "") -> Dict[str, Any]:
         """
         Delete a video file from BunnyCDN storage.
-        
+
         Args:
             file_path: The path/name of the file to delete
             folder_path: Optional folder path within the storage zone
-            
+
         Returns:
             Response from the BunnyCDN API
         """
-        delete_url = f"{self.storage_url}/{folder_path}/{file_path}"
-        
-        response = requests.delete(delete_url, headers=self.headers)
-        
+        delete_url = self.file_url(file_path, folder_path)
+
+        try:
+            client = await self.get_client()
+            response = await client.delete(delete_url, headers=self.headers)
+        except httpx.HTTPError as e:
+            return {
+                "success": False,
+                "message": f"BunnyCDN request failed: {str(e) or type(e).__name__}"
+            }
+
         if response.status_code == 200:
             return {
                 "success": True,
@@ -74,26 +151,33 @@ class BunnyCDNService:
                 "message": response.text
             }
 
-    def get_video_info(self, file_path: str, folder_path: Optional[str] = "") -> Dict[str, Any]:
+    async def get_video_info(self, file_path: str, folder_path: Optional[str] = "") -> Dict[str, Any]:
         """
         Get information about a video file in BunnyCDN storage.
-        
+
         Args:
             file_path: The path/name of the file
             folder_path: Optional folder path within the storage zone
-            
+
         Returns:
             Response from the BunnyCDN API with file information
         """
-        info_url = f"{self.storage_url}/{folder_path}/{file_path}"
-        
-        response = requests.get(info_url, headers=self.headers)
-        
+        info_url = self.file_url(file_path, folder_path)
+
+        try:
+            client = await self.get_client()
+            response = await client.get(info_url, headers=self.headers)
+        except httpx.HTTPError as e:
+            return {
+                "success": False,
+                "message": f"BunnyCDN request failed: {str(e) or type(e).__name__}"
+            }
+
         if response.status_code == 200:
             return {
                 "success": True,
                 "file_info": response.json(),
-                "streaming_url": f"https://{self.pull_zone}.b-cdn.net/{folder_path}/{file_path}"
+                "streaming_url": self.public_url(file_path, folder_path)
             }
         else:
             return {
@@ -101,3 +185,6 @@ class BunnyCDNService:
                 "status_code": response.status_code,
                 "message": response.text
             }
+
+
+bunnycdn = BunnyCDNService()
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+from supabase import AsyncClient
+
+from app.core.config import settings
+from app.core.responses import compress_variants, dumps, envelope, json_array
+from app.services.quiz import compile_answer_key
+
+# Whole course tree in one PostgREST request using embedded resources
+COURSE_TREE_SELECT = (
+    "id, title, description, order, slug, "
+    "blocks:module_blocks(id, module_id, order, type, content), "
+    "questions(id, module_id, question_text, type, tolerance, exact_match, "
+    "answers(id, question_id, answer_text, is_correct))"
+)
+
+
+def stitch_course_tree(modules_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Normalize embedded module rows: blocks sorted by order, questions and
+    answers sorted by id, missing relations replaced with empty lists.
+    """
+    for module in modules_data:
+        module["blocks"] = sorted(module.get("blocks") or [], key=lambda b: b["order"])
+        questions = sorted(module.get("questions") or [], key=lambda q: q["id"])
+        for question in questions:
+            question["answers"] = sorted(question.get("answers") or [], key=lambda a: a["id"])
+        module["questions"] = questions
+    return modules_data
+
+
+async def fetch_course_tree(db: AsyncClient) -> List[Dict[str, Any]]:
+    """
+    Fetch all modules with their blocks, questions and answers.
+    The number of queries is constant regardless of the course size.
+    """
+    response = await db.table("modules").select(COURSE_TREE_SELECT).order("order").execute()
+    return stitch_course_tree(response.data or [])
+
+
+class CourseContent:
+    """
+    Snapshot of the course tree at one content version.
+    Treat as read-only: it is shared by all requests.
+    """
+
+    def __init__(self, modules: List[Dict[str, Any]], version: Optional[int]):
+        self.modules = modules
+        self.modules_by_id = {module["id"]: module for module in modules}
+        self.modules_by_slug = {module["slug"]: module for module in modules if module.get("slug")}
+        self.module_index = {module["id"]: i for i, module in enumerate(modules)}
+        self.answer_keys = {
+            module["id"]: compile_answer_key(module["questions"]) for module in modules
+        }
+        self.version = version
+        self.loaded_at = datetime.now(timezone.utc)
+        # Identifies this snapshot in ETags; without a version every reload is new
+        self.tag = f"v{version}" if version is not None else f"t{self.loaded_at.timestamp()}"
+        # Serialized once per version; per-user views splice their overlay in
+        self.module_json = {module["id"]: dumps(module) for module in modules}
+        self.tree_json = json_array(self.module_json[module["id"]] for module in modules)
+        self._encoded_tree: Optional[Dict[str, bytes]] = None
+        self._encode_lock = asyncio.Lock()
+
+    async def encoded_tree(self) -> Dict[str, bytes]:
+        """
+        The shared tree as an ApiResponse body in every supported
+        content-coding, compressed on first use in a worker thread.
+        """
+        if self._encoded_tree is None:
+            async with self._encode_lock:
+                if self._encoded_tree is None:
+                    self._encoded_tree = await asyncio.to_thread(
+                        compress_variants, envelope(self.tree_json)
+                    )
+        return self._encoded_tree
+
+
+class CourseContentCache:
+    """
+    In-process cache of the whole course tree.
+
+    At most once per `check_interval` seconds the cache reads the single-row
+    course_content_version table (bumped by triggers on every content change)
+    and reloads the tree only when the version moved. If the version table is
+    unavailable the tree is simply reloaded every `check_interval` seconds.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._content: Optional[CourseContent] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.refreshes = 0
+        self.version_checks = 0
+        self.last_refresh_duration: Optional[float] = None
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._content is not None
+            and time.monotonic() - self._checked_at < self.check_interval
+        )
+
+    async def get(self, db: AsyncClient) -> CourseContent:
+        """
+        Get the current course content, refreshing it when needed.
+        """
+        if self._is_fresh():
+            return self._content
+
+        async with self._lock:
+            # Another request may have refreshed while we were waiting
+            if self._is_fresh():
+                return self._content
+
+            version = await self._fetch_version(db)
+            if self._content is None or version is None or version != self._content.version:
+                started = time.perf_counter()
+                modules = await fetch_course_tree(db)
+                self._content = CourseContent(modules, version)
+                self.last_refresh_duration = time.perf_counter() - started
+                self.refreshes += 1
+            self._checked_at = time.monotonic()
+
+        return self._content
+
+    async def _fetch_version(self, db: AsyncClient) -> Optional[int]:
+        self.version_checks += 1
+        try:
+            response = await db.table("course_content_version").select("version").eq("id", 1).execute()
+        except Exception as e:
+            print(f"Warning: Could not read course content version: {str(e)}")
+            return None
+        return response.data[0]["version"] if response.data else None
+
+    def invalidate(self) -> None:
+        """
+        Drop the cached tree so the next request reloads it.
+        """
+        self._content = None
+        self._checked_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        content = self._content
+        return {
+            "version": content.version if content else None,
+            "modules": len(content.modules) if content else 0,
+            "loaded_at": content.loaded_at.isoformat() if content else None,
+            "age_seconds": (
+                round((datetime.now(timezone.utc) - content.loaded_at).total_seconds(), 3)
+                if content else None
+            ),
+            "last_refresh_duration_ms": (
+                round(self.last_refresh_duration * 1000, 3)
+                if self.last_refresh_duration is not None else None
+            ),
+            "tree_bytes": (
+                {coding: len(body) for coding, body in content._encoded_tree.items()}
+                if content and content._encoded_tree else None
+            ),
+            "refreshes": self.refreshes,
+            "version_checks": self.version_checks,
+            "check_interval": self.check_interval,
+        }
+
+
+course_content_cache = CourseContentCache(settings.CONTENT_CACHE_CHECK_INTERVAL)
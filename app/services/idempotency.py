@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+class IdempotencyKeyReuseError(Exception):
+    """The key was already used with a different request body."""
+
+
+def request_fingerprint(payload: Any) -> str:
+    """
+    Stable hash of a JSON-compatible request body.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Remembers the results of completed operations by idempotency key and
+    collapses concurrent duplicates into a single in-flight execution.
+
+    Only successful results are stored: a failed operation can be retried
+    with the same key. The store is per process, so replays are only
+    recognised by the worker that ran the original request.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._results = TTLCache(maxsize, ttl)
+        self._in_flight: Dict[Hashable, Tuple[str, "asyncio.Future[Any]"]] = {}
+        self.replays = 0
+        self.collapsed = 0
+
+    async def run(
+        self, key: Hashable, fingerprint: str, operation: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Run an operation once per key.
+
+        Args:
+            key: Scoped idempotency key (e.g. user, resource and client key)
+            fingerprint: Hash of the request body
+            operation: Coroutine function producing the result
+
+        Returns:
+            The result and whether it was replayed from an earlier execution
+
+        Raises:
+            IdempotencyKeyReuseError: If the key was used with another body
+        """
+        stored = self._results.get(key)
+        if stored is not None:
+            self._check(stored[0], fingerprint)
+            self.replays += 1
+            return stored[1], True
+
+        while key in self._in_flight:
+            in_flight_fingerprint, in_flight = self._in_flight[key]
+            self._check(in_flight_fingerprint, fingerprint)
+            self.collapsed += 1
+            # wait() never cancels the original when a duplicate disconnects
+            await asyncio.wait({in_flight})
+            if not in_flight.cancelled():
+                return in_flight.result(), True
+            # The original request was cancelled (client disconnect): the first
+            # duplicate to wake up runs the operation again, the others wait for it
+
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            result = await operation()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody was waiting for it
+            future.exception()
+            raise
+        else:
+            self._results.set(key, (fingerprint, result))
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._in_flight[key]
+
+    @staticmethod
+    def _check(stored_fingerprint: str, fingerprint: str) -> None:
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyKeyReuseError("Idempotency-Key was already used with a different request")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._results.stats(),
+            "in_flight": len(self._in_flight),
+            "replays": self.replays,
+            "collapsed": self.collapsed,
+        }
+
+
+quiz_submissions = IdempotencyStore(settings.IDEMPOTENCY_CACHE_SIZE, settings.IDEMPOTENCY_TTL)
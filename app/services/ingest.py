@@ -0,0 +1,313 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from supabase import AsyncClient
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.bunnycdn import bunnycdn
+from app.services.resumable_upload import (
+    ResumableUploadStore, UploadConflict, UploadLocked, UploadNotFound, video_uploads,
+)
+from app.services.upload_stream import UploadStream
+
+# Folder of the uploaded videos in the storage zone
+VIDEO_FOLDER = "education"
+
+
+def video_file_name(video_id: str, filename: Optional[str]) -> str:
+    file_extension = filename.split(".")[-1] if filename and "." in filename else "mp4"
+    return f"{video_id}.{file_extension}"
+
+
+def video_row(
+    video_id: str,
+    user_id: str,
+    url: str,
+    stream: UploadStream,
+    title: str,
+    description: Optional[str],
+    course_id: Optional[str],
+) -> Dict[str, Any]:
+    """
+    videos row for an uploaded file, with the size and SHA-256 computed on the way.
+    """
+    return {
+        "id": video_id,
+        "title": title,
+        "description": description,
+        "course_id": course_id,
+        "url": url,
+        "user_id": user_id,
+        "size_bytes": stream.size,
+        "sha256": stream.sha256,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+class IngestError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class VideoIngestQueue:
+    """
+    Background ingest of staged video uploads: a bounded pool of workers
+    sends each file to BunnyCDN and creates its videos row, retrying failures
+    with exponential backoff.
+
+    Files are staged in the resumable upload store; a session marked for
+    ingest stays on disk until its job ends, so jobs interrupted by a restart
+    are queued again on the next start. Each job holds its session's claim
+    (see ResumableUploadStore.claim), so processes sharing the staging
+    directory never ingest the same session twice. Job states are kept in
+    memory, finished ones for `job_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        store: ResumableUploadStore,
+        workers: int,
+        max_pending: int,
+        max_attempts: int,
+        retry_base: float,
+        retry_max: float,
+        job_ttl: float,
+        job_cache_size: int,
+    ):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._get_client: Optional[Callable[[], Awaitable[AsyncClient]]] = None
+        # Queued and running jobs, then finished ones until they expire
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        # Slots taken by submits that are not queued yet
+        self._reserved = 0
+        self._finished = TTLCache(maxsize=job_cache_size, ttl=job_ttl)
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._jobs) + self._reserved
+
+    def check_capacity(self) -> None:
+        """
+        Raise IngestQueueFull if max_pending jobs are already queued or running.
+        """
+        if self.pending >= self.max_pending:
+            raise IngestQueueFull("Too many videos are being processed, try again later")
+
+    async def start(self, get_client: Callable[[], Awaitable[AsyncClient]]) -> None:
+        """
+        Start the workers and queue the jobs left over from a previous run.
+
+        Args:
+            get_client: Returns the Supabase client used for the inserts
+        """
+        if self._tasks:
+            return
+        self._get_client = get_client
+        for session in await self.store.list_sessions():
+            if not session.get("ingest") or session["upload_id"] in self._jobs:
+                continue
+            try:
+                self._enqueue(self.store.claim(session))
+            except (UploadLocked, UploadNotFound):
+                # Ingested by another process sharing the staging directory
+                continue
+            except UploadConflict:
+                # Not a complete upload, nothing to resume
+                await self.store.remove(session["upload_id"])
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """
+        Stop the workers. Unfinished jobs stay staged and resume on the next start.
+        """
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queue a fully staged upload session. Raises IngestQueueFull if the
+        queue is full, UploadConflict if the session is incomplete or already
+        being finalized.
+
+        Returns:
+            The new job
+        """
+        # Checked and reserved before the first await, so that concurrent
+        # submits cannot go past max_pending
+        self.check_capacity()
+        self._reserved += 1
+        try:
+            self.store.claim(session)
+            try:
+                session = await self.store.update(session["upload_id"], {"ingest": True})
+            except BaseException:
+                self.store.end_finalize(session["upload_id"])
+                raise
+        finally:
+            self._reserved -= 1
+        return self._enqueue(session)
+
+    def _enqueue(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        job = {
+            "job_id": session["upload_id"],
+            "user_id": session["user_id"],
+            "status": "queued",
+            "attempts": 0,
+            "size": session["size"],
+            "uploaded_bytes": 0,
+            "video": None,
+            "error": None,
+            "next_attempt_at": None,
+            "created_at": now,
+            "updated_at": now,
+            "session": session,
+        }
+        self._jobs[job["job_id"]] = job
+        self._queue.put_nowait(job["job_id"])
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id) or self._finished.get(job_id)
+
+    def _set(self, job: Dict[str, Any], **fields: Any) -> None:
+        job.update(fields, updated_at=datetime.now(timezone.utc))
+
+    async def _work(self) -> None:
+        while True:
+            job = self._jobs.get(await self._queue.get())
+            if job is not None:
+                await self._process(job)
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        upload_id = job["job_id"]
+        session = job["session"]
+        url: Optional[str] = None
+
+        for attempt in range(1, self.max_attempts + 1):
+            self._set(job, attempts=attempt, next_attempt_at=None)
+            try:
+                if url is None:
+                    url = await self._upload(job, session)
+                self._set(job, status="saving")
+                video = await self._save(job, session, url)
+            except IngestError as e:
+                error = str(e)
+                retryable = e.retryable
+            except asyncio.CancelledError:
+                # Shutting down: the session stays staged and is resumed on the next start
+                raise
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                retryable = True
+            else:
+                self._finish(job, status="done", video=video, error=None)
+                self.succeeded += 1
+                break
+
+            if not retryable or attempt == self.max_attempts:
+                print(f"Warning: Video ingest {upload_id} failed after {attempt} attempts: {error}")
+                if url is not None:
+                    await bunnycdn.delete_video(video_file_name(upload_id, session.get("filename")), VIDEO_FOLDER)
+                self._finish(job, status="failed", error=error)
+                self.failed += 1
+                break
+
+            self.retries += 1
+            delay = min(self.retry_max, self.retry_base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            self._set(
+                job, status="retrying", error=error,
+                next_attempt_at=datetime.now(timezone.utc) + timedelta(seconds=delay),
+            )
+            await asyncio.sleep(delay)
+
+        # Removed before the claim is released so that no other process picks it up
+        await self.store.remove(upload_id)
+        self.store.end_finalize(upload_id)
+
+    async def _upload(self, job: Dict[str, Any], session: Dict[str, Any]) -> str:
+        self._set(job, status="uploading", uploaded_bytes=0)
+
+        async def staged_data() -> AsyncIterator[bytes]:
+            async for chunk in self.store.iter_data(job["job_id"]):
+                job["uploaded_bytes"] += len(chunk)
+                yield chunk
+
+        stream = UploadStream(staged_data(), window=settings.VIDEO_UPLOAD_WINDOW)
+        result = await bunnycdn.upload_video(
+            video_file_name(job["job_id"], session.get("filename")), stream, VIDEO_FOLDER,
+            content_length=session["size"],
+        )
+        if not result["success"]:
+            status_code = result.get("status_code")
+            # Network errors, throttling and server errors are worth another try
+            raise IngestError(
+                f"Failed to upload video: {result['message']}",
+                retryable=status_code is None or status_code == 429 or status_code >= 500,
+            )
+        job["stream"] = stream
+        return result["url"]
+
+    async def _save(self, job: Dict[str, Any], session: Dict[str, Any], url: str) -> Dict[str, Any]:
+        row = video_row(
+            job["job_id"], session["user_id"], url, job["stream"],
+            session["title"], session.get("description"), session.get("course_id"),
+        )
+        client = await self._get_client()
+        # Upsert so that a retry after a lost response does not conflict
+        response = await client.table("videos").upsert(row, on_conflict="id").execute()
+        if not response.data:
+            raise IngestError("Failed to create video record")
+        return response.data[0]
+
+    def _finish(self, job: Dict[str, Any], **fields: Any) -> None:
+        job.pop("session", None)
+        job.pop("stream", None)
+        self._set(job, next_attempt_at=None, **fields)
+        self._jobs.pop(job["job_id"], None)
+        self._finished.set(job["job_id"], job)
+
+    def stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+        return {
+            "workers": len(self._tasks),
+            "pending": self.pending,
+            "statuses": statuses,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+
+video_ingest = VideoIngestQueue(
+    video_uploads,
+    workers=settings.VIDEO_INGEST_WORKERS,
+    max_pending=settings.VIDEO_INGEST_MAX_PENDING,
+    max_attempts=settings.VIDEO_INGEST_MAX_ATTEMPTS,
+    retry_base=settings.VIDEO_INGEST_RETRY_BASE,
+    retry_max=settings.VIDEO_INGEST_RETRY_MAX,
+    job_ttl=settings.VIDEO_INGEST_JOB_TTL,
+    job_cache_size=settings.VIDEO_INGEST_JOB_CACHE_SIZE,
+)
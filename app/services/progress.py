@@ -1,49 +1,27 @@
 from typing import Dict, List, Any, Tuple, Optional
 from app.schemas.schemas import CourseProgress
 
-def calculate_highest_score(progress_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """
-    Calculate the highest score from user's progress data.
-    """
-    highest_score = {"module": 0, "score": 0}
-    if progress_data:
-        scores = [(p["module_id"], p["score"] or 0) for p in progress_data if p.get("score")]
-        if scores:
-            highest_score = {
-                "module": max(scores, key=lambda x: x[1])[0], 
-                "score": max(scores, key=lambda x: x[1])[1]
-            }
-    return highest_score
-
-def get_last_activity(progress_data: List[Dict[str, Any]]) -> str:
-    """
-    Get the most recent activity timestamp from progress data.
-    """
-    last_activity = "Never"
-    if progress_data:
-        latest = max(progress_data, key=lambda x: x.get("completed_at", "1970-01-01"))
-        if latest.get("completed_at"):
-            last_activity = latest["completed_at"]
-    return last_activity
-
-def create_course_progress_summary(
+def course_progress_from_summary(
     user_id: str,
-    progress_data: List[Dict[str, Any]],
+    summary: Optional[Dict[str, Any]],
     total_modules: int
 ) -> CourseProgress:
     """
-    Create a CourseProgress object with summary of user's course progress.
+    Create a CourseProgress object from the user's course_progress_summary row.
+    A missing row means the user has no progress yet.
     """
-    completed_modules = len([p for p in progress_data if p.get("passed")]) if progress_data else 0
-    highest_score = calculate_highest_score(progress_data)
-    last_activity = get_last_activity(progress_data)
+    summary = summary or {}
+    completed_modules = summary.get("completed_modules") or 0
     
     return CourseProgress(
         user_id=user_id,
         completed_modules=completed_modules,
         total_modules=total_modules,
-        last_activity=last_activity,
-        highest_score=highest_score,
+        last_activity=summary.get("last_activity") or "Never",
+        highest_score={
+            "module": summary.get("highest_score_module_id") or 0,
+            "score": summary.get("highest_score") or 0
+        },
         is_completed=completed_modules >= total_modules and total_modules > 0,
         has_started=completed_modules > 0
     )
@@ -69,3 +47,25 @@ def determine_module_status(
         return "available", None, None
     else:
         return "locked", None, None
+
+def module_progress_fields(
+    module_index: int,
+    module_id: int,
+    progress_dict: Dict[int, Dict[str, Any]],
+    modules_data: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Per-user fields of a module: status, score, quiz_passed and completion_date.
+    """
+    module_status, score, completion_date = determine_module_status(
+        module_index,
+        module_id,
+        progress_dict,
+        modules_data
+    )
+    return {
+        "status": module_status,
+        "score": score,
+        "quiz_passed": progress_dict[module_id].get("passed") if module_id in progress_dict else None,
+        "completion_date": completion_date,
+    }
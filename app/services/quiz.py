@@ -1,4 +1,94 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+# Minimum quiz score (percent) to pass a module
+PASSING_SCORE = 70
+
+class QuestionGrader:
+    """
+    Grading data for one question, prepared once from the course content:
+    the correct answer set, normalized text forms and the numeric value
+    with its tolerance.
+    """
+
+    def __init__(self, question: Dict[str, Any], correct_answers_data: List[Dict[str, Any]]):
+        self.question_id = question.get("id")
+        self.type = question.get("type")
+        self.correct_answers_list = [a["answer_text"] for a in correct_answers_data] if correct_answers_data else []
+        self.correct_answers_set = set(self.correct_answers_list)
+        self.normalized_answers = {a.lower().strip() for a in self.correct_answers_list}
+        # Every option of the question, correct or not
+        self.options = {a["answer_text"] for a in question.get("answers") or []}
+        self.correct_value: Optional[float] = None
+        self.tolerance = 0.0
+
+        if self.type == "multi":
+            self.correct_answer_text = ", ".join(self.correct_answers_set) if self.correct_answers_set else None
+        elif self.type == "number":
+            self.correct_answer_text = None
+            if self.correct_answers_list:
+                try:
+                    self.correct_value = float(self.correct_answers_list[0])
+                    self.correct_answer_text = str(self.correct_value)
+                except ValueError:
+                    print(f"Invalid numeric answer for question {self.question_id}")
+            self.tolerance = float(question.get("tolerance") or 0)
+        else:
+            self.correct_answer_text = self.correct_answers_list[0] if self.correct_answers_list else None
+
+    def grade(self, answer_text: str) -> Dict[str, Any]:
+        """
+        Evaluate a user's answer. Returns the same dictionary as
+        evaluate_quiz_answer.
+        """
+        is_correct = False
+        feedback = None
+
+        if self.type == "single":
+            # For single choice, check if user answer matches any correct answer
+            # (a list or dict from the client is unhashable and never correct)
+            is_correct = isinstance(answer_text, str) and answer_text in self.correct_answers_set
+
+        elif self.type == "multi":
+            # For multi-choice, check if user selections match all correct answers
+            user_answers_set = set(answer_text.split(', ')) if isinstance(answer_text, str) and answer_text else set()
+            is_correct = user_answers_set == self.correct_answers_set
+
+        elif self.type == "text":
+            # For text answers, check for exact match
+            is_correct = isinstance(answer_text, str) and answer_text.lower().strip() in self.normalized_answers
+
+        elif self.type == "number" and self.correct_value is not None:
+            # For number answers, check within tolerance if specified
+            try:
+                user_value = float(answer_text)
+                is_correct = abs(user_value - self.correct_value) <= self.tolerance
+            except (TypeError, ValueError):
+                feedback = "Invalid number format"
+
+        # Generate feedback based on answer correctness if not already set
+        if not feedback:
+            feedback = "Correct! Good job." if is_correct else "Incorrect answer."
+
+        return {
+            "is_correct": is_correct,
+            "correct_answer_text": self.correct_answer_text,
+            "feedback": feedback
+        }
+
+
+def compile_answer_key(questions: List[Dict[str, Any]]) -> Dict[int, QuestionGrader]:
+    """
+    Build the answer key of a module: question_id -> QuestionGrader.
+    Questions are expected to carry their answers (see the course content tree).
+    """
+    return {
+        question["id"]: QuestionGrader(
+            question,
+            [a for a in question.get("answers") or [] if a.get("is_correct")]
+        )
+        for question in questions
+    }
+
 
 def evaluate_quiz_answer(
     question: Dict[str, Any], 
@@ -9,57 +99,11 @@ def evaluate_quiz_answer(
     Evaluate if a user's answer is correct based on question type.
     Returns a dictionary with evaluation results.
     """
-    is_correct = False
-    correct_answer_text = None
-    feedback = None
-    
-    if question["type"] == "single":
-        # For single choice, check if user answer matches any correct answer
-        correct_answers_list = [a["answer_text"] for a in correct_answers_data] if correct_answers_data else []
-        is_correct = answer_text in correct_answers_list
-        correct_answer_text = correct_answers_list[0] if correct_answers_list else None
-        
-    elif question["type"] == "multi":
-        # For multi-choice, check if user selections match all correct answers
-        correct_answers_set = set(a["answer_text"] for a in correct_answers_data) if correct_answers_data else set()
-        user_answers_set = set(answer_text.split(', ')) if isinstance(answer_text, str) and answer_text else set()
-        is_correct = user_answers_set == correct_answers_set
-        correct_answer_text = ", ".join(correct_answers_set) if correct_answers_set else None
-        
-    elif question["type"] == "text":
-        # For text answers, check for exact match
-        correct_answers_list = [a["answer_text"] for a in correct_answers_data] if correct_answers_data else []
-        is_correct = any(a.lower().strip() == answer_text.lower().strip() for a in correct_answers_list)
-        correct_answer_text = correct_answers_list[0] if correct_answers_list else None
-        
-    elif question["type"] == "number":
-        # For number answers, check within tolerance if specified
-        if correct_answers_data:
-            correct_value = float(correct_answers_data[0]["answer_text"])
-            tolerance = float(question.get("tolerance", 0))
-            
-            try:
-                user_value = float(answer_text)
-                is_correct = abs(user_value - correct_value) <= tolerance
-                correct_answer_text = str(correct_value)
-            except ValueError:
-                is_correct = False
-                correct_answer_text = str(correct_value)
-                feedback = "Invalid number format"
-    
-    # Generate feedback based on answer correctness if not already set
-    if not feedback:
-        feedback = "Correct! Good job." if is_correct else "Incorrect answer."
-    
-    return {
-        "is_correct": is_correct,
-        "correct_answer_text": correct_answer_text,
-        "feedback": feedback
-    }
+    return QuestionGrader(question, correct_answers_data).grade(answer_text)
 
 def generate_quiz_feedback(score: int) -> str:
     """Generate overall feedback for a quiz based on the score."""
-    if score >= 70:
+    if score >= PASSING_SCORE:
         if score >= 90:
             return "Excellent work! You've mastered this module."
         elif score >= 80:
@@ -67,7 +111,7 @@ def generate_quiz_feedback(score: int) -> str:
         else:
             return "Good work! You've passed the quiz."
     else:
-        return "You need to score at least 70% to pass. Review the material and try again."
+        return f"You need to score at least {PASSING_SCORE}% to pass. Review the material and try again."
 
 def extract_answer_data(answer_data: Any) -> Dict[str, Any]:
     """
@@ -0,0 +1,245 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from supabase import AsyncClient
+
+from app.services.content import fetch_course_tree
+from app.services.quiz import PASSING_SCORE, QuestionGrader, compile_answer_key
+
+# Bulk regrade of stored answers after an answer key change (answers.is_correct,
+# questions.tolerance). Runs in two resumable phases:
+#   1. "answers": stream user_answers by id, regrade, upsert the changed rows
+#   2. "progress": recompute progress score/passed and the analytics aggregates
+#      of the modules with changed answers in the database
+
+USER_ANSWER_COLUMNS = "id, user_id, question_id, answer_text, is_correct"
+
+
+def _to_float(text: Any) -> float:
+    # Same parsing as QuestionGrader.grade, NaN marks an invalid number
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _parse_numbers(texts: List[Any]) -> np.ndarray:
+    try:
+        # numpy parses each string with float(); one bad value fails the batch
+        return np.array(texts, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_to_float(text) for text in texts], dtype=np.float64)
+
+
+class RegradeKey:
+    """
+    Answer key prepared for regrading: the graders plus the numeric
+    questions' correct values and tolerances as arrays.
+    """
+
+    def __init__(self, graders: Dict[int, QuestionGrader]):
+        self.graders = graders
+        numeric = [grader for grader in graders.values() if grader.type == "number"]
+        self.numeric_index = {grader.question_id: i for i, grader in enumerate(numeric)}
+        # NaN (no valid correct value) never compares as within tolerance
+        self.correct = np.array(
+            [grader.correct_value if grader.correct_value is not None else np.nan for grader in numeric],
+            dtype=np.float64,
+        )
+        self.tolerance = np.array([grader.tolerance for grader in numeric], dtype=np.float64)
+
+
+def regrade_rows(rows: List[Dict[str, Any]], key: RegradeKey) -> List[Dict[str, Any]]:
+    """
+    Regrade stored answers with the current answer key.
+
+    Numeric questions are graded in one vectorized pass, the other types
+    through QuestionGrader.grade so both paths follow the quiz rules.
+
+    Args:
+        rows: user_answers rows with at least question_id, answer_text and is_correct
+        key: The current answer key
+
+    Returns:
+        Copies of the rows whose is_correct changed, with the new value
+    """
+    changed = []
+    numeric_rows = []
+    positions = []
+
+    for row in rows:
+        question_id = row["question_id"]
+        position = key.numeric_index.get(question_id)
+        if position is not None:
+            numeric_rows.append(row)
+            positions.append(position)
+            continue
+        grader = key.graders.get(question_id)
+        if grader is None:
+            # The question no longer exists
+            continue
+        is_correct = grader.grade(row["answer_text"])["is_correct"]
+        if is_correct != row["is_correct"]:
+            changed.append({**row, "is_correct": is_correct})
+
+    if numeric_rows:
+        index = np.array(positions, dtype=np.intp)
+        values = _parse_numbers([row["answer_text"] for row in numeric_rows])
+        with np.errstate(invalid="ignore"):
+            is_correct = np.abs(values - key.correct[index]) <= key.tolerance[index]
+        # Stored flags as 1/0, NULL as -1 so that it always counts as changed
+        stored = np.array(
+            [-1 if row["is_correct"] is None else row["is_correct"] for row in numeric_rows],
+            dtype=np.int8,
+        )
+        for i in np.flatnonzero(is_correct.astype(np.int8) != stored).tolist():
+            changed.append({**numeric_rows[i], "is_correct": bool(is_correct[i])})
+
+    return changed
+
+
+class RegradeJob:
+    """
+    Resumable regrade of user_answers, progress and the analytics aggregates.
+
+    The checkpoint file records the phase, the last processed user_answers id,
+    the modules with changed answers and those already recomputed. Only
+    modules with changed answers are recomputed. Rerunning
+    with the same checkpoint continues where the previous run stopped.
+    """
+
+    def __init__(
+        self,
+        db: AsyncClient,
+        checkpoint_path: Path,
+        question_ids: Optional[Iterable[int]] = None,
+        batch_size: int = 1000,
+        dry_run: bool = False,
+    ):
+        self.db = db
+        self.checkpoint_path = Path(checkpoint_path)
+        self.question_ids = sorted(set(question_ids)) if question_ids else None
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.key: Optional[RegradeKey] = None
+        self.question_modules: Dict[int, int] = {}
+        self.state = self._load_checkpoint()
+
+    def _new_state(self) -> Dict[str, Any]:
+        return {
+            "question_ids": self.question_ids,
+            "phase": "answers",
+            "last_id": 0,
+            "modules_changed": [],
+            "modules_done": [],
+            "scanned": 0,
+            "changed": 0,
+            "progress_updated": 0,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if not self.checkpoint_path.exists():
+            return self._new_state()
+        state = json.loads(self.checkpoint_path.read_text())
+        if state.get("question_ids") != self.question_ids:
+            raise ValueError(
+                f"Checkpoint {self.checkpoint_path} is for questions {state.get('question_ids')}, "
+                "remove it to start a new regrade"
+            )
+        return state
+
+    def _save_checkpoint(self) -> None:
+        if self.dry_run:
+            return
+        # Write then rename so a crash never leaves a truncated checkpoint
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.state, indent=2))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run (or resume) the job.
+
+        Returns:
+            The final job state
+        """
+        graders: Dict[int, QuestionGrader] = {}
+        for module in await fetch_course_tree(self.db):
+            for question_id, grader in compile_answer_key(module["questions"]).items():
+                graders[question_id] = grader
+                self.question_modules[question_id] = module["id"]
+        self.key = RegradeKey(graders)
+
+        if self.state["phase"] == "answers":
+            await self._regrade_answers()
+            self.state["phase"] = "progress"
+            self._save_checkpoint()
+
+        if self.state["phase"] == "progress":
+            await self._regrade_progress()
+            self.state["phase"] = "done"
+            self.state["finished_at"] = datetime.now(timezone.utc).isoformat()
+            self._save_checkpoint()
+
+        return self.state
+
+    async def _regrade_answers(self) -> None:
+        started = time.perf_counter()
+        scanned_at_start = self.state["scanned"]
+
+        while True:
+            query = self.db.table("user_answers").select(USER_ANSWER_COLUMNS).gt("id", self.state["last_id"])
+            if self.question_ids:
+                query = query.in_("question_id", self.question_ids)
+            response = await query.order("id").limit(self.batch_size).execute()
+            rows = response.data or []
+            if not rows:
+                break
+
+            changed = regrade_rows(rows, self.key)
+            if changed and not self.dry_run:
+                await self.db.table("user_answers").upsert(changed, on_conflict="id").execute()
+
+            modules_changed = set(self.state["modules_changed"])
+            modules_changed.update(
+                self.question_modules[row["question_id"]] for row in changed
+                if row["question_id"] in self.question_modules
+            )
+            self.state["modules_changed"] = sorted(modules_changed)
+            self.state["last_id"] = rows[-1]["id"]
+            self.state["scanned"] += len(rows)
+            self.state["changed"] += len(changed)
+            self._save_checkpoint()
+
+            elapsed = time.perf_counter() - started
+            rate = (self.state["scanned"] - scanned_at_start) / elapsed if elapsed else 0
+            print(
+                f"answers: scanned {self.state['scanned']:,}, changed {self.state['changed']:,}, "
+                f"last id {self.state['last_id']} ({rate:,.0f} rows/s)"
+            )
+
+            if len(rows) < self.batch_size:
+                break
+
+    async def _regrade_progress(self) -> None:
+        for module_id in self.state["modules_changed"]:
+            if module_id in self.state["modules_done"]:
+                continue
+            if not self.dry_run:
+                response = await self.db.rpc(
+                    "regrade_progress", {"p_module_id": module_id, "p_passing_score": PASSING_SCORE}
+                ).execute()
+                self.state["progress_updated"] += response.data or 0
+                # question_stats.correct and module_stats follow the regraded answers
+                await self.db.rpc(
+                    "rebuild_quiz_stats", {"p_module_id": module_id, "p_passing_score": PASSING_SCORE}
+                ).execute()
+            self.state["modules_done"].append(module_id)
+            self._save_checkpoint()
+            print(f"progress: module {module_id} done, {self.state['progress_updated']:,} rows updated")
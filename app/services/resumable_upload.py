@@ -0,0 +1,355 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Bytes gathered from the request before each write to the staging file
+WRITE_BUFFER_SIZE = 1024 * 1024
+# Size of the reads from the staging file when it is sent to storage
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+class UploadConflict(Exception):
+    pass
+
+
+class UploadLocked(UploadConflict):
+    """The session is claimed by another process sharing the staging directory."""
+
+
+def add_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """
+    Add the byte range [start, end) to a sorted list of disjoint ranges,
+    merging overlapping and adjacent ones.
+    """
+    merged: List[List[int]] = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def contiguous_offset(ranges: List[List[int]]) -> int:
+    """
+    Number of bytes received from the start of the file without a gap,
+    i.e. the offset a sequential client resumes from.
+    """
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+def _pwrite_all(fd: int, data: bytes, position: int) -> int:
+    written = 0
+    while written < len(data):
+        written += os.pwrite(fd, data[written:], position + written)
+    return written
+
+
+class ResumableUploadStore:
+    """
+    Resumable (tus-style) upload sessions staged on local disk.
+
+    Each session is a directory with the preallocated data file and a
+    meta.json holding the upload metadata and the byte ranges received so far.
+    Chunks are written in place at their offset, so they can be sent in any
+    order and in parallel; the upload is complete once the ranges cover the
+    whole file. Sessions survive restarts and expire after `ttl` seconds.
+
+    Chunk bookkeeping is serialized per session in this process: with several
+    workers, route an upload's requests to the same one (or run one worker per
+    staging volume). Claims are exclusive across processes: the claiming
+    process holds a lock on the session's owner.lock file until end_finalize.
+    """
+
+    def __init__(self, staging_dir: Path, ttl: float):
+        self.staging_dir = Path(staging_dir)
+        self.ttl = ttl
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._finalizing: Set[str] = set()
+        # Chunk writes in progress per session
+        self._writers: Dict[str, int] = {}
+        # Descriptors of the owner.lock files held for claimed sessions
+        self._owner_locks: Dict[str, int] = {}
+
+    def _session_dir(self, upload_id: str) -> Path:
+        try:
+            # Also keeps the id from pointing outside the staging directory
+            upload_id = str(uuid.UUID(upload_id))
+        except ValueError:
+            raise UploadNotFound("Upload not found")
+        return self.staging_dir / upload_id
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    def _load(self, upload_id: str) -> Dict[str, Any]:
+        try:
+            return json.loads((self._session_dir(upload_id) / "meta.json").read_text())
+        except FileNotFoundError:
+            raise UploadNotFound("Upload not found")
+
+    def _save(self, session: Dict[str, Any]) -> None:
+        # Write then rename so a crash never leaves a truncated meta.json
+        session_dir = self._session_dir(session["upload_id"])
+        tmp_path = session_dir / "meta.json.tmp"
+        tmp_path.write_text(json.dumps(session))
+        os.replace(tmp_path, session_dir / "meta.json")
+
+    async def update(self, upload_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store extra fields in a session's meta.json.
+        """
+        async with self._lock(upload_id):
+            session = {**self._load(upload_id), **fields}
+            await asyncio.to_thread(self._save, session)
+        return session
+
+    def data_path(self, upload_id: str) -> Path:
+        return self._session_dir(upload_id) / "data"
+
+    async def create(self, user_id: str, size: int, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Start an upload session of `size` bytes.
+
+        Args:
+            user_id: Owner of the session
+            size: Total size of the file
+            metadata: Video fields used on finalize (title, description, course_id, filename)
+        """
+        await self.cleanup_expired()
+
+        upload_id = str(uuid.uuid4())
+        now = time.time()
+        session = {
+            "upload_id": upload_id,
+            "user_id": user_id,
+            "size": size,
+            "received": [],
+            "created_at": now,
+            "expires_at": now + self.ttl,
+            **metadata,
+        }
+
+        def prepare() -> None:
+            session_dir = self._session_dir(upload_id)
+            session_dir.mkdir(parents=True)
+            # Sparse file of the final size, chunks are written at their offset
+            with open(session_dir / "data", "wb") as f:
+                f.truncate(size)
+            self._save(session)
+
+        await asyncio.to_thread(prepare)
+        return session
+
+    def get(self, upload_id: str, user_id: str) -> Dict[str, Any]:
+        """
+        Return a session of the user, raises UploadNotFound if it does not exist,
+        expired or belongs to someone else.
+        """
+        session = self._load(upload_id)
+        if session["user_id"] != user_id or session["expires_at"] < time.time():
+            raise UploadNotFound("Upload not found")
+        return session
+
+    async def write_chunk(
+        self,
+        upload_id: str,
+        user_id: str,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+    ) -> Dict[str, Any]:
+        """
+        Write a chunk at `offset` as it arrives. The bytes written are recorded
+        even if the request is cut off, so the client can resume from there.
+
+        Returns:
+            The updated session
+        """
+        session = self.get(upload_id, user_id)
+        if upload_id in self._finalizing:
+            raise UploadConflict("Upload is being finalized")
+        size = session["size"]
+        if offset < 0 or offset > size:
+            raise UploadConflict(f"Offset {offset} is outside the upload (size {size})")
+
+        position = offset
+        buffer = bytearray()
+        self._writers[upload_id] = self._writers.get(upload_id, 0) + 1
+        fd = None
+        try:
+            fd = await asyncio.to_thread(os.open, self.data_path(upload_id), os.O_WRONLY)
+            try:
+                async for chunk in chunks:
+                    if position + len(buffer) + len(chunk) > size:
+                        raise UploadConflict(f"Chunk ends past the end of the upload (size {size})")
+                    buffer += chunk
+                    if len(buffer) >= WRITE_BUFFER_SIZE:
+                        position += await asyncio.to_thread(_pwrite_all, fd, bytes(buffer), position)
+                        buffer.clear()
+            finally:
+                # Also keeps what arrived before a disconnect
+                if buffer:
+                    position += await asyncio.to_thread(_pwrite_all, fd, bytes(buffer), position)
+        finally:
+            if fd is not None:
+                await asyncio.to_thread(os.close, fd)
+            if position > offset:
+                async with self._lock(upload_id):
+                    try:
+                        session = self._load(upload_id)
+                    except UploadNotFound:
+                        # Aborted while the chunk was being written
+                        pass
+                    else:
+                        session["received"] = add_range(session["received"], offset, position)
+                        await asyncio.to_thread(self._save, session)
+            self._writers[upload_id] -= 1
+            if not self._writers[upload_id]:
+                del self._writers[upload_id]
+        return session
+
+    def begin_finalize(self, upload_id: str, user_id: str) -> Dict[str, Any]:
+        """
+        Mark a complete session as being finalized so that no more chunks are
+        accepted. Call end_finalize when done, whatever the outcome.
+        """
+        return self.claim(self.get(upload_id, user_id))
+
+    def claim(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        begin_finalize for a session already loaded, without the owner and
+        expiry checks (e.g. when resuming work after a restart).
+        """
+        upload_id = session["upload_id"]
+        if upload_id in self._finalizing:
+            raise UploadConflict("Upload is already being finalized")
+        if self._writers.get(upload_id):
+            raise UploadConflict("Chunks are still being written")
+        if session["received"] != [[0, session["size"]]]:
+            raise UploadConflict(
+                f"Upload is incomplete: {sum(end - start for start, end in session['received'])} "
+                f"of {session['size']} bytes received"
+            )
+        self._lock_owner(upload_id)
+        self._finalizing.add(upload_id)
+        return session
+
+    def end_finalize(self, upload_id: str) -> None:
+        self._finalizing.discard(upload_id)
+        self._unlock_owner(upload_id)
+
+    def _lock_owner(self, upload_id: str) -> None:
+        """
+        Take the session's owner.lock so that no other process can claim it.
+        The lock is released by the OS if this process dies, so the sessions of
+        a crashed process can be claimed again.
+        """
+        if fcntl is None:
+            return
+        session_dir = self._session_dir(upload_id)
+        try:
+            fd = os.open(session_dir / "owner.lock", os.O_RDWR | os.O_CREAT)
+        except FileNotFoundError:
+            raise UploadNotFound("Upload not found")
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise UploadLocked("Upload is being finalized by another process")
+        if not (session_dir / "meta.json").exists():
+            # Removed by the previous owner before it released the lock
+            os.close(fd)
+            raise UploadNotFound("Upload not found")
+        self._owner_locks[upload_id] = fd
+
+    def _unlock_owner(self, upload_id: str) -> None:
+        fd = self._owner_locks.pop(upload_id, None)
+        if fd is not None:
+            os.close(fd)
+
+    def is_finalizing(self, upload_id: str) -> bool:
+        return upload_id in self._finalizing
+
+    async def iter_data(self, upload_id: str) -> AsyncIterator[bytes]:
+        """
+        Read the staged file in chunks.
+        """
+        fd = await asyncio.to_thread(os.open, self.data_path(upload_id), os.O_RDONLY)
+        try:
+            position = 0
+            while chunk := await asyncio.to_thread(os.pread, fd, READ_CHUNK_SIZE, position):
+                position += len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(os.close, fd)
+
+    async def remove(self, upload_id: str) -> None:
+        """
+        Delete a session and its staged data.
+        """
+        await asyncio.to_thread(shutil.rmtree, self._session_dir(upload_id), True)
+        self._locks.pop(upload_id, None)
+
+    async def list_sessions(self) -> List[Dict[str, Any]]:
+        """
+        Every session on disk, expired or not.
+        """
+        def load_all() -> List[Dict[str, Any]]:
+            if not self.staging_dir.exists():
+                return []
+            sessions = []
+            for session_dir in self.staging_dir.iterdir():
+                try:
+                    sessions.append(json.loads((session_dir / "meta.json").read_text()))
+                except (OSError, ValueError):
+                    continue
+            return sessions
+
+        return await asyncio.to_thread(load_all)
+
+    async def cleanup_expired(self) -> int:
+        """
+        Delete expired sessions. Returns how many were removed.
+        """
+        now = time.time()
+        expired_ids = [
+            session["upload_id"] for session in await self.list_sessions() if session.get("expires_at", 0) < now
+        ]
+
+        removed = 0
+        for upload_id in expired_ids:
+            if upload_id in self._finalizing:
+                continue
+            try:
+                self._lock_owner(upload_id)
+            except (UploadLocked, UploadNotFound):
+                # Claimed by another process, or already removed
+                continue
+            try:
+                await self.remove(upload_id)
+            finally:
+                self._unlock_owner(upload_id)
+            removed += 1
+        return removed
+
+
+video_uploads = ResumableUploadStore(
+    Path(settings.RESUMABLE_UPLOAD_DIR),
+    ttl=settings.RESUMABLE_UPLOAD_TTL,
+)
@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+from typing import AsyncIterator, Optional
+
+# Marks the end of the source in the chunk queue
+_END = object()
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadStream:
+    """
+    Pipes an upload from its source (the request body) to the storage PUT.
+
+    The source is read by a background task into a queue of at most `window`
+    chunks, so receiving from the client overlaps with sending to storage and
+    memory stays bounded whatever the file size. The SHA-256 and the byte count
+    are computed on the way through.
+
+    Usage:
+        stream = UploadStream(request.stream(), window=8, max_size=...)
+        await bunnycdn.upload_video(name, stream, folder)
+        stream.size, stream.sha256
+    """
+
+    def __init__(self, source: AsyncIterator[bytes], window: int, max_size: Optional[int] = None):
+        self.source = source
+        self.max_size = max_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._queue: "asyncio.Queue[object]" = asyncio.Queue(maxsize=window)
+        self._reader: Optional[asyncio.Task] = None
+        self.complete = False
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    async def _read(self) -> None:
+        try:
+            async for chunk in self.source:
+                if not chunk:
+                    continue
+                self.size += len(chunk)
+                if self.max_size is not None and self.size > self.max_size:
+                    raise UploadTooLarge(f"Upload is larger than {self.max_size} bytes")
+                self._hash.update(chunk)
+                await self._queue.put(chunk)
+            await self._queue.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            # Handed to the consumer, which raises it inside the PUT
+            await self._queue.put(e)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        if self._reader is not None:
+            raise RuntimeError("An UploadStream can only be consumed once")
+        self._reader = asyncio.create_task(self._read())
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _END:
+                    self.complete = True
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # The consumer stopped early (failed PUT, cancelled request)
+            if not self._reader.done():
+                self._reader.cancel()
+                await asyncio.gather(self._reader, return_exceptions=True)
@@ -1,11 +1,18 @@
-from typing import Optional, Dict, Any, List
-from supabase import Client
+from typing import Optional, Dict, Any, List, Set
+from supabase import AsyncClient
 # from app.core.security import get_password_hash, verify_password
+from app.core.config import settings
 from app.schemas.schemas import UserCreate, UserUpdate
 
+# Columns returned for a full user profile
+USER_COLUMNS = "id, email, full_name, is_active, is_superuser, created_at, updated_at"
+
+# Ids of users whose row is known to exist in the users table
+_known_user_ids: Set[str] = set()
+
 
 class UserService:
-    def __init__(self, client: Client):
+    def __init__(self, client: AsyncClient):
         self.client = client
         self.table = "users"
 
@@ -19,9 +26,34 @@ class UserService:
         Returns:
             User data or None if not found
         """
-        response = self.client.table(self.table).select("*").eq("id", user_id).execute()
+        response = await self.client.table(self.table).select(USER_COLUMNS).eq("id", user_id).execute()
         return response.data[0] if response.data else None
 
+    async def ensure_exists(self, user_id: str, created_at: Optional[str] = None) -> None:
+        """
+        Make sure the user has a row in the users table.
+
+        The row is created with an idempotent upsert the first time a user is
+        seen by this process; afterwards the call costs no queries.
+        
+        Args:
+            user_id: The user's ID
+            created_at: Optional creation time of the auth user
+        """
+        if user_id in _known_user_ids:
+            return
+
+        new_user = {"id": user_id}
+        if created_at:
+            new_user["created_at"] = created_at
+        await self.client.table(self.table).upsert(
+            new_user, on_conflict="id", ignore_duplicates=True
+        ).execute()
+
+        if len(_known_user_ids) >= settings.KNOWN_USERS_CACHE_SIZE:
+            _known_user_ids.clear()
+        _known_user_ids.add(user_id)
+
     async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """
         Get a user by email.
@@ -32,7 +64,7 @@ class UserService:
         Returns:
             User data or None if not found
         """
-        response = self.client.table(self.table).select("*").eq("email", email).execute()
+        response = await self.client.table(self.table).select(USER_COLUMNS).eq("email", email).execute()
         return response.data[0] if response.data else None
 
     # async def create(self, user_in: UserCreate) -> Dict[str, Any]:
@@ -49,7 +81,7 @@ class UserService:
     #     hashed_password = get_password_hash(user_data.pop("password"))
     #     user_data["password"] = hashed_password
         
-    #     response = self.client.table(self.table).insert(user_data).execute()
+    #     response = await self.client.table(self.table).insert(user_data).execute()
     #     return response.data[0] if response.data else None
 
     # async def update(self, user_id: str, user_in: UserUpdate) -> Optional[Dict[str, Any]]:
@@ -69,7 +101,7 @@ class UserService:
     #     if "password" in update_data and update_data["password"]:
     #         update_data["password"] = get_password_hash(update_data["password"])
         
-    #     response = self.client.table(self.table).update(update_data).eq("id", user_id).execute()
+    #     response = await self.client.table(self.table).update(update_data).eq("id", user_id).execute()
     #     return response.data[0] if response.data else None
 
     # async def authenticate(self, email: str, password: str) -> Optional[Dict[str, Any]]:
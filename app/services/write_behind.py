@@ -0,0 +1,354 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+from supabase import AsyncClient
+
+from app.core.config import settings
+
+# Marks the end of the queue on shutdown
+_STOP = object()
+# SQLSTATE classes of errors that retrying the same rows cannot fix:
+# data exceptions (22) and integrity constraint violations (23)
+_REJECTED_SQLSTATE_CLASSES = ("22", "23")
+
+
+def _is_rejected(error: Exception) -> bool:
+    return isinstance(error, APIError) and (error.code or "")[:2] in _REJECTED_SQLSTATE_CLASSES
+
+
+class WriteBehindBuffer:
+    """
+    In-process write-behind buffer for rows that do not have to be stored
+    before the response is sent.
+
+    Rows are queued without waiting and inserted in batches by a background
+    task, when `batch_size` rows are waiting or `flush_interval` seconds after
+    the first one. Batches that cannot be inserted, and rows that arrive when
+    the queue is full or the buffer is stopped, are appended to a local JSONL
+    spill file that is replayed every `retry_interval` seconds. Rows the
+    database rejects (constraint or data errors) are set aside in a separate
+    .rejected.jsonl file rather than retried.
+
+    Rows still in memory are lost if the process is killed without a clean
+    shutdown; on shutdown the queue is drained (or spilled) first.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        batch_size: int,
+        flush_interval: float,
+        max_queue: int,
+        spill_path: Path,
+        retry_interval: float,
+    ):
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = Path(spill_path)
+        self.replaying_path = self.spill_path.with_suffix(".replaying")
+        # Rows the database rejected, and spill lines that could not be read
+        self.rejected_path = self.spill_path.with_suffix(".rejected.jsonl")
+        self.corrupt_path = self.spill_path.with_suffix(".corrupt")
+        self._file_lock = threading.Lock()
+        self.retry_interval = retry_interval
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._get_client: Optional[Callable[[], Awaitable[AsyncClient]]] = None
+        self._replayed_at = 0.0
+        self.enqueued = 0
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.failed_batches = 0
+        self.spilled_rows = 0
+        self.replayed_rows = 0
+        self.rejected_rows = 0
+        self.last_flush_duration: Optional[float] = None
+        self.max_flush_duration = 0.0
+        self._total_flush_duration = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, get_client: Callable[[], Awaitable[AsyncClient]]) -> None:
+        """
+        Start the background flush task.
+
+        Args:
+            get_client: Returns the Supabase client used for the inserts
+        """
+        if self.running:
+            return
+        self._get_client = get_client
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Queue rows for insertion. Never waits for the queue: rows that do not
+        fit are spilled, the file write running in a worker thread.
+        """
+        for i, row in enumerate(rows):
+            if not self.running:
+                await asyncio.to_thread(self._spill, rows[i:])
+                return
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                print(f"Warning: {self.table} write-behind queue is full, spilling {len(rows) - i} rows")
+                await asyncio.to_thread(self._spill, rows[i:])
+                return
+            self.enqueued += 1
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Flush everything still queued and stop the background task.
+        Rows that cannot be flushed within `timeout` seconds are spilled.
+        """
+        task, self._task = self._task, None
+        if task is None or task.done():
+            return
+
+        async def drain() -> None:
+            await self._queue.put(_STOP)
+            await task
+
+        try:
+            # On timeout the task is cancelled, its current batch is spilled
+            await asyncio.wait_for(drain(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Warning: {self.table} write-behind drain timed out, spilling the rest")
+        remaining = []
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not _STOP:
+                remaining.append(row)
+        await asyncio.to_thread(self._spill, remaining)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        await self._replay_spill()
+        while True:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), self.retry_interval)
+            except asyncio.TimeoutError:
+                await self._replay_spill()
+                continue
+            if first is _STOP:
+                return
+
+            batch = [first]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            if await self._flush(batch):
+                await self._replay_spill()
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> bool:
+        started = time.perf_counter()
+        written, remaining, error = await self._insert(batch, self._spill)
+        if remaining:
+            self.failed_batches += 1
+            print(f"Warning: Could not flush {len(remaining)} {self.table} rows, spilling: {error}")
+            await asyncio.to_thread(self._spill, remaining)
+            return False
+        duration = time.perf_counter() - started
+        self.last_flush_duration = duration
+        self.max_flush_duration = max(self.max_flush_duration, duration)
+        self._total_flush_duration += duration
+        self.flushed_batches += 1
+        self.flushed_rows += written
+        return True
+
+    async def _insert(
+        self,
+        rows: List[Dict[str, Any]],
+        on_cancel: Callable[[List[Dict[str, Any]]], None],
+    ) -> Tuple[int, List[Dict[str, Any]], Optional[str]]:
+        """
+        Insert rows. A batch the database rejects (constraint or data errors)
+        is split in halves until the offending rows are isolated; those go to
+        the rejected file instead of being retried forever. When cancelled,
+        the rows not written yet are passed to `on_cancel` (in a worker thread).
+
+        Returns:
+            Rows written, rows left unwritten by a transient failure (to be
+            spilled) and that failure
+        """
+        written = 0
+        parts = [rows]
+        while parts:
+            part = parts.pop()
+            try:
+                client = await self._get_client()
+                await client.table(self.table).insert(part).execute()
+            except asyncio.CancelledError:
+                await asyncio.shield(asyncio.to_thread(on_cancel, part + [row for rest in parts for row in rest]))
+                raise
+            except Exception as e:
+                if not _is_rejected(e):
+                    return written, part + [row for rest in parts for row in rest], str(e)
+                if len(part) == 1:
+                    print(f"Warning: {self.table} row rejected, moving it to {self.rejected_path.name}: {str(e)}")
+                    await asyncio.to_thread(self._append, self.rejected_path, [{"row": part[0], "error": str(e)}])
+                    self.rejected_rows += 1
+                else:
+                    middle = len(part) // 2
+                    parts += [part[middle:], part[:middle]]
+                continue
+            written += len(part)
+        return written, [], None
+
+    def _append(self, path: Path, records: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(record, default=str) + "\n" for record in records).encode("utf-8")
+        # flush() and submit() spill from different threads: one writer at a time
+        with self._file_lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a+b") as f:
+                # Start on a new line after a line cut short by a crash
+                if f.tell() > 0:
+                    f.seek(-1, 2)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data
+                f.write(data)
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        try:
+            self._append(self.spill_path, rows)
+        except OSError as e:
+            print(f"Error: Could not spill {len(rows)} {self.table} rows, they are lost: {str(e)}")
+            return
+        self.spilled_rows += len(rows)
+
+    def _keep_replaying(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Replace the .replaying file with the rows of an interrupted replay
+        that were not written, so that the next replay does not insert the
+        others again.
+        """
+        tmp_path = self.replaying_path.with_suffix(".tmp")
+        with self._file_lock:
+            if not rows:
+                self.replaying_path.unlink(missing_ok=True)
+                return
+            tmp_path.write_text("".join(json.dumps(row, default=str) + "\n" for row in rows), encoding="utf-8")
+            os.replace(tmp_path, self.replaying_path)
+
+    def _take_spill(self) -> List[Dict[str, Any]]:
+        """
+        Move the spill file into the .replaying file (merged with one left over
+        by an interrupted replay) and read it. Lines that cannot be parsed,
+        e.g. one cut short by a crash, are moved to the .corrupt file.
+        """
+        with self._file_lock:
+            if self.spill_path.exists():
+                with self.spill_path.open("rb") as src, self.replaying_path.open("ab") as dst:
+                    shutil.copyfileobj(src, dst)
+                self.spill_path.unlink()
+            if not self.replaying_path.exists():
+                return []
+            lines = self.replaying_path.read_bytes().splitlines()
+
+        rows, corrupt = [], []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                corrupt.append(line)
+                continue
+            if isinstance(row, dict):
+                rows.append(row)
+            else:
+                corrupt.append(line)
+        if corrupt:
+            print(f"Warning: {len(corrupt)} unreadable lines in the {self.table} spill file, see {self.corrupt_path.name}")
+            with self._file_lock, self.corrupt_path.open("ab") as f:
+                f.write(b"".join(line + b"\n" for line in corrupt))
+        return rows
+
+    async def _replay_spill(self) -> None:
+        """
+        Insert rows from the spill file again, at most once per retry_interval.
+        Never raises: the flush task has to outlive a bad spill file.
+        """
+        if time.monotonic() - self._replayed_at < self.retry_interval:
+            return
+        self._replayed_at = time.monotonic()
+
+        try:
+            rows = await asyncio.to_thread(self._take_spill)
+            unwritten: List[Dict[str, Any]] = []
+            for start in range(0, len(rows), self.batch_size):
+                rest = rows[start + self.batch_size:]
+                written, remaining, error = await self._insert(
+                    rows[start:start + self.batch_size], lambda part: self._keep_replaying(part + rest)
+                )
+                self.replayed_rows += written
+                if remaining:
+                    print(f"Warning: Could not replay spilled {self.table} rows: {error}")
+                    unwritten = remaining + rest
+                    break
+            await asyncio.to_thread(self._keep_replaying, unwritten)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error: Could not replay the {self.table} spill file: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "flushed_rows": self.flushed_rows,
+            "flushed_batches": self.flushed_batches,
+            "failed_batches": self.failed_batches,
+            "spilled_rows": self.spilled_rows,
+            "replayed_rows": self.replayed_rows,
+            "rejected_rows": self.rejected_rows,
+            "spill_file_bytes": sum(path.stat().st_size for path in (self.spill_path, self.replaying_path) if path.exists()),
+            "last_flush_ms": (
+                round(self.last_flush_duration * 1000, 3) if self.last_flush_duration is not None else None
+            ),
+            "avg_flush_ms": (
+                round(self._total_flush_duration / self.flushed_batches * 1000, 3) if self.flushed_batches else None
+            ),
+            "max_flush_ms": round(self.max_flush_duration * 1000, 3),
+        }
+
+
+user_answers_writer = WriteBehindBuffer(
+    "user_answers",
+    batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL,
+    max_queue=settings.WRITE_BEHIND_MAX_QUEUE,
+    spill_path=Path(settings.WRITE_BEHIND_SPILL_DIR) / "user_answers.jsonl",
+    retry_interval=settings.WRITE_BEHIND_RETRY_INTERVAL,
+)
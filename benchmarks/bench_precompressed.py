@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: per-request serialization and compression of the course
+tree vs. bodies prepared once per content version.
+
+* /course/modules: serializing every module merged with the user's fields
+  vs. splicing the user's fields into module JSON serialized once.
+* /course/content: serializing and gzipping per request (what a
+  compression middleware does) vs. serving the precompressed variant.
+
+Usage:
+    python benchmarks/bench_precompressed.py [--modules 12] [--iterations 200]
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# app.services.content loads the settings; nothing here talks to the services
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "benchmark-key")
+os.environ.setdefault("BUNNYCDN_API_KEY", "benchmark-key")
+
+from bench_serialization import module_tree, timeit  # noqa: E402
+
+from app.core.responses import (  # noqa: E402
+    api_response, compress_variants, envelope, extend_json_object, json_array, negotiate_encoding
+)
+from app.services.content import CourseContent  # noqa: E402
+
+USER_FIELDS = ("status", "score", "quiz_passed", "completion_date")
+
+
+def main(modules: int, iterations: int) -> None:
+    tree = module_tree(modules)
+    shared = [{k: v for k, v in m.items() if k not in USER_FIELDS} for m in tree]
+    overlay = {m["id"]: {k: m[k] for k in USER_FIELDS} for m in tree}
+
+    started = time.perf_counter()
+    content = CourseContent(shared, version=1)
+    variants = asyncio.run(content.encoded_tree())
+    prepare = time.perf_counter() - started
+
+    def modules_per_request(_):
+        return api_response([{**m, **overlay[m["id"]]} for m in shared]).body
+
+    def modules_spliced(_):
+        return envelope(json_array(
+            extend_json_object(content.module_json[m["id"]], overlay[m["id"]]) for m in shared
+        ))
+
+    def content_per_request(_):
+        return gzip.compress(api_response(shared).body, compresslevel=6)
+
+    def content_precompressed(accept_encoding):
+        return variants[negotiate_encoding(accept_encoding, variants)]
+
+    assert modules_per_request(None) == modules_spliced(None)
+
+    print(f"Prepared once per content version in {prepare * 1000:.1f} ms")
+    print("Body size: " + ", ".join(f"{coding} {len(body) / 1024:.1f} KiB" for coding, body in variants.items()))
+    print()
+    for name, old, new, arg in [
+        ("/course/modules", modules_per_request, modules_spliced, None),
+        ("/course/content", content_per_request, content_precompressed, "gzip, deflate, br"),
+    ]:
+        old_time = timeit(old, arg, iterations)
+        new_time = timeit(new, arg, iterations)
+        print(f"{name:<18} per request {old_time * 1e6:9.1f} us  prepared {new_time * 1e6:9.1f} us  "
+              f"x{old_time / new_time:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", type=int, default=12)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    main(args.modules, args.iterations)
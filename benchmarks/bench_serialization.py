@@ -0,0 +1,112 @@
+"""
+Micro-benchmark: ApiResponse serialization, old path vs. fast path.
+
+Old path (what FastAPI did with response_model=ApiResponse):
+    model.dict() -> ApiResponse(...) -> validate against response_model
+    -> serialize to jsonable python -> json.dumps
+
+Fast path (app.core.responses.api_response):
+    plain data -> orjson.dumps, models -> one TypeAdapter.dump_json pass
+
+Usage:
+    python benchmarks/bench_serialization.py [--modules 12] [--iterations 200]
+"""
+import argparse
+import json
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.utils import create_model_field  # noqa: E402
+
+from app.core.responses import api_response  # noqa: E402
+from app.schemas.schemas import ApiResponse, CourseProgress  # noqa: E402
+
+response_field = create_model_field("Response_bench", ApiResponse, mode="serialization")
+
+
+def module_tree(modules: int) -> List[Dict[str, Any]]:
+    html = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 30 + "</p>"
+    return [
+        {
+            "id": m,
+            "title": f"Module {m}",
+            "description": "Module description " * 5,
+            "order": m,
+            "slug": f"module-{m}",
+            "blocks": [
+                {"id": m * 100 + b, "module_id": m, "order": b, "type": "text", "content": {"html": html}}
+                for b in range(15)
+            ],
+            "questions": [
+                {
+                    "id": m * 100 + q, "module_id": m, "question_text": f"Question {q}?", "type": "single",
+                    "tolerance": None, "exact_match": True,
+                    "answers": [
+                        {"id": (m * 100 + q) * 10 + a, "question_id": m * 100 + q,
+                         "answer_text": f"Answer {a}", "is_correct": a == 0}
+                        for a in range(4)
+                    ],
+                }
+                for q in range(10)
+            ],
+            "status": "available",
+            "score": None,
+            "quiz_passed": None,
+            "completion_date": None,
+        }
+        for m in range(modules)
+    ]
+
+
+def old_path(data: Any) -> bytes:
+    if hasattr(data, "dict"):
+        data = data.dict()
+    content = ApiResponse(success=True, data=data)
+    value, errors = response_field.validate(content, {}, loc=("response",))
+    assert not errors
+    jsonable = response_field.serialize(value)
+    return json.dumps(jsonable, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def fast_path(data: Any) -> bytes:
+    return api_response(data).body
+
+
+def timeit(fn: Callable[[Any], bytes], data: Any, iterations: int) -> float:
+    fn(data)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(data)
+    return (time.perf_counter() - start) / iterations
+
+
+def main(modules: int, iterations: int) -> None:
+    # The old handlers used the deprecated .dict()
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    payloads = {
+        f"/course/modules ({modules} modules)": module_tree(modules),
+        "/course/progress": CourseProgress(
+            user_id="5f8c", completed_modules=3, total_modules=12, last_activity="2026-10-17T10:00:00+00:00",
+            highest_score={"module": 2, "score": 95}, is_completed=False, has_started=True,
+        ),
+    }
+    for name, data in payloads.items():
+        assert json.loads(old_path(data)) == json.loads(fast_path(data))
+        size = len(fast_path(data))
+        old = timeit(old_path, data, iterations)
+        new = timeit(fast_path, data, iterations)
+        print(f"{name:<32} {size / 1024:8.1f} KiB  old {old * 1e6:9.1f} us  "
+              f"fast {new * 1e6:9.1f} us  x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", type=int, default=12)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    main(args.modules, args.iterations)
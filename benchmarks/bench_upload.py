@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Measure peak memory of streaming video uploads (POST /videos/stream).
+
+Each size runs in a fresh process: the request body is generated on the fly,
+sent through the ASGI app, and piped to a BunnyCDN stand-in that only counts
+the bytes. Supabase and auth are replaced with in-memory stand-ins, so no
+network access is needed. Peak RSS should stay flat as the size grows.
+
+Usage:
+    python benchmarks/bench_upload.py                    # 64, 256 and 1024 MiB
+    python benchmarks/bench_upload.py --sizes 100,2000   # sizes in MiB
+"""
+import argparse
+import asyncio
+import hashlib
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MIB = 1024 * 1024
+# Chunk size of the generated request body
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_upload(size: int) -> dict:
+    import httpx
+    from datetime import datetime
+
+    from app.api.deps import get_db
+    from app.api.endpoints.auth import get_current_user
+    from app.main import app
+    from app.schemas.schemas import User
+    from app.services.bunnycdn import bunnycdn
+
+    class InsertResult:
+        def __init__(self, data):
+            self.data = data
+
+    class VideosTable:
+        def insert(self, data):
+            self.row = data
+            return self
+
+        async def execute(self):
+            return InsertResult([self.row])
+
+    class Database:
+        def table(self, name):
+            return VideosTable()
+
+    class Storage(httpx.AsyncBaseTransport):
+        # httpx.MockTransport reads the whole request first, this one counts it as it streams
+        stored = 0
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            async for chunk in request.stream:
+                self.stored += len(chunk)
+            return httpx.Response(201)
+
+    storage = Storage()
+    bunnycdn._client = httpx.AsyncClient(transport=storage)
+    app.dependency_overrides[get_db] = lambda: Database()
+    app.dependency_overrides[get_current_user] = lambda: User(
+        id="benchmark", email="benchmark@example.com", created_at=datetime.now()
+    )
+
+    chunk = bytes(range(256)) * (BODY_CHUNK_SIZE // 256)
+    expected = hashlib.sha256()
+
+    async def body():
+        sent = 0
+        while sent < size:
+            part = chunk[:min(BODY_CHUNK_SIZE, size - sent)]
+            expected.update(part)
+            sent += len(part)
+            yield part
+
+    baseline = peak_rss_mib()
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post(
+            "/api/v1/videos/stream",
+            params={"title": "benchmark", "filename": "benchmark.mp4"},
+            content=body(),
+            headers={"Content-Length": str(size)},
+            timeout=None,
+        )
+    elapsed = time.perf_counter() - started
+
+    response.raise_for_status()
+    video = response.json()
+    assert storage.stored == size == video["size_bytes"], (storage.stored, size, video["size_bytes"])
+    assert video["sha256"] == expected.hexdigest()
+    return {"elapsed": elapsed, "baseline": baseline, "peak": peak_rss_mib()}
+
+
+def main(args: argparse.Namespace) -> int:
+    if args.child is not None:
+        result = asyncio.run(run_upload(args.child))
+        print(f"{result['elapsed']} {result['baseline']} {result['peak']}")
+        return 0
+
+    print(f"{'size':>10} {'time':>8} {'MiB/s':>8} {'baseline RSS':>13} {'peak RSS':>9}")
+    for size_mib in (int(s) for s in args.sizes.split(",")):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", str(size_mib * MIB)],
+            capture_output=True, text=True,
+        )
+        if output.returncode != 0:
+            print(output.stderr)
+            return 1
+        elapsed, baseline, peak = (float(v) for v in output.stdout.split()[-3:])
+        print(
+            f"{size_mib:>6} MiB {elapsed:>7.2f}s {size_mib / elapsed:>8.1f} "
+            f"{baseline:>9.1f} MiB {peak:>5.1f} MiB"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="64,256,1024", help="Comma-separated sizes in MiB")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    sys.exit(main(parser.parse_args()))
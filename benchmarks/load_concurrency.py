@@ -0,0 +1,131 @@
+"""
+Load test: concurrent requests against a slow PostgREST upstream.
+
+Starts a fake Supabase REST server that answers every query after a fixed
+delay, then fires concurrent GET /course/progress requests at:
+
+* a replica of the old handler that used the blocking supabase-py client
+  inside `async def` (every query stalls the event loop), and
+* the real application, which awaits the shared async client.
+
+Usage:
+    python benchmarks/load_concurrency.py [--requests 50] [--delay 0.05]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+JWT_SECRET = "benchmark-jwt-secret-at-least-32-characters"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_upstream(port: int, delay: float) -> None:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    async def table(request):
+        await asyncio.sleep(delay)
+        return JSONResponse([])
+
+    upstream = Starlette(routes=[Route("/rest/v1/{table}", table, methods=["GET", "POST", "PATCH"])])
+    config = uvicorn.Config(upstream, host="127.0.0.1", port=port, log_level="error")
+    threading.Thread(target=uvicorn.Server(config).run, daemon=True).start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def build_blocking_app(url: str):
+    from fastapi import FastAPI
+    from supabase import create_client
+
+    blocking_app = FastAPI()
+    client = create_client(url, "benchmark-key")
+
+    @blocking_app.get("/api/v1/course/progress")
+    async def progress():
+        client.table("progress").select("*").eq("user_id", "benchmark").execute()
+        client.table("modules").select("id").execute()
+        return {"success": True}
+
+    return blocking_app
+
+
+async def fire(app, requests: int, headers: dict) -> float:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up connections and caches
+        await client.get("/api/v1/course/progress", headers=headers)
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.get("/api/v1/course/progress", headers=headers) for _ in range(requests)
+        ))
+        elapsed = time.perf_counter() - started
+    failed = [r.status_code for r in responses if r.status_code != 200]
+    if failed:
+        raise SystemExit(f"Requests failed: {failed[:5]}")
+    return elapsed
+
+
+async def main(requests: int, delay: float) -> None:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start_fake_upstream(port, delay)
+
+    os.environ.update({
+        "SUPABASE_URL": url,
+        "SUPABASE_KEY": "benchmark-key",
+        "BUNNYCDN_API_KEY": "benchmark-key",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+    })
+    from jose import jwt
+    from app.main import app
+    from app.db.database import init_supabase_client, close_supabase_client
+
+    now = int(time.time())
+    token = jwt.encode(
+        {"sub": "benchmark", "email": "bench@example.com", "aud": "authenticated", "iat": now, "exp": now + 600},
+        JWT_SECRET,
+        algorithm="HS256",
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+
+    blocking = await fire(build_blocking_app(url), requests, headers)
+
+    await init_supabase_client()
+    try:
+        concurrent = await fire(app, requests, headers)
+    finally:
+        await close_supabase_client()
+
+    print(f"{requests} concurrent requests, {delay * 1000:.0f} ms upstream latency per query")
+    print(f"  blocking client: {blocking:.3f}s ({requests / blocking:.1f} req/s)")
+    print(f"  async client:    {concurrent:.3f}s ({requests / concurrent:.1f} req/s)")
+    print(f"  speedup:         {blocking / concurrent:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.delay))
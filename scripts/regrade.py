@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Regrade stored quiz answers after an answer key change.
+
+Re-evaluates user_answers.is_correct with the current answers/tolerances
+(same rules as the quiz endpoint), writes back the changed rows in bulk and
+then recomputes progress score/passed and the quiz analytics aggregates
+(question_stats, module_stats) for the affected modules. Progress is kept in
+a checkpoint file: rerun the same command to resume after a failure.
+
+Requires supabase/migrations/20261017000010_progress_submission.sql and a
+service role SUPABASE_KEY.
+
+Usage:
+    python scripts/regrade.py                      # every question
+    python scripts/regrade.py --questions 12,13    # only these questions
+    python scripts/regrade.py --dry-run            # count changes, write nothing
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db.database import close_supabase_client, get_supabase_client  # noqa: E402
+from app.services.regrade import RegradeJob  # noqa: E402
+
+
+async def main(args: argparse.Namespace) -> int:
+    question_ids = [int(q) for q in args.questions.split(",")] if args.questions else None
+    db = await get_supabase_client()
+    try:
+        job = RegradeJob(
+            db,
+            args.checkpoint,
+            question_ids=question_ids,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+        )
+        state = await job.run()
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        await close_supabase_client()
+
+    print(
+        f"\nScanned {state['scanned']:,} answers, {state['changed']:,} changed, "
+        f"{state['progress_updated']:,} progress rows updated"
+    )
+    if not args.dry_run:
+        print(f"Checkpoint: {args.checkpoint} (remove it before the next regrade)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", help="Comma-separated question ids (default: all)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per request (PostgREST max-rows)")
+    parser.add_argument("--checkpoint", type=Path, default=Path("regrade.checkpoint.json"))
+    parser.add_argument("--dry-run", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
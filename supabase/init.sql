@@ -57,7 +57,10 @@ create table progress (
     module_id int references modules(id) on delete cascade,
     score float,
     passed boolean default false,
-    completed_at timestamp with time zone
+    completed_at timestamp with time zone,
+    -- submitted_at of the user_answers of the submission that set the score
+    submitted_at timestamp with time zone,
+    unique (user_id, module_id)
 );
 
 -- Certificates
@@ -68,6 +71,260 @@ create table certificates (
     certificate_url text
 );
 
+-- Videos uploaded to BunnyCDN
+create table videos (
+    id uuid primary key,
+    title text not null,
+    description text,
+    course_id text,
+    url text not null,
+    user_id uuid references users(id) on delete cascade,
+    -- Computed while streaming the upload to BunnyCDN
+    size_bytes bigint,
+    sha256 text,
+    created_at timestamp with time zone default now(),
+    updated_at timestamp with time zone
+);
+
+-- Indexes for hot lookups (see supabase/migrations for existing databases)
+create unique index certificates_user_id_key on certificates (user_id);
+create index user_answers_user_id_question_id_idx on user_answers (user_id, question_id);
+create index user_answers_question_id_idx on user_answers (question_id);
+create index user_answers_question_id_user_id_submitted_at_idx
+    on user_answers (question_id, user_id, submitted_at desc, id desc);
+create index questions_module_id_idx on questions (module_id);
+create index answers_question_id_is_correct_idx on answers (question_id, is_correct);
+create index module_blocks_module_id_order_idx on module_blocks (module_id, "order");
+create index users_created_at_id_idx on users (created_at, id);
+create index videos_created_at_id_idx on videos (created_at, id);
+create index videos_course_id_created_at_id_idx on videos (course_id, created_at, id);
+
+-- Per-user course summary, maintained by a trigger on progress so that
+-- /course/progress and the certificate check are single-row reads
+create table course_progress_summary (
+    user_id uuid primary key references users(id) on delete cascade,
+    completed_modules int not null default 0,
+    highest_score float,
+    highest_score_module_id int,
+    last_activity timestamp with time zone,
+    updated_at timestamp with time zone default now()
+);
+
+create or replace function refresh_course_progress_summary(p_user_id uuid) returns void as $$
+begin
+    -- Reads only this user's progress rows (progress_user_id_module_id_key)
+    insert into course_progress_summary as s (
+        user_id, completed_modules, highest_score, highest_score_module_id, last_activity, updated_at
+    )
+    select
+        p_user_id,
+        count(*) filter (where passed),
+        (array_agg(score order by score desc, module_id) filter (where score > 0))[1],
+        (array_agg(module_id order by score desc, module_id) filter (where score > 0))[1],
+        max(completed_at),
+        clock_timestamp()
+    from progress
+    where user_id = p_user_id
+    -- Skip users that are being deleted (cascade from users)
+    having exists (select 1 from users where id = p_user_id)
+    on conflict (user_id) do update set
+        completed_modules = excluded.completed_modules,
+        highest_score = excluded.highest_score,
+        highest_score_module_id = excluded.highest_score_module_id,
+        last_activity = excluded.last_activity,
+        updated_at = excluded.updated_at;
+end;
+$$ language plpgsql;
+
+create or replace function progress_summary_trigger() returns trigger as $$
+begin
+    if tg_op = 'DELETE' or (tg_op = 'UPDATE' and new.user_id is distinct from old.user_id) then
+        perform refresh_course_progress_summary(old.user_id);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform refresh_course_progress_summary(new.user_id);
+    end if;
+    return null;
+end;
+$$ language plpgsql;
+
+create trigger progress_course_summary
+    after insert or update or delete on progress
+    for each row execute function progress_summary_trigger();
+
+-- Recompute progress of one module after an answer key change (scripts/regrade.py)
+create or replace function regrade_progress(p_module_id int, p_passing_score float default 70)
+returns int as $$
+declare
+    updated int;
+begin
+    -- Score the submission that set each progress row as a whole, like
+    -- submit_quiz did: score = correct answers / module questions
+    with scores as (
+        select
+            p.id,
+            round(count(*) filter (where ua.is_correct)::float8
+                  / nullif((select count(*) from questions where module_id = p_module_id), 0) * 100) as score
+        from progress p
+        join user_answers ua on ua.user_id = p.user_id and ua.submitted_at = p.submitted_at
+        join questions q on q.id = ua.question_id and q.module_id = p_module_id
+        where p.module_id = p_module_id
+        group by p.id
+    )
+    update progress p set
+        score = s.score,
+        passed = s.score >= p_passing_score,
+        completed_at = case when s.score >= p_passing_score
+                            then coalesce(p.completed_at, p.submitted_at) end
+    from scores s
+    where p.id = s.id
+      and s.score is not null
+      and (p.score is distinct from s.score or p.passed is distinct from (s.score >= p_passing_score));
+
+    get diagnostics updated = row_count;
+    return updated;
+end;
+$$ language plpgsql;
+
+-- Incremental quiz analytics, updated by record_quiz_analytics() on every quiz submission
+create table module_stats (
+    module_id int primary key references modules(id) on delete cascade,
+    submissions bigint not null default 0,
+    passed bigint not null default 0,
+    score_sum float not null default 0,
+    updated_at timestamp with time zone default now()
+);
+
+create table question_stats (
+    question_id int primary key references questions(id) on delete cascade,
+    attempts bigint not null default 0,
+    correct bigint not null default 0,
+    updated_at timestamp with time zone default now()
+);
+
+-- How often each option of a single/multi choice question was picked,
+-- '' counts the picks that are not among the question's answers
+create table answer_option_stats (
+    question_id int references questions(id) on delete cascade,
+    answer_text text not null,
+    picks bigint not null default 0,
+    primary key (question_id, answer_text)
+);
+
+create or replace function record_quiz_analytics(
+    p_module_id int, p_score float, p_passed boolean, p_answers jsonb
+) returns void as $$
+begin
+    insert into module_stats as s (module_id, submissions, passed, score_sum, updated_at)
+    values (p_module_id, 1, p_passed::int, p_score, now())
+    on conflict (module_id) do update set
+        submissions = s.submissions + 1,
+        passed = s.passed + excluded.passed,
+        score_sum = s.score_sum + excluded.score_sum,
+        updated_at = excluded.updated_at;
+
+    -- Rows are upserted in key order so concurrent submissions cannot deadlock
+    insert into question_stats as s (question_id, attempts, correct, updated_at)
+    select
+        (a->>'question_id')::int,
+        count(*),
+        count(*) filter (where (a->>'is_correct')::boolean),
+        now()
+    from jsonb_array_elements(p_answers) a
+    group by 1
+    order by 1
+    on conflict (question_id) do update set
+        attempts = s.attempts + excluded.attempts,
+        correct = s.correct + excluded.correct,
+        updated_at = excluded.updated_at;
+
+    -- Unknown options count once per answer in the '' bucket
+    insert into answer_option_stats as s (question_id, answer_text, picks)
+    select question_id, option, count(*)
+    from (
+        select distinct a.n, (a.answer->>'question_id')::int as question_id,
+            case when exists (
+                select 1 from answers
+                where answers.question_id = (a.answer->>'question_id')::int and answers.answer_text = o.option
+            ) then o.option else '' end as option
+        from jsonb_array_elements(p_answers) with ordinality a(answer, n),
+            jsonb_array_elements_text(a.answer->'options') o(option)
+    ) picked
+    group by 1, 2
+    order by 1, 2
+    on conflict (question_id, answer_text) do update set
+        picks = s.picks + excluded.picks;
+end;
+$$ language plpgsql;
+
+-- Rebuild the analytics aggregates of one module from user_answers, e.g. after
+-- a regrade changed is_correct (scripts/regrade.py). Submissions are the
+-- groups of answers sharing user_id and submitted_at.
+create or replace function rebuild_quiz_stats(p_module_id int, p_passing_score float default 70)
+returns void as $$
+begin
+    insert into question_stats as s (question_id, attempts, correct, updated_at)
+    select q.id, count(ua.id), count(ua.id) filter (where ua.is_correct), now()
+    from questions q
+    left join user_answers ua on ua.question_id = q.id
+    where q.module_id = p_module_id
+    group by q.id
+    order by q.id
+    on conflict (question_id) do update set
+        attempts = excluded.attempts,
+        correct = excluded.correct,
+        updated_at = excluded.updated_at;
+
+    insert into module_stats as s (module_id, submissions, passed, score_sum, updated_at)
+    select p_module_id, count(*), count(*) filter (where score >= p_passing_score), coalesce(sum(score), 0), now()
+    from (
+        select round(count(*) filter (where ua.is_correct)::float8
+                     / nullif((select count(*) from questions where module_id = p_module_id), 0) * 100) as score
+        from user_answers ua
+        join questions q on q.id = ua.question_id
+        where q.module_id = p_module_id
+        group by ua.user_id, ua.submitted_at
+    ) submissions
+    on conflict (module_id) do update set
+        submissions = excluded.submissions,
+        passed = excluded.passed,
+        score_sum = excluded.score_sum,
+        updated_at = excluded.updated_at;
+end;
+$$ language plpgsql;
+
+-- Course content version, bumped on every change to the course content
+create table course_content_version (
+    id int primary key default 1 check (id = 1),
+    version bigint not null default 1,
+    updated_at timestamp with time zone default now()
+);
+
+insert into course_content_version (id) values (1);
+
+create or replace function bump_course_content_version() returns trigger as $$
+begin
+    update course_content_version set version = version + 1, updated_at = now() where id = 1;
+    return null;
+end;
+$$ language plpgsql;
+
+create trigger modules_content_version
+    after insert or update or delete or truncate on modules
+    for each statement execute function bump_course_content_version();
+
+create trigger module_blocks_content_version
+    after insert or update or delete or truncate on module_blocks
+    for each statement execute function bump_course_content_version();
+
+create trigger questions_content_version
+    after insert or update or delete or truncate on questions
+    for each statement execute function bump_course_content_version();
+
+create trigger answers_content_version
+    after insert or update or delete or truncate on answers
+    for each statement execute function bump_course_content_version();
+
 -- Insert sample modules
 INSERT INTO modules (title, description, "order", slug) VALUES
 ('Introduction to OSINT', 'Learn the fundamentals of open-source intelligence gathering and its applications.', 1, 'introduction-to-osint'),
@@ -0,0 +1,37 @@
+-- Course content version for the in-process content cache.
+-- Fresh installs get the same objects from supabase/init.sql.
+
+create table if not exists course_content_version (
+    id int primary key default 1 check (id = 1),
+    version bigint not null default 1,
+    updated_at timestamp with time zone default now()
+);
+
+insert into course_content_version (id) values (1) on conflict (id) do nothing;
+
+create or replace function bump_course_content_version() returns trigger as $$
+begin
+    update course_content_version set version = version + 1, updated_at = now() where id = 1;
+    return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists modules_content_version on modules;
+create trigger modules_content_version
+    after insert or update or delete or truncate on modules
+    for each statement execute function bump_course_content_version();
+
+drop trigger if exists module_blocks_content_version on module_blocks;
+create trigger module_blocks_content_version
+    after insert or update or delete or truncate on module_blocks
+    for each statement execute function bump_course_content_version();
+
+drop trigger if exists questions_content_version on questions;
+create trigger questions_content_version
+    after insert or update or delete or truncate on questions
+    for each statement execute function bump_course_content_version();
+
+drop trigger if exists answers_content_version on answers;
+create trigger answers_content_version
+    after insert or update or delete or truncate on answers
+    for each statement execute function bump_course_content_version();
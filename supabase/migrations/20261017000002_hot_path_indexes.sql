@@ -0,0 +1,38 @@
+-- Indexes for every hot lookup of the API and the unique constraints
+-- used by upserts. Fresh installs get the same objects from supabase/init.sql.
+-- Verify with scripts/explain_hot_queries.py.
+
+-- progress: one row per (user, module), required by the submit_quiz upsert.
+-- Older versions could insert duplicates, keep the newest row of each pair.
+delete from progress older
+    using progress newer
+    where older.user_id = newer.user_id
+      and older.module_id = newer.module_id
+      and older.id < newer.id;
+
+do $$
+begin
+    if not exists (select 1 from pg_constraint where conname = 'progress_user_id_module_id_key') then
+        alter table progress add constraint progress_user_id_module_id_key unique (user_id, module_id);
+    end if;
+end $$;
+
+-- certificates: one certificate per user
+delete from certificates older
+    using certificates newer
+    where older.user_id = newer.user_id
+      and older.id < newer.id;
+
+create unique index if not exists certificates_user_id_key on certificates (user_id);
+
+-- user_answers: per-user answer lookups; question_id alone for cascades and analytics
+create index if not exists user_answers_user_id_question_id_idx on user_answers (user_id, question_id);
+create index if not exists user_answers_question_id_idx on user_answers (question_id);
+
+-- course content lookups
+create index if not exists questions_module_id_idx on questions (module_id);
+create index if not exists answers_question_id_is_correct_idx on answers (question_id, is_correct);
+create index if not exists module_blocks_module_id_order_idx on module_blocks (module_id, "order");
+
+-- videos filtered by course
+create index if not exists videos_course_id_idx on videos (course_id);
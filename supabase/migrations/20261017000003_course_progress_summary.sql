@@ -0,0 +1,57 @@
+-- Per-user course summary maintained from progress.
+-- Fresh installs get the same objects from supabase/init.sql.
+
+create table if not exists course_progress_summary (
+    user_id uuid primary key references users(id) on delete cascade,
+    completed_modules int not null default 0,
+    highest_score float,
+    highest_score_module_id int,
+    last_activity timestamp with time zone,
+    updated_at timestamp with time zone default now()
+);
+
+create or replace function refresh_course_progress_summary(p_user_id uuid) returns void as $$
+begin
+    -- Reads only this user's progress rows (progress_user_id_module_id_key)
+    insert into course_progress_summary as s (
+        user_id, completed_modules, highest_score, highest_score_module_id, last_activity, updated_at
+    )
+    select
+        p_user_id,
+        count(*) filter (where passed),
+        (array_agg(score order by score desc, module_id) filter (where score > 0))[1],
+        (array_agg(module_id order by score desc, module_id) filter (where score > 0))[1],
+        max(completed_at),
+        clock_timestamp()
+    from progress
+    where user_id = p_user_id
+    -- Skip users that are being deleted (cascade from users)
+    having exists (select 1 from users where id = p_user_id)
+    on conflict (user_id) do update set
+        completed_modules = excluded.completed_modules,
+        highest_score = excluded.highest_score,
+        highest_score_module_id = excluded.highest_score_module_id,
+        last_activity = excluded.last_activity,
+        updated_at = excluded.updated_at;
+end;
+$$ language plpgsql;
+
+create or replace function progress_summary_trigger() returns trigger as $$
+begin
+    if tg_op = 'DELETE' or (tg_op = 'UPDATE' and new.user_id is distinct from old.user_id) then
+        perform refresh_course_progress_summary(old.user_id);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform refresh_course_progress_summary(new.user_id);
+    end if;
+    return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists progress_course_summary on progress;
+create trigger progress_course_summary
+    after insert or update or delete on progress
+    for each row execute function progress_summary_trigger();
+
+-- Backfill existing users
+select refresh_course_progress_summary(user_id) from (select distinct user_id from progress) users_with_progress;
@@ -0,0 +1,9 @@
+-- Indexes for keyset pagination on (created_at, id).
+-- Fresh installs get the same objects from supabase/init.sql.
+
+create index if not exists users_created_at_id_idx on users (created_at, id);
+create index if not exists videos_created_at_id_idx on videos (created_at, id);
+
+-- Serves both the course_id filter and the paginated listing per course
+create index if not exists videos_course_id_created_at_id_idx on videos (course_id, created_at, id);
+drop index if exists videos_course_id_idx;
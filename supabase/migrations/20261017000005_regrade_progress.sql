@@ -0,0 +1,45 @@
+-- Recompute progress after an answer key change (used by scripts/regrade.py).
+-- Fresh installs get the same objects from supabase/init.sql.
+
+-- Index for reading each user's latest answer per question
+create index if not exists user_answers_question_id_user_id_submitted_at_idx
+    on user_answers (question_id, user_id, submitted_at desc, id desc);
+
+create or replace function regrade_progress(p_module_id int, p_passing_score float default 70)
+returns int as $$
+declare
+    updated int;
+begin
+    -- Score = latest answer per question, same formula as submit_quiz
+    with latest as (
+        select distinct on (ua.user_id, ua.question_id)
+            ua.user_id, ua.is_correct, ua.submitted_at
+        from user_answers ua
+        join questions q on q.id = ua.question_id
+        where q.module_id = p_module_id
+        order by ua.user_id, ua.question_id, ua.submitted_at desc, ua.id desc
+    ),
+    scores as (
+        select
+            user_id,
+            round(count(*) filter (where is_correct)::float8
+                  / nullif((select count(*) from questions where module_id = p_module_id), 0) * 100) as score,
+            max(submitted_at) as last_submitted_at
+        from latest
+        group by user_id
+    )
+    update progress p set
+        score = s.score,
+        passed = s.score >= p_passing_score,
+        completed_at = case when s.score >= p_passing_score
+                            then coalesce(p.completed_at, s.last_submitted_at) end
+    from scores s
+    where p.user_id = s.user_id
+      and p.module_id = p_module_id
+      and s.score is not null
+      and (p.score is distinct from s.score or p.passed is distinct from (s.score >= p_passing_score));
+
+    get diagnostics updated = row_count;
+    return updated;
+end;
+$$ language plpgsql;
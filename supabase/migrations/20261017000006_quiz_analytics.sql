@@ -0,0 +1,91 @@
+-- Incremental quiz analytics, updated by record_quiz_analytics() on every
+-- quiz submission so reports never scan user_answers.
+-- Fresh installs get the same objects from supabase/init.sql.
+
+create table if not exists module_stats (
+    module_id int primary key references modules(id) on delete cascade,
+    submissions bigint not null default 0,
+    passed bigint not null default 0,
+    score_sum float not null default 0,
+    updated_at timestamp with time zone default now()
+);
+
+create table if not exists question_stats (
+    question_id int primary key references questions(id) on delete cascade,
+    attempts bigint not null default 0,
+    correct bigint not null default 0,
+    updated_at timestamp with time zone default now()
+);
+
+-- How often each option of a single/multi choice question was picked
+create table if not exists answer_option_stats (
+    question_id int references questions(id) on delete cascade,
+    answer_text text not null,
+    picks bigint not null default 0,
+    primary key (question_id, answer_text)
+);
+
+create or replace function record_quiz_analytics(
+    p_module_id int, p_score float, p_passed boolean, p_answers jsonb
+) returns void as $$
+begin
+    insert into module_stats as s (module_id, submissions, passed, score_sum, updated_at)
+    values (p_module_id, 1, p_passed::int, p_score, now())
+    on conflict (module_id) do update set
+        submissions = s.submissions + 1,
+        passed = s.passed + excluded.passed,
+        score_sum = s.score_sum + excluded.score_sum,
+        updated_at = excluded.updated_at;
+
+    -- Rows are upserted in key order so concurrent submissions cannot deadlock
+    insert into question_stats as s (question_id, attempts, correct, updated_at)
+    select
+        (a->>'question_id')::int,
+        count(*),
+        count(*) filter (where (a->>'is_correct')::boolean),
+        now()
+    from jsonb_array_elements(p_answers) a
+    group by 1
+    order by 1
+    on conflict (question_id) do update set
+        attempts = s.attempts + excluded.attempts,
+        correct = s.correct + excluded.correct,
+        updated_at = excluded.updated_at;
+
+    insert into answer_option_stats as s (question_id, answer_text, picks)
+    select (a->>'question_id')::int, option, count(*)
+    from jsonb_array_elements(p_answers) a, jsonb_array_elements_text(a->'options') option
+    group by 1, 2
+    order by 1, 2
+    on conflict (question_id, answer_text) do update set
+        picks = s.picks + excluded.picks;
+end;
+$$ language plpgsql;
+
+-- Backfill from the data collected so far. Module submissions before this
+-- migration are not recorded, the latest attempt per user stands in for them.
+insert into question_stats (question_id, attempts, correct)
+select question_id, count(*), count(*) filter (where is_correct)
+from user_answers
+where question_id is not null
+group by question_id
+on conflict (question_id) do nothing;
+
+insert into answer_option_stats (question_id, answer_text, picks)
+select ua.question_id, option, count(*)
+from user_answers ua
+join questions q on q.id = ua.question_id and q.type in ('single', 'multi')
+cross join lateral (
+    select distinct unnest(case when q.type = 'multi' then string_to_array(ua.answer_text, ', ')
+                                else array[ua.answer_text] end) as option
+) options
+where option <> ''
+group by ua.question_id, option
+on conflict (question_id, answer_text) do nothing;
+
+insert into module_stats (module_id, submissions, passed, score_sum)
+select module_id, count(*), count(*) filter (where passed), coalesce(sum(score), 0)
+from progress
+where module_id is not null
+group by module_id
+on conflict (module_id) do nothing;
@@ -0,0 +1,6 @@
+-- Size and SHA-256 of uploaded videos, computed while streaming to BunnyCDN.
+-- Fresh installs get the same columns from supabase/init.sql.
+-- Videos uploaded before this migration keep NULLs.
+
+alter table videos add column if not exists size_bytes bigint;
+alter table videos add column if not exists sha256 text;
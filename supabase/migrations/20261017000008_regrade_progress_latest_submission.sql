@@ -0,0 +1,48 @@
+-- regrade_progress() scored the latest answer per question across submissions,
+-- which could change the score of users whose answers were not regraded.
+-- Score the latest submission as a unit instead, the way submit_quiz does.
+-- Fresh installs get the same function from supabase/init.sql.
+
+create or replace function regrade_progress(p_module_id int, p_passing_score float default 70)
+returns int as $$
+declare
+    updated int;
+begin
+    -- Score each user's latest submission as a whole, like submit_quiz did:
+    -- its answers share submitted_at, score = correct answers / module questions
+    with module_answers as (
+        select ua.user_id, ua.is_correct, ua.submitted_at
+        from user_answers ua
+        join questions q on q.id = ua.question_id
+        where q.module_id = p_module_id
+    ),
+    latest as (
+        select user_id, max(submitted_at) as submitted_at
+        from module_answers
+        group by user_id
+    ),
+    scores as (
+        select
+            a.user_id,
+            round(count(*) filter (where a.is_correct)::float8
+                  / nullif((select count(*) from questions where module_id = p_module_id), 0) * 100) as score,
+            l.submitted_at as last_submitted_at
+        from module_answers a
+        join latest l on l.user_id = a.user_id and l.submitted_at = a.submitted_at
+        group by a.user_id, l.submitted_at
+    )
+    update progress p set
+        score = s.score,
+        passed = s.score >= p_passing_score,
+        completed_at = case when s.score >= p_passing_score
+                            then coalesce(p.completed_at, s.last_submitted_at) end
+    from scores s
+    where p.user_id = s.user_id
+      and p.module_id = p_module_id
+      and s.score is not null
+      and (p.score is distinct from s.score or p.passed is distinct from (s.score >= p_passing_score));
+
+    get diagnostics updated = row_count;
+    return updated;
+end;
+$$ language plpgsql;
@@ -0,0 +1,67 @@
+-- record_quiz_analytics() stored every option text a client sent, so
+-- answer_option_stats could grow without bound. Count only the question's
+-- own answers and fold anything else into one '' (other) bucket per question.
+-- Fresh installs get the same function from supabase/init.sql.
+
+create or replace function record_quiz_analytics(
+    p_module_id int, p_score float, p_passed boolean, p_answers jsonb
+) returns void as $$
+begin
+    insert into module_stats as s (module_id, submissions, passed, score_sum, updated_at)
+    values (p_module_id, 1, p_passed::int, p_score, now())
+    on conflict (module_id) do update set
+        submissions = s.submissions + 1,
+        passed = s.passed + excluded.passed,
+        score_sum = s.score_sum + excluded.score_sum,
+        updated_at = excluded.updated_at;
+
+    -- Rows are upserted in key order so concurrent submissions cannot deadlock
+    insert into question_stats as s (question_id, attempts, correct, updated_at)
+    select
+        (a->>'question_id')::int,
+        count(*),
+        count(*) filter (where (a->>'is_correct')::boolean),
+        now()
+    from jsonb_array_elements(p_answers) a
+    group by 1
+    order by 1
+    on conflict (question_id) do update set
+        attempts = s.attempts + excluded.attempts,
+        correct = s.correct + excluded.correct,
+        updated_at = excluded.updated_at;
+
+    -- Unknown options count once per answer in the '' bucket
+    insert into answer_option_stats as s (question_id, answer_text, picks)
+    select question_id, option, count(*)
+    from (
+        select distinct a.n, (a.answer->>'question_id')::int as question_id,
+            case when exists (
+                select 1 from answers
+                where answers.question_id = (a.answer->>'question_id')::int and answers.answer_text = o.option
+            ) then o.option else '' end as option
+        from jsonb_array_elements(p_answers) with ordinality a(answer, n),
+            jsonb_array_elements_text(a.answer->'options') o(option)
+    ) picked
+    group by 1, 2
+    order by 1, 2
+    on conflict (question_id, answer_text) do update set
+        picks = s.picks + excluded.picks;
+end;
+$$ language plpgsql;
+
+-- Fold the unknown options recorded so far into the other bucket. Answers
+-- that picked several of them are counted once per option here.
+with unknown as (
+    delete from answer_option_stats s
+    where s.answer_text <> '' and not exists (
+        select 1 from answers a where a.question_id = s.question_id and a.answer_text = s.answer_text
+    )
+    returning question_id, picks
+)
+insert into answer_option_stats as s (question_id, answer_text, picks)
+select question_id, '', sum(picks)
+from unknown
+group by question_id
+order by question_id
+on conflict (question_id, answer_text) do update set
+    picks = s.picks + excluded.picks;
@@ -0,0 +1,88 @@
+-- progress did not record which submission set its score, so regrade_progress()
+-- scored each user's latest submitted_at. user_answers rows are written in the
+-- background, and replayed late after a failure, so that could be an older
+-- attempt. submit_quiz now stores the submission's submitted_at on progress
+-- and regrade_progress() scores exactly that submission.
+-- rebuild_quiz_stats() brings the analytics aggregates in line after a regrade.
+-- Fresh installs get the same objects from supabase/init.sql.
+
+alter table progress add column if not exists submitted_at timestamp with time zone;
+
+-- Rows written before this migration: the latest submission is the best guess
+update progress p set submitted_at = l.submitted_at
+from (
+    select ua.user_id, q.module_id, max(ua.submitted_at) as submitted_at
+    from user_answers ua
+    join questions q on q.id = ua.question_id
+    group by ua.user_id, q.module_id
+) l
+where p.submitted_at is null and p.user_id = l.user_id and p.module_id = l.module_id;
+
+create or replace function regrade_progress(p_module_id int, p_passing_score float default 70)
+returns int as $$
+declare
+    updated int;
+begin
+    -- Score the submission that set each progress row as a whole, like
+    -- submit_quiz did: score = correct answers / module questions
+    with scores as (
+        select
+            p.id,
+            round(count(*) filter (where ua.is_correct)::float8
+                  / nullif((select count(*) from questions where module_id = p_module_id), 0) * 100) as score
+        from progress p
+        join user_answers ua on ua.user_id = p.user_id and ua.submitted_at = p.submitted_at
+        join questions q on q.id = ua.question_id and q.module_id = p_module_id
+        where p.module_id = p_module_id
+        group by p.id
+    )
+    update progress p set
+        score = s.score,
+        passed = s.score >= p_passing_score,
+        completed_at = case when s.score >= p_passing_score
+                            then coalesce(p.completed_at, p.submitted_at) end
+    from scores s
+    where p.id = s.id
+      and s.score is not null
+      and (p.score is distinct from s.score or p.passed is distinct from (s.score >= p_passing_score));
+
+    get diagnostics updated = row_count;
+    return updated;
+end;
+$$ language plpgsql;
+
+-- Rebuild the analytics aggregates of one module from user_answers, e.g. after
+-- a regrade changed is_correct (scripts/regrade.py). Submissions are the
+-- groups of answers sharing user_id and submitted_at.
+create or replace function rebuild_quiz_stats(p_module_id int, p_passing_score float default 70)
+returns void as $$
+begin
+    insert into question_stats as s (question_id, attempts, correct, updated_at)
+    select q.id, count(ua.id), count(ua.id) filter (where ua.is_correct), now()
+    from questions q
+    left join user_answers ua on ua.question_id = q.id
+    where q.module_id = p_module_id
+    group by q.id
+    order by q.id
+    on conflict (question_id) do update set
+        attempts = excluded.attempts,
+        correct = excluded.correct,
+        updated_at = excluded.updated_at;
+
+    insert into module_stats as s (module_id, submissions, passed, score_sum, updated_at)
+    select p_module_id, count(*), count(*) filter (where score >= p_passing_score), coalesce(sum(score), 0), now()
+    from (
+        select round(count(*) filter (where ua.is_correct)::float8
+                     / nullif((select count(*) from questions where module_id = p_module_id), 0) * 100) as score
+        from user_answers ua
+        join questions q on q.id = ua.question_id
+        where q.module_id = p_module_id
+        group by ua.user_id, ua.submitted_at
+    ) submissions
+    on conflict (module_id) do update set
+        submissions = excluded.submissions,
+        passed = excluded.passed,
+        score_sum = excluded.score_sum,
+        updated_at = excluded.updated_at;
+end;
+$$ language plpgsql;
@@ -1,8 +1,49 @@
 import sys
+import json
+import base64
+import time
+from datetime import datetime
+import asyncio
 import pytest
+import pytest_asyncio
+import httpx
+from jose import jwt
 
-from app.services.quiz import evaluate_quiz_answer, generate_quiz_feedback, extract_answer_data
-from app.db.database import get_supabase_client
+from app.core import security
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.fields import parse_fields, project, select_columns
+from app.core.pagination import decode_cursor, split_page
+from app.core.responses import (
+    api_response, etag_matches, extend_json_object, make_etag, negotiate_encoding
+)
+from app.core.security import (
+    AmbiguousTokenError, TokenVerificationError, is_token_revoked, revoke_token,
+    user_from_claims, verify_supabase_token
+)
+from app.services.users import UserService
+from app.services.bunnycdn import BunnyCDNService
+from app.services.upload_stream import UploadStream, UploadTooLarge
+from app.services.resumable_upload import (
+    ResumableUploadStore, UploadConflict, UploadLocked, UploadNotFound, add_range,
+)
+from app.services.ingest import IngestQueueFull, VideoIngestQueue
+from app.services import bunnycdn as bunnycdn_module
+from app.services.content import CourseContent, CourseContentCache, stitch_course_tree
+from app.services.progress import course_progress_from_summary, module_progress_fields
+from app.services.analytics import OTHER_OPTION, build_analytics_report, chosen_options, quiz_analytics_params
+from app.services.idempotency import IdempotencyKeyReuseError, IdempotencyStore
+from app.services.regrade import RegradeJob, RegradeKey, regrade_rows
+from app.services.write_behind import WriteBehindBuffer
+from app.services.quiz import (
+    QuestionGrader, compile_answer_key, evaluate_quiz_answer, generate_quiz_feedback, extract_answer_data
+)
+from app.api.deps import get_db
+from app.api.endpoints import admin as admin_endpoints
+from app.api.endpoints import auth as auth_endpoints
+from app.api.endpoints import course as course_endpoints
+from app.schemas.schemas import QuizSubmission, User
+from app.db.database import get_supabase_client, close_supabase_client
 
 
 def run_quiz_test(question_type, answer_text, correct_answers, expected_is_correct, expected_feedback=None):
@@ -87,6 +128,34 @@ def test_number_answers():
     assert result["feedback"] == "Invalid number format"
 
 
+@pytest.mark.parametrize("question_type", ["single", "multi", "text", "number"])
+@pytest.mark.parametrize("answer_text", [["Option A"], {"answer": "Option A"}, None, 4])
+def test_non_string_answers_are_incorrect(question_type, answer_text):
+    """Тестування відповідей, які не є рядком: вони неправильні, а не помилка."""
+    question = {"type": question_type}
+    result = evaluate_quiz_answer(question, answer_text, [{"answer_text": "Option A"}])
+    assert result["is_correct"] is False
+    assert chosen_options(QuestionGrader(question, []), answer_text) == []
+
+def test_compiled_answer_key():
+    """Тестування скомпільованого ключа відповідей модуля."""
+    answer_key = compile_answer_key([
+        {"id": 1, "type": "single", "answers": [
+            {"answer_text": "site:", "is_correct": True},
+            {"answer_text": "url:", "is_correct": False},
+        ]},
+        {"id": 2, "type": "text", "answers": [{"answer_text": "OSINT", "is_correct": True}]},
+        {"id": 3, "type": "number", "tolerance": None, "answers": [{"answer_text": "15", "is_correct": True}]},
+    ])
+
+    assert answer_key[1].grade("site:")["is_correct"] is True
+    assert answer_key[1].grade("url:")["correct_answer_text"] == "site:"
+    assert answer_key[2].grade(" osint ")["is_correct"] is True
+    assert answer_key[3].grade("15")["is_correct"] is True
+    assert answer_key[3].grade("16")["is_correct"] is False
+    assert answer_key[3].grade("many")["feedback"] == "Invalid number format"
+
+
 @pytest.mark.parametrize("score,expected", [
     (95, "Excellent work! You've mastered this module."),
     (90, "Excellent work! You've mastered this module."),
@@ -134,19 +203,1050 @@ def test_missing_data():
     assert result["answer_text"] == ""
 
 
-# Тести бази даних
+# Тести локальної перевірки JWT
+TEST_JWT_SECRET = "test-jwt-secret-at-least-32-characters-long"
+
+
+def make_token(secret=TEST_JWT_SECRET, **overrides):
+    """Допоміжна функція для створення токена у форматі Supabase."""
+    now = int(time.time())
+    claims = {
+        "sub": "5b1f3f4e-1d2c-4a8b-9f1e-2a3b4c5d6e7f",
+        "email": "student@example.com",
+        "aud": "authenticated",
+        "role": "authenticated",
+        "iat": now,
+        "exp": now + 3600,
+        "user_metadata": {"full_name": "Test Student"},
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, secret, algorithm="HS256")
+
+
 @pytest.fixture
-def db_client():
+def jwt_secret(monkeypatch):
+    """Фікстура для налаштування секрету JWT."""
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", TEST_JWT_SECRET)
+
+
+def test_local_token_verification(jwt_secret):
+    """Тестування перевірки валідного токена без звернення до Supabase."""
+    claims = asyncio.run(verify_supabase_token(make_token()))
+    user = user_from_claims(claims)
+
+    assert user.id == "5b1f3f4e-1d2c-4a8b-9f1e-2a3b4c5d6e7f"
+    assert user.email == "student@example.com"
+    assert user.full_name == "Test Student"
+    assert user.is_superuser is False
+    # Час видачі токена не є датою створення облікового запису
+    assert user.created_at is None and user.updated_at is None
+
+
+@pytest.mark.parametrize("token_kwargs", [
+    {"secret": "another-secret-at-least-32-characters-long"},
+    {"exp": int(time.time()) - 10},
+    {"aud": "anon"},
+])
+def test_invalid_tokens_are_rejected(jwt_secret, token_kwargs):
+    """Тестування відхилення токенів з невірним підписом, терміном дії або аудиторією."""
+    with pytest.raises(TokenVerificationError):
+        asyncio.run(verify_supabase_token(make_token(**token_kwargs)))
+
+
+def test_ambiguous_tokens_fall_back(monkeypatch):
+    """Тестування токенів, які неможливо перевірити локально."""
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", "")
+    with pytest.raises(AmbiguousTokenError):
+        asyncio.run(verify_supabase_token(make_token()))
+
+
+def test_logout_revokes_token(jwt_secret):
+    """Тестування відкликання токена під час виходу."""
+    token = make_token()
+    assert is_token_revoked(token) is False
+
+    revoke_token(token)
+    assert is_token_revoked(token) is True
+
+
+def test_revocations_are_pruned_after_expiry(jwt_secret, monkeypatch):
+    """Тестування видалення відкликань після закінчення терміну дії токенів."""
+    monkeypatch.setattr(security, "revoked_tokens", {})
+    monkeypatch.setattr(security, "_revoked_token_expiries", [])
+    monkeypatch.setattr(security, "revoked_users", {})
+    now = time.time()
+    short_lived = make_token(exp=int(now) + 60)
+    long_lived = make_token(exp=int(now) + 3600)
+    revoke_token(short_lived)
+    revoke_token(long_lived)
+    security.revoke_user("old-user")
+    security.revoke_user("new-user")
+    security.revoked_users["old-user"] = now - settings.JWT_MAX_LIFETIME - 1
+    security.revoked_users["new-user"] = now
+
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert is_token_revoked(long_lived) is True
+    assert is_token_revoked(short_lived) is False
+    assert len(security.revoked_tokens) == 1
+    assert list(security.revoked_users) == ["new-user"]
+
+
+def test_ttl_cache_lru_and_counters():
+    """Тестування витіснення LRU, терміну дії записів та лічильників."""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    cache.set("expired", 4, ttl=-1)
+    assert cache.get("expired") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+
+
+class FakeQuery:
+    """Мінімальна заглушка запиту Supabase, яка записує виклики."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+
+    def upsert(self, data, **kwargs):
+        self.client.calls.append((self.table, "upsert", data, kwargs))
+        return self
+
+    def insert(self, data, **kwargs):
+        self.client.calls.append((self.table, "insert", data, kwargs))
+        return self
+
+    def __getattr__(self, name):
+        # select, eq, order та інші фільтри просто повертають той самий запит
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        self.client.executed.append(self.table)
+        return type("Response", (), {"data": self.client.data.get(self.table, [])})()
+
+
+class FakeClient:
+    def __init__(self, data=None):
+        self.calls = []
+        self.executed = []
+        self.data = data or {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        self.calls.append((name, "rpc", params, {}))
+        return FakeQuery(self, name)
+
+
+@pytest.mark.asyncio
+async def test_quiz_submission_writes_in_bulk(monkeypatch):
+    """Тестування збереження відповідей одним пакетом і прогресу одним upsert."""
+    questions = [
+        {"id": question_id, "question_text": "Q", "type": "single", "answers": [
+            {"id": question_id, "answer_text": "A", "is_correct": True},
+        ]}
+        for question_id in (1, 2, 3)
+    ]
+    content = CourseContent([{"id": 7, "title": "M", "slug": "m", "order": 1, "questions": questions}], version=1)
+
+    async def cached_content(db):
+        return content
+
+    queued = []
+
+    async def queue_rows(rows):
+        queued.append(rows)
+
+    monkeypatch.setattr(course_endpoints.course_content_cache, "get", cached_content)
+    monkeypatch.setattr(course_endpoints.user_answers_writer, "submit", queue_rows)
+    user = User(id="student", email="student@example.com", created_at=datetime.now())
+    quiz = QuizSubmission(answers=[
+        {"question_id": 1, "answer_text": "A"},
+        {"question_id": 2, "answer_text": "A"},
+        {"question_id": 3, "answer_text": "B"},
+    ])
+
+    client = FakeClient()
+    result = await course_endpoints.grade_and_save_quiz(7, quiz, client, user)
+
+    assert (result.score, result.passed) == (67, False)
+    # Усі відповіді однієї спроби передаються разом і мають спільний submitted_at
+    assert len(queued) == 1 and [answer["question_id"] for answer in queued[0]] == [1, 2, 3]
+    assert len({answer["submitted_at"] for answer in queued[0]}) == 1
+    # Жодних попередніх читань users чи progress, лише upsert прогресу та аналітика
+    assert sorted(client.executed) == ["progress", "record_quiz_analytics"]
+    (progress_call,) = [call for call in client.calls if call[0] == "progress"]
+    assert progress_call[1] == "upsert" and progress_call[3] == {"on_conflict": "user_id,module_id"}
+    assert progress_call[2]["score"] == 67 and progress_call[2]["completed_at"] is None
+    assert progress_call[2]["submitted_at"] == queued[0][0]["submitted_at"]
+
+    # Помилка запису прогресу не скасовує результат спроби
+    class FailingQuery(FakeQuery):
+        async def execute(self):
+            if self.table == "progress":
+                raise RuntimeError("progress is unavailable")
+            return await super().execute()
+
+    failing_client = FakeClient()
+    failing_client.table = lambda name: FailingQuery(failing_client, name)
+    result = await course_endpoints.grade_and_save_quiz(7, quiz, failing_client, user)
+    assert result.score == 67 and len(queued) == 2
+
+def test_user_bootstrap_runs_once():
+    """Тестування ідемпотентного створення користувача лише один раз на процес."""
+    client = FakeClient()
+    service = UserService(client)
+
+    asyncio.run(service.ensure_exists("bootstrap-user"))
+    asyncio.run(service.ensure_exists("bootstrap-user"))
+
+    assert client.calls == [
+        ("users", "upsert", {"id": "bootstrap-user"}, {"on_conflict": "id", "ignore_duplicates": True})
+    ]
+
+
+def test_course_tree_stitching():
+    """Тестування впорядкування вкладених блоків, питань і відповідей модуля."""
+    modules = stitch_course_tree([
+        {
+            "id": 1,
+            "blocks": [{"id": 2, "order": 2}, {"id": 1, "order": 1}],
+            "questions": [
+                {"id": 5, "answers": [{"id": 9}, {"id": 8}]},
+                {"id": 4, "answers": None},
+            ],
+        },
+        {"id": 2, "blocks": None, "questions": None},
+    ])
+
+    assert [b["order"] for b in modules[0]["blocks"]] == [1, 2]
+    assert [q["id"] for q in modules[0]["questions"]] == [4, 5]
+    assert [a["id"] for a in modules[0]["questions"][1]["answers"]] == [8, 9]
+    assert modules[0]["questions"][0]["answers"] == []
+    assert modules[1]["blocks"] == [] and modules[1]["questions"] == []
+
+
+def test_content_cache_reloads_on_version_change():
+    """Тестування перезавантаження кешу контенту лише після зміни версії."""
+    client = FakeClient({
+        "course_content_version": [{"version": 1}],
+        "modules": [{"id": 1, "order": 1, "blocks": [], "questions": []}],
+    })
+    cache = CourseContentCache(check_interval=0)
+
+    async def scenario():
+        first = await cache.get(client)
+        second = await cache.get(client)
+        client.data["course_content_version"] = [{"version": 2}]
+        third = await cache.get(client)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+
+    assert first is second
+    assert third is not first and third.version == 2
+    assert client.executed.count("modules") == 2
+    assert cache.stats()["refreshes"] == 2
+
+
+def test_course_progress_from_summary():
+    """Тестування побудови прогресу курсу з рядка course_progress_summary."""
+    progress = course_progress_from_summary("user", {
+        "completed_modules": 2,
+        "highest_score": 95.0,
+        "highest_score_module_id": 3,
+        "last_activity": "2026-10-01T10:00:00+00:00",
+    }, total_modules=2)
+
+    assert progress.is_completed is True
+    assert progress.highest_score == {"module": 3, "score": 95.0}
+    assert progress.last_activity == "2026-10-01T10:00:00+00:00"
+
+    empty = course_progress_from_summary("user", None, total_modules=10)
+    assert empty.has_started is False
+    assert empty.last_activity == "Never"
+    assert empty.highest_score == {"module": 0, "score": 0}
+
+
+def test_keyset_pagination_cursor():
+    """Тестування курсора пагінації за (created_at, id)."""
+    ids = ["00000000-0000-4000-8000-00000000000" + c for c in "abc"]
+    rows = [
+        {"id": ids[0], "created_at": "2026-10-01T10:00:00+00:00"},
+        {"id": ids[1], "created_at": "2026-10-01T10:00:00+00:00"},
+        {"id": ids[2], "created_at": "2026-10-02T10:00:00+00:00"},
+    ]
+
+    items, next_cursor = split_page(rows, limit=2)
+    assert [item["id"] for item in items] == ids[:2]
+    assert decode_cursor(next_cursor) == ("2026-10-01T10:00:00+00:00", ids[1])
+
+    items, next_cursor = split_page(rows, limit=3)
+    assert len(items) == 3 and next_cursor is None
+
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+    # Значення курсора потрапляють у фільтр PostgREST, тому перевіряються
+    for created_at, row_id in [
+        ('2026-10-01",id.gt."0', ids[0]),
+        ("2026-10-01T10:00:00+00:00", 'b",created_at.lt."9999'),
+        (None, ids[0]),
+        ("2026-10-01T10:00:00+00:00", 5),
+    ]:
+        forged = base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode()
+        with pytest.raises(ValueError):
+            decode_cursor(forged)
+
+
+def test_sparse_fieldsets():
+    """Тестування вибору полів через параметр fields."""
+    columns = ("id", "title", "url", "created_at")
+
+    assert parse_fields(None, columns) is None
+    assert parse_fields(" title, id,title ", columns) == ["title", "id"]
+    with pytest.raises(ValueError):
+        parse_fields("title,password", columns)
+
+    assert select_columns(None, columns) == "id,title,url,created_at"
+    assert select_columns(["title"], columns, always=("created_at", "id")) == "title,created_at,id"
+
+    row = {"id": "1", "title": "Intro", "url": "https://cdn", "created_at": "2026-10-01"}
+    assert project(row, ["title"]) == {"title": "Intro"}
+    assert project(row, None) is row
+
+
+def test_api_response_fast_path():
+    """Тестування серіалізації ApiResponse без повторної валідації."""
+    progress = course_progress_from_summary("user-1", {"completed_modules": 1}, total_modules=2)
+    response = api_response(progress)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {
+        "success": True, "data": progress.model_dump(), "message": None, "error": None
+    }
+
+    response = api_response([{"id": 1, "blocks": []}], message="ok")
+    assert json.loads(response.body) == {
+        "success": True, "data": [{"id": 1, "blocks": []}], "message": "ok", "error": None
+    }
+
+
+def test_etag_matching():
+    """Тестування порівняння ETag із заголовком If-None-Match."""
+    etag = make_etag("user-1", "v3", "2026-10-17T10:00:00+00:00")
+    assert etag == make_etag("user-1", "v3", "2026-10-17T10:00:00+00:00")
+    assert etag != make_etag("user-1", "v4", "2026-10-17T10:00:00+00:00")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
+
+
+def test_precompressed_course_tree():
+    """Тестування вибору кодування та вставки полів користувача в готовий JSON."""
+    available = {"identity": b"", "gzip": b"", "br": b""}
+    assert negotiate_encoding("gzip, deflate, br", available) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", available) == "gzip"
+    assert negotiate_encoding("br;q=0, gzip;q=0", available) == "identity"
+    assert negotiate_encoding(None, available) == "identity"
+    assert negotiate_encoding("br", {"identity": b"", "gzip": b""}) == "identity"
+
+    module = {"id": 1, "title": "Intro", "blocks": []}
+    user_fields = {"status": "available", "score": None}
+    spliced = extend_json_object(json.dumps(module, separators=(",", ":")).encode(), user_fields)
+    assert json.loads(spliced) == {**module, **user_fields}
+
+
+def test_module_lock_rules():
+    """Тестування статусів модулів для outline та детального перегляду."""
+    modules = [{"id": 1}, {"id": 2}, {"id": 3}]
+    progress = {1: {"module_id": 1, "score": 90, "passed": True, "completed_at": "2026-10-01"}}
+
+    assert module_progress_fields(0, 1, progress, modules) == {
+        "status": "completed", "score": 90, "quiz_passed": True, "completion_date": "2026-10-01"
+    }
+    assert module_progress_fields(1, 2, progress, modules)["status"] == "available"
+    assert module_progress_fields(2, 3, progress, modules)["status"] == "locked"
+
+
+def test_regrade_matches_quiz_rules():
+    """Тестування перевірки збережених відповідей за новим ключем відповідей."""
+    questions = [
+        {"id": 1, "type": "number", "tolerance": 0.5, "answers": [{"answer_text": "10", "is_correct": True}]},
+        {"id": 2, "type": "single", "answers": [{"answer_text": "B", "is_correct": True}]},
+    ]
+    graders = compile_answer_key(questions)
+    rows = [
+        {"id": i, "question_id": question_id, "answer_text": text, "is_correct": False}
+        for i, (question_id, text) in enumerate([
+            (1, "10.4"), (1, " 9.5 "), (1, "11"), (1, "abc"), (1, "nan"), (1, "inf"),
+            (2, "B"), (2, "A"), (3, "orphan"),
+        ])
+    ]
+
+    changed = {row["id"]: row["is_correct"] for row in regrade_rows(rows, RegradeKey(graders))}
+    for row in rows:
+        if row["question_id"] in graders:
+            expected = graders[row["question_id"]].grade(row["answer_text"])["is_correct"]
+            assert changed.get(row["id"], row["is_correct"]) == expected
+    assert set(changed) == {0, 1, 6}
+    assert all(type(value) is bool for value in changed.values())
+
+
+def test_regrade_job_recomputes_only_changed_modules(tmp_path):
+    """Тестування перерахунку прогресу лише для модулів зі зміненими відповідями."""
+    modules = [
+        {"id": module_id, "questions": [
+            {"id": module_id, "type": "single", "answers": [{"id": module_id, "answer_text": "B", "is_correct": True}]}
+        ]}
+        for module_id in (1, 2, 3)
+    ]
+    client = FakeClient({
+        "modules": modules,
+        "user_answers": [
+            {"id": 1, "user_id": "u", "question_id": 1, "answer_text": "B", "is_correct": True},
+            {"id": 2, "user_id": "u", "question_id": 2, "answer_text": "B", "is_correct": False},
+            {"id": 3, "user_id": "u", "question_id": 3, "answer_text": "A", "is_correct": False},
+        ],
+    })
+    checkpoint = tmp_path / "regrade.json"
+
+    state = asyncio.run(RegradeJob(client, checkpoint).run())
+
+    assert state["modules_changed"] == [2]
+    assert [(name, params["p_module_id"]) for name, kind, params, _ in client.calls if kind == "rpc"] == [
+        ("regrade_progress", 2), ("rebuild_quiz_stats", 2)
+    ]
+    assert json.loads(checkpoint.read_text())["modules_changed"] == [2]
+
+def test_quiz_analytics():
+    """Тестування параметрів і звіту інкрементальної аналітики тестів."""
+    questions = [
+        {"id": 1, "question_text": "Q1", "type": "multi", "answers": [
+            {"answer_text": "A", "is_correct": True}, {"answer_text": "B", "is_correct": True},
+            {"answer_text": "C", "is_correct": False},
+        ]},
+        {"id": 2, "question_text": "Q2", "type": "number", "tolerance": 0, "answers": [
+            {"answer_text": "5", "is_correct": True},
+        ]},
+    ]
+    content = CourseContent([{"id": 7, "title": "M", "slug": "m", "order": 1, "questions": questions}], version=1)
+
+    params = quiz_analytics_params(7, 50, False, content.answer_keys[7], [
+        {"question_id": 1, "answer_text": "B, A, B", "is_correct": True},
+        {"question_id": 1, "answer_text": "A, junk, more junk", "is_correct": False},
+        {"question_id": 2, "answer_text": "4", "is_correct": False},
+    ])
+    assert params["p_answers"] == [
+        {"question_id": 1, "is_correct": True, "options": ["A", "B"]},
+        {"question_id": 1, "is_correct": False, "options": [OTHER_OPTION, "A"]},
+        {"question_id": 2, "is_correct": False, "options": []},
+    ]
+
+    report = build_analytics_report(
+        content,
+        [{"module_id": 7, "submissions": 4, "passed": 1, "score_sum": 250}],
+        [{"question_id": 1, "attempts": 4, "correct": 3}],
+        [
+            {"question_id": 1, "answer_text": OTHER_OPTION, "picks": 1},
+            {"question_id": 1, "answer_text": "A", "picks": 4},
+            {"question_id": 1, "answer_text": "D", "picks": 1},
+        ],
+    )
+    module = report[0]
+    assert (module["pass_rate"], module["average_score"]) == (0.25, 62.5)
+    q1, q2 = module["questions"]
+    assert q1["correct_rate"] == 0.75
+    assert [(o["answer_text"], o["picks"], o["share"]) for o in q1["options"]] == [
+        ("A", 4, 1.0), ("B", 0, 0.0), ("C", 0, 0.0)
+    ]
+    assert (q1["other_picks"], q1["other_share"]) == (2, 0.5)
+    assert q2["attempts"] == 0 and q2["correct_rate"] is None and q2["options"] == []
+
+
+@pytest.mark.asyncio
+async def test_idempotent_submissions():
+    """Тестування повторів з тим самим Idempotency-Key."""
+    store = IdempotencyStore(maxsize=10, ttl=60)
+    executions = []
+
+    async def operation():
+        executions.append(1)
+        await asyncio.sleep(0.01)
+        return {"score": 80}
+
+    # Одночасні дублікати виконуються один раз
+    results = await asyncio.gather(*[store.run("key", "body", operation) for _ in range(5)])
+    assert len(executions) == 1
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert all(result == {"score": 80} for result, _ in results)
+
+    # Пізніший повтор повертає збережений результат
+    assert await store.run("key", "body", operation) == ({"score": 80}, True)
+    assert len(executions) == 1
+
+    with pytest.raises(IdempotencyKeyReuseError):
+        await store.run("key", "other body", operation)
+
+    # Невдала спроба не зберігається, повтор виконується знову
+    async def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await store.run("failed", "body", failing)
+    assert await store.run("failed", "body", operation) == ({"score": 80}, False)
+
+
+@pytest.mark.asyncio
+async def test_idempotent_duplicates_survive_cancelled_original():
+    """Тестування дублікатів, коли клієнт оригінального запиту від'єднався."""
+    store = IdempotencyStore(maxsize=10, ttl=60)
+    executions = []
+
+    async def operation():
+        executions.append(1)
+        await asyncio.sleep(0.05)
+        return {"score": 80}
+
+    original = asyncio.create_task(store.run("key", "body", operation))
+    await asyncio.sleep(0)
+    duplicates = [asyncio.create_task(store.run("key", "body", operation)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    original.cancel()
+
+    # Один з дублікатів виконує операцію знову, решта отримують його результат
+    results = await asyncio.gather(*duplicates)
+    assert original.cancelled()
+    assert len(executions) == 2
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert all(result == {"score": 80} for result, _ in results)
+
+    # Скасований дублікат не скасовує оригінал
+    waiting = asyncio.create_task(store.run("other", "body", operation))
+    await asyncio.sleep(0)
+    duplicate = asyncio.create_task(store.run("other", "body", operation))
+    await asyncio.sleep(0.01)
+    duplicate.cancel()
+    assert await waiting == ({"score": 80}, False)
+
+
+@pytest.mark.asyncio
+async def test_write_behind_buffer(tmp_path):
+    """Тестування пакетного запису, збереження у файл при збоях і дозапису."""
+    client = FakeClient()
+    available = True
+
+    async def get_client():
+        if not available:
+            raise ConnectionError("Supabase is down")
+        return client
+
+    buffer = WriteBehindBuffer(
+        "user_answers", batch_size=3, flush_interval=0.05, max_queue=100,
+        spill_path=tmp_path / "user_answers.jsonl", retry_interval=60,
+    )
+    buffer.start(get_client)
+
+    # Повний пакет і залишок, який записується після flush_interval
+    await buffer.submit([{"id": i} for i in range(4)])
+    await asyncio.sleep(0.2)
+    assert [len(call[2]) for call in client.calls] == [3, 1]
+
+    # Збій: пакет зберігається у файл
+    available = False
+    await buffer.submit([{"id": 4}, {"id": 5}])
+    await asyncio.sleep(0.2)
+    assert buffer.stats()["spilled_rows"] == 2
+    assert (tmp_path / "user_answers.jsonl").exists()
+
+    # Після відновлення файл дописується в базу
+    available = True
+    buffer._replayed_at = 0.0
+    await buffer.submit([{"id": 6}])
+    await buffer.stop(timeout=1)
+    inserted = [row["id"] for call in client.calls for row in call[2]]
+    assert sorted(inserted) == list(range(7))
+    assert not (tmp_path / "user_answers.jsonl").exists()
+    assert buffer.stats()["queue_depth"] == 0
+
+    # Після зупинки рядки одразу зберігаються у файл
+    await buffer.submit([{"id": 7}])
+    assert (tmp_path / "user_answers.jsonl").read_text().strip() == '{"id": 7}'
+
+
+@pytest.mark.asyncio
+async def test_write_behind_overflow_spills_off_the_event_loop(tmp_path):
+    """Тестування переповненої черги: запис у файл виконується не в циклі подій."""
+    import threading
+
+    buffer = WriteBehindBuffer(
+        "user_answers", batch_size=10, flush_interval=60, max_queue=1,
+        spill_path=tmp_path / "user_answers.jsonl", retry_interval=60,
+    )
+    spill_threads = []
+    spill = buffer._spill
+
+    def recording_spill(rows):
+        spill_threads.append(threading.current_thread())
+        spill(rows)
+
+    buffer._spill = recording_spill
+    # Без відтворення файлу під час тесту
+    buffer._replayed_at = time.monotonic()
+    buffer.start(lambda: asyncio.sleep(3600))
+    await buffer.submit([{"id": 1}, {"id": 2}, {"id": 3}])
+
+    assert [json.loads(line)["id"] for line in (tmp_path / "user_answers.jsonl").read_text().splitlines()] == [2, 3]
+    assert spill_threads and threading.main_thread() not in spill_threads
+    buffer._task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_cancelled_replay_keeps_only_unwritten_rows(tmp_path):
+    """Тестування скасування відтворення: повторний запуск не дублює записані рядки."""
+    inserted = []
+    blocked = asyncio.Event()
+
+    class Table:
+        def __init__(self, rows):
+            self.rows = rows
+
+        async def execute(self):
+            if self.rows[0]["id"] == 3 and not blocked.is_set():
+                # Другий пакет зависає, доки відтворення не скасують
+                blocked.set()
+                await asyncio.sleep(3600)
+            inserted.extend(row["id"] for row in self.rows)
+
+    class Client:
+        def table(self, name):
+            return type("Query", (), {"insert": lambda _, rows: Table(rows)})()
+
+    async def get_client():
+        return Client()
+
+    spill = tmp_path / "user_answers.jsonl"
+    spill.write_text("".join(json.dumps({"id": i}) + "\n" for i in range(1, 7)))
+    replaying = tmp_path / "user_answers.replaying"
+
+    buffer = WriteBehindBuffer(
+        "user_answers", batch_size=2, flush_interval=0.05, max_queue=100,
+        spill_path=spill, retry_interval=60,
+    )
+    buffer.start(get_client)
+    await asyncio.wait_for(blocked.wait(), 1)
+    buffer._task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await buffer._task
+    assert inserted == [1, 2]
+    assert not spill.exists()
+    assert [json.loads(line)["id"] for line in replaying.read_text().splitlines()] == [3, 4, 5, 6]
+
+    # Новий запуск дописує лише незаписані рядки
+    buffer._replayed_at = 0.0
+    buffer.start(get_client)
+    await buffer.stop(timeout=1)
+    assert sorted(inserted) == [1, 2, 3, 4, 5, 6]
+    assert not spill.exists() and not replaying.exists()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_recovers_spill_and_rejects_rows(tmp_path):
+    """Тестування пошкодженого файлу, залишку відтворення і відхилених базою рядків."""
+    from postgrest.exceptions import APIError
+
+    inserted = []
+
+    class Table:
+        def __init__(self, rows):
+            self.rows = rows
+
+        async def execute(self):
+            if any(row["id"] < 0 for row in self.rows):
+                raise APIError({"code": "23503", "message": "foreign key violation"})
+            inserted.extend(row["id"] for row in self.rows)
+
+    class Client:
+        def table(self, name):
+            return type("Query", (), {"insert": lambda _, rows: Table(rows)})()
+
+    async def get_client():
+        return Client()
+
+    spill = tmp_path / "user_answers.jsonl"
+    # Залишок перерваного відтворення і файл з обрізаним останнім рядком
+    (tmp_path / "user_answers.replaying").write_text('{"id": 1}\n')
+    spill.write_text('{"id": 2}\n{"id": 3')
+
+    buffer = WriteBehindBuffer(
+        "user_answers", batch_size=10, flush_interval=0.05, max_queue=100,
+        spill_path=spill, retry_interval=60,
+    )
+    buffer._spill([{"id": 4}])
+    buffer.start(get_client)
+    await asyncio.sleep(0.1)
+    assert buffer.running
+    assert sorted(inserted) == [1, 2, 4]
+    assert (tmp_path / "user_answers.corrupt").read_text() == '{"id": 3\n'
+    assert not spill.exists() and not (tmp_path / "user_answers.replaying").exists()
+
+    # Відхилений рядок відокремлюється, решта пакета записується
+    await buffer.submit([{"id": 5}, {"id": -1}, {"id": 6}, {"id": 7}])
+    await buffer.stop(timeout=1)
+    assert sorted(inserted) == [1, 2, 4, 5, 6, 7]
+    rejected = [json.loads(line) for line in (tmp_path / "user_answers.rejected.jsonl").read_text().splitlines()]
+    assert [record["row"]["id"] for record in rejected] == [-1]
+    assert buffer.stats()["rejected_rows"] == 1 and not spill.exists()
+
+
+@pytest.mark.asyncio
+async def test_bunnycdn_async_client():
+    """Тестування асинхронного завантаження і видалення відео через пул з'єднань."""
+    requests_seen = []
+
+    async def handler(request):
+        body = await request.aread()
+        requests_seen.append((request.method, request.url.path, request.headers.get("AccessKey"), body))
+        if request.url.path.endswith("missing.mp4"):
+            return httpx.Response(404, text="Not found")
+        return httpx.Response(201 if request.method == "PUT" else 200)
+
+    service = BunnyCDNService()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def chunks():
+        yield b"abc"
+        yield b"def"
+
+    result = await service.upload_video("video.mp4", chunks(), "education", content_length=6)
+    assert result["success"] and result["url"].endswith("/education/video.mp4")
+    assert requests_seen[0][0] == "PUT" and requests_seen[0][3] == b"abcdef"
+    assert requests_seen[0][2] == settings.BUNNYCDN_API_KEY
+
+    assert (await service.delete_video("video.mp4", "education"))["success"]
+    missing = await service.delete_video("missing.mp4", "education")
+    assert not missing["success"] and missing["status_code"] == 404
+
+    await service.close()
+    assert service._client is None
+
+
+@pytest.mark.asyncio
+async def test_upload_stream():
+    """Тестування потокового завантаження: SHA-256, розмір і обмежене вікно чанків."""
+    import hashlib
+    chunks = [bytes([i]) * 1000 for i in range(50)]
+    read = 0
+
+    async def source():
+        nonlocal read
+        for chunk in chunks:
+            read += 1
+            yield chunk
+
+    stream = UploadStream(source(), window=4)
+    received = []
+    async for chunk in stream:
+        # Джерело випереджає споживача не більше ніж на вікно
+        assert read - len(received) <= 4 + 2
+        received.append(chunk)
+        await asyncio.sleep(0)
+    assert received == chunks and stream.complete
+    assert stream.size == 50000
+    assert stream.sha256 == hashlib.sha256(b"".join(chunks)).hexdigest()
+
+    stream = UploadStream(source(), window=4, max_size=10000)
+    with pytest.raises(UploadTooLarge):
+        async for _ in stream:
+            pass
+    assert not stream.complete
+
+
+@pytest.mark.asyncio
+async def test_resumable_upload_parallel_chunks(tmp_path):
+    """Тестування відновлюваного завантаження: паралельні чанки, зміщення і завершення."""
+    assert add_range([[0, 10], [20, 30]], 10, 20) == [[0, 30]]
+    assert add_range([[5, 10]], 0, 3) == [[0, 3], [5, 10]]
+
+    store = ResumableUploadStore(tmp_path, ttl=60)
+    data = bytes(range(256)) * 4000
+    session = await store.create("user-1", len(data), {"title": "Lecture"})
+    upload_id = session["upload_id"]
+
+    async def body(chunk):
+        for i in range(0, len(chunk), 1000):
+            await asyncio.sleep(0)
+            yield chunk[i:i + 1000]
+
+    # Чанки надсилаються паралельно і не по порядку
+    size = len(data) // 4
+    await store.write_chunk(upload_id, "user-1", size, body(data[size:2 * size]))
+    assert store.get(upload_id, "user-1")["received"] == [[size, 2 * size]]
+    with pytest.raises(UploadConflict):
+        store.begin_finalize(upload_id, "user-1")
+    await asyncio.gather(*(
+        store.write_chunk(upload_id, "user-1", offset, body(data[offset:offset + size]))
+        for offset in (3 * size, 0, 2 * size)
+    ))
+    assert store.get(upload_id, "user-1")["received"] == [[0, len(data)]]
+
+    with pytest.raises(UploadConflict):
+        await store.write_chunk(upload_id, "user-1", len(data) - 1, body(b"xx"))
+    with pytest.raises(UploadNotFound):
+        store.get(upload_id, "user-2")
+
+    store.begin_finalize(upload_id, "user-1")
+    with pytest.raises(UploadConflict):
+        await store.write_chunk(upload_id, "user-1", 0, body(b"x"))
+    assert b"".join([chunk async for chunk in store.iter_data(upload_id)]) == data
+    store.end_finalize(upload_id)
+
+    await store.remove(upload_id)
+    with pytest.raises(UploadNotFound):
+        store.get(upload_id, "user-1")
+
+
+@pytest.mark.asyncio
+async def test_video_ingest_retries(tmp_path, monkeypatch):
+    """Тестування фонової обробки відео: повтор після збою CDN і статус завдання."""
+    responses = [503, 201, 401]
+    uploaded = []
+
+    async def storage(request):
+        uploaded.append(len(await request.aread()))
+        return httpx.Response(responses.pop(0), text="error")
+
+    monkeypatch.setattr(
+        bunnycdn_module.bunnycdn, "_client", httpx.AsyncClient(transport=httpx.MockTransport(storage))
+    )
+
+    client = FakeClient({"videos": [{"id": "stored"}]})
+
+    async def get_client():
+        return client
+
+    store = ResumableUploadStore(tmp_path, ttl=60)
+    queue = VideoIngestQueue(
+        store, workers=1, max_pending=10, max_attempts=3, retry_base=0.01, retry_max=0.01,
+        job_ttl=60, job_cache_size=10,
+    )
+    await queue.start(get_client)
+
+    async def ingest(data):
+        session = await store.create("user-1", len(data), {"title": "Lecture", "filename": "a.mp4"})
+
+        async def body():
+            yield data
+
+        session = await store.write_chunk(session["upload_id"], "user-1", 0, body())
+        job = await queue.submit(session)
+        for _ in range(100):
+            if queue.get_job(job["job_id"])["status"] in ("done", "failed"):
+                break
+            await asyncio.sleep(0.01)
+        return queue.get_job(job["job_id"])
+
+    # Збій 503 повторюється, потім рядок відео записується
+    job = await ingest(b"video" * 1000)
+    assert job["status"] == "done" and job["attempts"] == 2
+    assert job["uploaded_bytes"] == 5000 and uploaded == [5000, 5000]
+    assert client.calls[0][1] == "upsert" and client.calls[0][2]["size_bytes"] == 5000
+
+    # Помилка 401 не повторюється
+    job = await ingest(b"x")
+    assert job["status"] == "failed" and job["attempts"] == 1
+
+    # Файли на диску видаляються після завершення
+    assert list(tmp_path.iterdir()) == []
+    assert queue.stats()["succeeded"] == 1 and queue.stats()["failed"] == 1
+    await queue.stop()
+
+
+
+async def _staged_upload(store, data=b"video"):
+    session = await store.create("user-1", len(data), {"title": "Lecture", "filename": "a.mp4"})
+
+    async def body():
+        yield data
+
+    return await store.write_chunk(session["upload_id"], "user-1", 0, body())
+
+
+@pytest.mark.asyncio
+async def test_upload_claims_are_exclusive_across_processes(tmp_path):
+    """Тестування того, що сесію завантаження обробляє лише один процес."""
+    store = ResumableUploadStore(tmp_path, ttl=60)
+    # Другий процес з тим самим каталогом
+    other = ResumableUploadStore(tmp_path, ttl=60)
+    session = await _staged_upload(store)
+    upload_id = session["upload_id"]
+
+    store.claim(session)
+    with pytest.raises(UploadLocked):
+        other.claim(other.get(upload_id, "user-1"))
+
+    # Сесію, яку обробляє інший процес, не видаляють під час запуску
+    await store.update(upload_id, {"ingest": True})
+    queue = VideoIngestQueue(
+        other, workers=1, max_pending=10, max_attempts=1, retry_base=0.01, retry_max=0.01,
+        job_ttl=60, job_cache_size=10,
+    )
+    await queue.start(lambda: None)
+    assert queue.pending == 0 and other.get(upload_id, "user-1")
+    await queue.stop()
+
+    store.end_finalize(upload_id)
+    other.claim(other.get(upload_id, "user-1"))
+    other.end_finalize(upload_id)
+
+
+@pytest.mark.asyncio
+async def test_video_ingest_capacity_is_checked_on_submit(tmp_path):
+    """Тестування обмеження черги під час одночасних запитів."""
+    store = ResumableUploadStore(tmp_path, ttl=60)
+    queue = VideoIngestQueue(
+        store, workers=1, max_pending=1, max_attempts=1, retry_base=0.01, retry_max=0.01,
+        job_ttl=60, job_cache_size=10,
+    )
+    sessions = [await _staged_upload(store) for _ in range(2)]
+
+    results = await asyncio.gather(*(queue.submit(session) for session in sessions), return_exceptions=True)
+    assert sum(isinstance(result, IngestQueueFull) for result in results) == 1
+    assert queue.pending == 1
+
+
+ADMIN_USER_ID = "0c6d3c7e-58b4-4a4f-9d25-7d1e3a6f2b10"
+
+
+@pytest_asyncio.fixture
+async def api_client(jwt_secret, monkeypatch):
+    """Фікстура клієнта API зі справжньою перевіркою токенів і базою в пам'яті."""
+    from app.main import app
+
+    db = FakeClient()
+
+    async def fake_supabase_client():
+        return db
+
+    async def cached_content(client):
+        return CourseContent([{"id": 7, "title": "M", "slug": "m", "order": 1, "questions": []}], version=1)
+
+    monkeypatch.setattr(auth_endpoints, "get_supabase_client", fake_supabase_client)
+    monkeypatch.setattr(admin_endpoints.course_content_cache, "get", cached_content)
+    # Токени, відкликані іншими тестами в ту саму секунду, збігаються з новими
+    monkeypatch.setattr(security, "revoked_tokens", {})
+    monkeypatch.setattr(security, "_revoked_token_expiries", [])
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.asyncio
+async def test_superuser_token_reaches_admin_routes(api_client):
+    """Тестування доступу до адмін-маршрутів за роллю з app_metadata токена."""
+    url = f"{settings.API_PREFIX}/admin/analytics"
+    admin_token = make_token(sub=ADMIN_USER_ID, app_metadata={"role": "admin"})
+
+    assert (await api_client.get(url, headers=bearer(make_token()))).status_code == 403
+    # user_metadata змінює сам користувач, тому роль звідти не враховується
+    forged = make_token(user_metadata={"role": "admin"})
+    assert (await api_client.get(url, headers=bearer(forged))).status_code == 403
+
+    response = await api_client.get(url, headers=bearer(admin_token))
+    assert response.status_code == 200
+    assert [module["module_id"] for module in response.json()["data"]] == [7]
+
+
+@pytest.mark.asyncio
+async def test_superuser_can_invalidate_content_cache(api_client):
+    """Тестування ручного скидання кешу курсу суперкористувачем."""
+    url = f"{settings.API_PREFIX}/admin/content/invalidate"
+    assert (await api_client.post(url, headers=bearer(make_token()))).status_code == 403
+
+    admin_token = make_token(sub=ADMIN_USER_ID, app_metadata={"role": "admin"})
+    response = await api_client.post(url, headers=bearer(admin_token))
+    assert response.status_code == 200 and response.json()["success"] is True
+
+
+@pytest.mark.asyncio
+async def test_superuser_can_revoke_user_sessions(api_client, monkeypatch):
+    """Тестування відкликання всіх сесій користувача через адмін-маршрут."""
+    monkeypatch.setattr(security, "revoked_users", {})
+    me = f"{settings.API_PREFIX}/auth/me"
+    old_token = make_token(iat=int(time.time()) - 5)
+    assert (await api_client.get(me, headers=bearer(old_token))).status_code == 200
+
+    admin_token = make_token(sub=ADMIN_USER_ID, app_metadata={"role": "admin"})
+    user_id = "5b1f3f4e-1d2c-4a8b-9f1e-2a3b4c5d6e7f"
+    response = await api_client.post(
+        f"{settings.API_PREFIX}/admin/users/{user_id}/revoke-sessions", headers=bearer(admin_token)
+    )
+    assert response.status_code == 200 and response.json()["data"]["cached_tokens_dropped"] >= 1
+
+    assert (await api_client.get(me, headers=bearer(old_token))).status_code == 401
+    # Токен, виданий у ту саму секунду після відкликання, дійсний
+    new_token = make_token(iat=int(time.time()))
+    assert (await api_client.get(me, headers=bearer(new_token))).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_me_reports_account_creation_time(monkeypatch):
+    """Тестування дати створення облікового запису в /auth/me для локально перевірених токенів."""
+    db = FakeClient({"users": [{
+        "id": "student", "email": "student@example.com", "created_at": "2026-01-05T09:00:00+00:00",
+        "updated_at": "2026-02-01T09:00:00+00:00",
+    }]})
+
+    async def fake_supabase_client():
+        return db
+
+    monkeypatch.setattr(auth_endpoints, "get_supabase_client", fake_supabase_client)
+    user = User(id="student", email="student@example.com")
+    me = await auth_endpoints.read_users_me(user)
+    assert me.created_at == datetime.fromisoformat("2026-01-05T09:00:00+00:00")
+    assert me.updated_at == datetime.fromisoformat("2026-02-01T09:00:00+00:00")
+
+    # Відомі дати (перевірка через Supabase Auth) не перечитуються
+    db.executed.clear()
+    assert await auth_endpoints.read_users_me(me) is me
+    assert db.executed == []
+
+# Тести бази даних
+@pytest_asyncio.fixture
+async def db_client():
     """Фікстура для отримання клієнта бази даних."""
     try:
-        return get_supabase_client()
+        client = await get_supabase_client()
     except Exception as e:
         pytest.fail(f"Не вдалося підключитися до бази даних: {str(e)}")
+    yield client
+    await close_supabase_client()
 
 
-def test_questions_have_correct_answers(db_client):
+@pytest.mark.asyncio
+async def test_questions_have_correct_answers(db_client):
     """Перевірка наявності правильних відповідей для питань."""
-    questions_response = db_client.table("questions").select("*").execute()
+    questions_response = await db_client.table("questions").select("*").execute()
     
     if not questions_response.data:
         pytest.skip("Немає питань для тестування в базі даних")
@@ -155,7 +1255,7 @@ def test_questions_have_correct_answers(db_client):
         question_id = question["id"]
         question_text = question.get("question_text", "Unknown")
         
-        answers_response = db_client.table("answers").select("*").eq("question_id", question_id).execute()
+        answers_response = await db_client.table("answers").select("*").eq("question_id", question_id).execute()
         
         assert answers_response.data and len(answers_response.data) > 0, \
             f"Питання {question_id} ({question_text}) не має жодної відповіді"
@@ -165,9 +1265,10 @@ def test_questions_have_correct_answers(db_client):
             f"Питання {question_id} ({question_text}) не має жодної правильної відповіді"
 
 
-def test_number_questions_have_tolerance(db_client):
+@pytest.mark.asyncio
+async def test_number_questions_have_tolerance(db_client):
     """Перевірка наявності значень tolerance для числових питань."""
-    questions_response = db_client.table("questions").select("*").eq("type", "number").execute()
+    questions_response = await db_client.table("questions").select("*").eq("type", "number").execute()
     
     for question in questions_response.data:
         assert question.get("tolerance") is not None, \